@@ -0,0 +1,53 @@
+"""
+Measures per-request auth overhead of app.auth.verify_jwt with and without
+the verified-token cache, for a small set of reused tokens.
+
+    python automation/benchmarks/bench_auth_cache.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import common  # noqa: F401  (sets up sys.path and env)
+from fastapi.security import SecurityScopes
+from jose import jwt
+
+from app import auth
+
+def make_tokens(n: int) -> list:
+    exp = int(time.time()) + 3600
+    return [
+        jwt.encode({"sub": f"shipper-{i}", "scope": "ingest report_anomaly", "exp": exp},
+                   os.environ["JWT_SECRET_KEY"], algorithm="HS256")
+        for i in range(n)
+    ]
+
+async def verify_all(tokens: list, requests: int):
+    scopes = SecurityScopes(scopes=["ingest"])
+    for i in range(requests):
+        await auth.verify_jwt(scopes, tokens[i % len(tokens)])
+
+def main(args):
+    tokens = make_tokens(args.tokens)
+    rows = []
+    for label, size in (("no cache", 0), ("cache", 1024)):
+        auth.token_cache.max_size = size
+        auth.token_cache.clear()
+        seconds, _ = common.timed(lambda: asyncio.run(verify_all(tokens, args.requests)), repeat=args.repeat)
+        rows.append({
+            "mode": label,
+            "us/request": seconds / args.requests * 1e6,
+            "requests/sec": args.requests / seconds,
+        })
+    rows[1]["speedup"] = rows[0]["us/request"] / rows[1]["us/request"]
+    rows[0]["speedup"] = 1.0
+    common.report(f"verify_jwt overhead ({args.tokens} distinct tokens)", rows,
+                  ["mode", "us/request", "requests/sec", "speedup"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
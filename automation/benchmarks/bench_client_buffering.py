@@ -0,0 +1,105 @@
+"""
+Caller latency and end-to-end throughput of SecurifyClient: the blocking
+per-event mode (one POST /ingest per call) against buffered=True (enqueue and
+return; a background thread ships gzip batches to /ingest/batch).
+
+The API is a local stub HTTP server that adds --server-latency-ms to every
+request, standing in for the network round trip to the ingest service.
+
+    python automation/benchmarks/bench_client_buffering.py --events 20000
+"""
+import argparse
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import common  # noqa: F401  (sets up sys.path and env)
+import numpy as np
+
+from securify_client import SecurifyClient
+
+class StubServer:
+    """Counts received events; sleeps `latency` seconds per request."""
+
+    def __init__(self, latency: float):
+        self.received = 0
+        self.requests = 0
+        self.bytes = 0
+        lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, as the real API
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(latency)
+                raw = gzip.decompress(body) if self.headers.get("Content-Encoding") == "gzip" else body
+                events = json.loads(raw)
+                with lock:
+                    stub.received += len(events) if isinstance(events, list) else 1
+                    stub.requests += 1
+                    stub.bytes += len(body)
+                reply = b'{"status": "accepted", "rejected": []}'
+                self.send_response(202)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def run(mode: str, args) -> dict:
+    stub = StubServer(args.server_latency_ms / 1000)
+    if mode == "sync":
+        client = SecurifyClient(stub.url, "bench-token")
+    else:
+        client = SecurifyClient(stub.url, "bench-token", buffered=True, batch_size=args.batch_size,
+                                max_queue=args.events, flush_interval=0.2)
+    n = args.events if mode != "sync" else min(args.events, args.sync_events)
+    latencies = np.empty(n)
+    start = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        client.log_login(f"user{i % 1000}", i % 3 != 0)
+        latencies[i] = time.perf_counter() - t0
+    client.flush()
+    elapsed = time.perf_counter() - start
+    client.close()
+    stub.close()
+    assert stub.received == n, (stub.received, n)
+    us = latencies * 1e6
+    return {
+        "mode": mode,
+        "events": n,
+        "requests": stub.requests,
+        "caller p50 us": float(np.percentile(us, 50)),
+        "caller p99 us": float(np.percentile(us, 99)),
+        "events/sec": n / elapsed,
+        "KB sent": stub.bytes / 1024,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--sync-events", type=int, default=2000,
+                        help="Events for the blocking mode (it is much slower)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--server-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    rows = [run("sync", args), run("buffered", args)]
+    common.report(
+        f"SecurifyClient ({args.server_latency_ms} ms per request)", rows,
+        ["mode", "events", "requests", "caller p50 us", "caller p99 us", "events/sec", "KB sent"])
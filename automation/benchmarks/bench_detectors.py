@@ -0,0 +1,66 @@
+"""
+Per-batch cost of the worker's keyed detectors (username, user_id, path_prefix)
+on top of the per-IP model, against parsing the batch again for each detector.
+
+    python automation/benchmarks/bench_detectors.py --sizes 500 5000
+"""
+import argparse
+import random
+
+import common  # noqa: F401  (sets up sys.path and env)
+import orjson
+
+from worker import detectors, features, run_worker
+from bench_features import make_model
+
+PATHS = ["/home/{user}/notes.txt", "/home/{user}/app.log", "/etc/ssh/sshd_config", "/var/www/index.html"]
+
+def make_entries(n: int, seed: int = 0) -> list:
+    """Raw stream entries: 80% logins, 20% file changes, as the worker reads them."""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(n):
+        user = f"user{rng.randrange(200):04d}"
+        ip = f"10.0.{rng.randrange(40)}.{rng.randrange(250)}"
+        if rng.random() < 0.2:
+            event = {"event_id": f"f{i}", "timestamp": "2025-10-21T10:00:00Z", "source_ip": ip,
+                     "event_type": "FILE_CHANGE", "file_path": rng.choice(PATHS).format(user=user), "user_id": user}
+        else:
+            event = {"event_id": f"l{i}", "timestamp": "2025-10-21T10:00:00Z", "source_ip": ip,
+                     "event_type": "LOGIN_ATTEMPT", "username": user, "success": rng.random() < 0.9}
+        entries.append((f"{i}-0".encode(), {b"data": orjson.dumps(event)}))
+    return entries
+
+def reparse_each(entries, model, keyed):
+    """What adding detectors would cost if each one decoded the batch itself."""
+    run_worker.detect_anomalies(entries, model)
+    for detector in keyed:
+        detector.detect(features.split_by_event_type(features.parse_events(entries)), "")
+
+def main(args):
+    model = make_model()
+    rows = []
+    for size in args.sizes:
+        entries = make_entries(size)
+        parse, _ = common.timed(features.parse_events, entries, repeat=args.repeat)
+        ip_only, _ = common.timed(run_worker.detect_anomalies, entries, model, repeat=args.repeat)
+        # Without a window the detectors keep no state between runs, so every repeat does the same work.
+        keyed = detectors.create_detectors(window_seconds=0)
+        shared, _ = common.timed(run_worker.detect_anomalies, entries, model, keyed=keyed, repeat=args.repeat)
+        separate, _ = common.timed(reparse_each, entries, model, keyed, repeat=args.repeat)
+        rows.append({
+            "events": size,
+            "parse ms": parse * 1e3,
+            "per-IP only ms": ip_only * 1e3,
+            "+3 detectors ms": shared * 1e3,
+            "+3, parse each ms": separate * 1e3,
+            "detector overhead": shared / ip_only,
+        })
+    common.report("detect_anomalies per batch", rows,
+                  ["events", "parse ms", "per-IP only ms", "+3 detectors ms", "+3, parse each ms", "detector overhead"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,69 @@
+"""
+Compares the worker's per-batch feature extraction: the original pandas
+DataFrame/groupby path against the NumPy bincount path, with and without
+IsolationForest scoring on top.
+
+    python automation/benchmarks/bench_features.py --sizes 500 5000 50000
+"""
+import argparse
+import random
+
+import common  # noqa: F401  (sets up sys.path and env)
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from worker import features
+
+def make_events(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    n_ips = max(10, n // 10)
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(n_ips)]
+    return [
+        {
+            "event_id": f"evt_{i}",
+            "timestamp": "2025-10-21T10:00:00Z",
+            "source_ip": rng.choice(ips),
+            "event_type": "LOGIN_ATTEMPT",
+            "username": f"user_{rng.randrange(100)}",
+            "success": rng.random() < 0.75,
+        }
+        for i in range(n)
+    ]
+
+def make_model():
+    rng = np.random.RandomState(0)
+    X_train = rng.rand(1000, 2) * [5, 10]
+    return IsolationForest(contamination=0.05, random_state=42).fit(X_train)
+
+def run(extract, events, model=None):
+    login_features = extract(events)
+    _, X_predict = features.build_login_matrix(login_features)
+    if model is not None and len(X_predict):
+        model.decision_function(X_predict)
+
+def main(args):
+    model = make_model()
+    rows = []
+    for size in args.sizes:
+        events = make_events(size)
+        timings = {}
+        for name, extract in (("pandas", features.extract_login_features_pandas),
+                              ("numpy", features.extract_login_features)):
+            timings[name], _ = common.timed(run, extract, events, repeat=args.repeat)
+            timings[name + "+model"], _ = common.timed(run, extract, events, model, repeat=args.repeat)
+        rows.append({
+            "events": size,
+            "pandas ms": timings["pandas"] * 1e3,
+            "numpy ms": timings["numpy"] * 1e3,
+            "speedup": timings["pandas"] / timings["numpy"],
+            "pandas+model ms": timings["pandas+model"] * 1e3,
+            "numpy+model ms": timings["numpy+model"] * 1e3,
+        })
+    common.report("Per-batch feature extraction", rows,
+                  ["events", "pandas ms", "numpy ms", "speedup", "pandas+model ms", "numpy+model ms"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 5000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
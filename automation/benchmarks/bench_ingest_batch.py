@@ -0,0 +1,91 @@
+"""
+Compares events/sec through POST /ingest (one event per request) against
+POST /ingest/batch (JSON array and NDJSON).
+
+The FastAPI app runs in-process behind httpx's ASGI transport. Redis is
+fakeredis by default; pass --redis-url to measure against a real server,
+where saving the per-event round trips matters most.
+
+    python automation/benchmarks/bench_ingest_batch.py --events 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+
+import common  # noqa: F401  (sets up sys.path and env)
+import httpx
+from jose import jwt
+
+from app import main
+
+def make_events(n: int) -> list:
+    return [
+        {
+            "event_id": f"evt_{i}",
+            "timestamp": "2025-10-21T10:00:00Z",
+            "source_ip": f"10.0.{(i >> 8) & 255}.{i & 255}",
+            "event_type": "LOGIN_ATTEMPT",
+            "username": f"user_{i % 100}",
+            "success": i % 4 != 0,
+        }
+        for i in range(n)
+    ]
+
+async def make_redis(redis_url):
+    if redis_url:
+        import redis.asyncio as redis
+        return redis.from_url(redis_url)
+    import fakeredis
+    return fakeredis.aioredis.FakeRedis()
+
+async def run_single(client, headers, events):
+    for event in events:
+        resp = await client.post("/ingest", json=event, headers=headers)
+        assert resp.status_code == 202, resp.text
+
+async def run_batch(client, headers, events, batch_size, ndjson):
+    for start in range(0, len(events), batch_size):
+        chunk = events[start:start + batch_size]
+        if ndjson:
+            body = "\n".join(json.dumps(e) for e in chunk)
+            content_type = "application/x-ndjson"
+        else:
+            body = json.dumps(chunk)
+            content_type = "application/json"
+        resp = await client.post(
+            "/ingest/batch", content=body, headers={**headers, "Content-Type": content_type}
+        )
+        assert resp.status_code == 202, resp.text
+
+async def main_async(args):
+    main.app.state.redis = await make_redis(args.redis_url)
+    token = jwt.encode({"sub": "bench", "scope": "ingest"}, os.environ["JWT_SECRET_KEY"], algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    events = make_events(args.events)
+
+    rows = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cases = [("single /ingest", lambda: run_single(client, headers, events))]
+        for batch_size in args.batch_sizes:
+            cases.append((f"batch json x{batch_size}", lambda b=batch_size: run_batch(client, headers, events, b, False)))
+            cases.append((f"batch ndjson x{batch_size}", lambda b=batch_size: run_batch(client, headers, events, b, True)))
+
+        baseline = None
+        for name, fn in cases:
+            await main.app.state.redis.delete("events:raw")
+            seconds, _ = await common.timed_async(fn, repeat=args.repeat)
+            rate = args.events / seconds
+            baseline = baseline or rate
+            rows.append({"path": name, "seconds": seconds, "events/sec": rate, "speedup": rate / baseline})
+
+    common.report(f"Ingest throughput ({args.events} events)", rows, ["path", "seconds", "events/sec", "speedup"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--redis-url", help="Real Redis to write to instead of fakeredis")
+    asyncio.run(main_async(parser.parse_args()))
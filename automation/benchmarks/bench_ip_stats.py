@@ -0,0 +1,73 @@
+"""
+Memory per tracked IP and per-batch update cost of the worker's sliding-window
+IPStatsStore, filled up to --ips distinct IPs (1M by default).
+
+    python automation/benchmarks/bench_ip_stats.py --ips 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+import common  # noqa: F401  (sets up sys.path and env)
+import numpy as np
+
+from worker.ip_stats import IPStatsStore
+
+def ip_list(start: int, n: int) -> list:
+    return [f"{i >> 24 & 255}.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(start, start + n)]
+
+def main(args):
+    all_ips = ip_list(1 << 24, args.ips)
+    counts = np.ones((args.batch_ips, 3), dtype=np.int64)
+
+    tracemalloc.start()
+    store = IPStatsStore(window_seconds=600, n_buckets=args.buckets, max_ips=args.ips)
+    now = 1_000_000.0
+    start = time.perf_counter()
+    for offset in range(0, args.ips, args.batch_ips):
+        ips = all_ips[offset:offset + args.batch_ips]
+        store.update(ips, counts[:len(ips)], now=now)
+        now += 0.05
+    fill_seconds = time.perf_counter() - start
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rng = np.random.default_rng(0)
+    fresh = ((1 << 28) + i * args.batch_ips for i in range(args.batches))
+    rows = [{
+        "case": "fill (all new IPs)",
+        "us/batch": fill_seconds / (args.ips / args.batch_ips) * 1e6,
+        "us/IP": fill_seconds / args.ips * 1e6,
+    }]
+    for label, pick in (
+        ("update known IPs", lambda: [all_ips[i] for i in rng.choice(args.ips, args.batch_ips, replace=False)]),
+        ("update new IPs (LRU evicts)", lambda: ip_list(next(fresh), args.batch_ips)),
+    ):
+        batches = [pick() for _ in range(args.batches)]
+        start = time.perf_counter()
+        for ips in batches:
+            slots = store.update(ips, counts, now=now)
+            store.window_totals(slots)
+            now += 0.05
+        seconds = time.perf_counter() - start
+        rows.append({
+            "case": label,
+            "us/batch": seconds / args.batches * 1e6,
+            "us/IP": seconds / (args.batches * args.batch_ips) * 1e6,
+        })
+
+    common.report(f"IPStatsStore update cost ({args.batch_ips} IPs/batch)", rows, ["case", "us/batch", "us/IP"])
+    common.report(f"IPStatsStore memory ({args.ips:,} IPs, {args.buckets} buckets)", [{
+        "counter arrays MB": store.nbytes() / 2**20,
+        "traced MB (excl. IP strings)": traced / 2**20,
+        "bytes/IP (arrays)": store.nbytes() / args.ips,
+        "bytes/IP (total)": traced / args.ips,
+    }], ["counter arrays MB", "traced MB (excl. IP strings)", "bytes/IP (arrays)", "bytes/IP (total)"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ips", type=int, default=1_000_000)
+    parser.add_argument("--buckets", type=int, default=10)
+    parser.add_argument("--batch-ips", type=int, default=500)
+    parser.add_argument("--batches", type=int, default=200)
+    main(parser.parse_args())
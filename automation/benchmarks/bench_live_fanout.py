@@ -0,0 +1,152 @@
+"""
+Load test for the live anomaly push: hundreds of concurrent SSE subscribers
+receiving published anomaly batches. Reports push latency (publish -> client)
+percentiles and deliveries/sec per subscriber count.
+
+By default everything runs in-process: fakeredis stands in for Redis (pass
+--redis-url for a real one) and --replicas AnomalyBroadcasters share the
+subscribers, each client reading its queue through the same SSE framing the
+endpoint uses. With --url, real HTTP clients subscribe to a running API's
+/api/v1/anomalies/stream and batches are posted to /api/v1/anomalies/bulk
+(JWT_SECRET_KEY must match the server's).
+
+    python automation/benchmarks/bench_live_fanout.py --subscribers 100 500 1000
+    JWT_SECRET_KEY=... python automation/benchmarks/bench_live_fanout.py --url http://localhost:8000
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+
+import common  # noqa: F401  (sets up sys.path and env)
+import numpy as np
+
+from app import broadcast
+from app.models import AnomalyReport
+
+def make_batch(size: int) -> list:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        AnomalyReport(source_ip=f"10.0.0.{i % 250 + 1}", score=0.8, event_type="AGG_LOGIN_FAIL",
+                      timestamp=now, details={"sent_at": time.time()})
+        for i in range(size)
+    ]
+
+def latencies_from(chunk: bytes) -> list:
+    """Push latency (s) of every anomaly in one SSE `data:` event."""
+    if not chunk.startswith(b"data: "):
+        return []
+    received = time.time()
+    return [received - a["details"]["sent_at"] for a in json.loads(chunk[len(b"data: "):])]
+
+async def run_in_process(args, n_subscribers: int) -> list:
+    import redis.asyncio as redis_async
+    import fakeredis
+
+    if args.redis_url:
+        clients = [redis_async.from_url(args.redis_url) for _ in range(args.replicas)]
+    else:
+        server = fakeredis.FakeServer()
+        clients = [fakeredis.aioredis.FakeRedis(server=server) for _ in range(args.replicas)]
+    replicas = [broadcast.AnomalyBroadcaster(c, queue_size=args.batches + 1) for c in clients]
+    relays = [asyncio.create_task(b.run()) for b in replicas]
+    await asyncio.sleep(0.2)  # let every relay subscribe
+
+    samples = []
+
+    async def subscriber(index):
+        b = replicas[index % len(replicas)]
+        queue = b.subscribe()
+        received = 0
+        try:
+            async for chunk in broadcast.sse_events(queue):
+                samples.extend(latencies_from(chunk))
+                received += 1
+                if received == args.batches:
+                    return
+        finally:
+            b.unsubscribe(queue)
+
+    clients_done = [asyncio.create_task(subscriber(i)) for i in range(n_subscribers)]
+    await asyncio.sleep(0)
+    for _ in range(args.batches):
+        await replicas[0].publish(make_batch(args.batch_size))
+        await asyncio.sleep(args.interval)
+    await asyncio.wait_for(asyncio.gather(*clients_done), timeout=60)
+    for relay in relays:
+        relay.cancel()
+    await asyncio.gather(*relays, return_exceptions=True)
+    return samples
+
+async def run_against_url(args, n_subscribers: int) -> list:
+    import aiohttp
+    from jose import jwt
+
+    secret = os.environ["JWT_SECRET_KEY"]
+    read_token = jwt.encode({"sub": "bench", "scope": "dashboard:read"}, secret, algorithm="HS256")
+    report_token = jwt.encode({"sub": "bench", "scope": "report_anomaly"}, secret, algorithm="HS256")
+    samples = []
+    connected = asyncio.Semaphore(0)
+
+    async def subscriber(session):
+        headers = {"Authorization": f"Bearer {read_token}"}
+        async with session.get(f"{args.url}/api/v1/anomalies/stream", headers=headers) as resp:
+            resp.raise_for_status()
+            connected.release()
+            received = 0
+            async for line in resp.content:
+                if line.startswith(b"data: "):
+                    samples.extend(latencies_from(line.rstrip()))
+                    received += 1
+                    if received == args.batches:
+                        return
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None)) as session:
+        clients_done = [asyncio.create_task(subscriber(session)) for _ in range(n_subscribers)]
+        for _ in range(n_subscribers):
+            await connected.acquire()
+        for _ in range(args.batches):
+            payload = [a.model_dump(mode="json") for a in make_batch(args.batch_size)]
+            async with session.post(f"{args.url}/api/v1/anomalies/bulk", json=payload,
+                                    headers={"Authorization": f"Bearer {report_token}"}) as resp:
+                resp.raise_for_status()
+            await asyncio.sleep(args.interval)
+        await asyncio.wait_for(asyncio.gather(*clients_done), timeout=60)
+    return samples
+
+async def main_async(args):
+    rows = []
+    for n in args.subscribers:
+        start = time.perf_counter()
+        if args.url:
+            samples = await run_against_url(args, n)
+        else:
+            samples = await run_in_process(args, n)
+        elapsed = time.perf_counter() - start
+        ms = np.array(samples) * 1000
+        rows.append({
+            "subscribers": n,
+            "deliveries": n * args.batches,
+            "deliveries/sec": n * args.batches / elapsed,
+            "p50 ms": float(np.percentile(ms, 50)),
+            "p99 ms": float(np.percentile(ms, 99)),
+            "max ms": float(ms.max()),
+        })
+    target = args.url or f"in-process, {args.replicas} replicas"
+    common.report(
+        f"Live fan-out ({target}, {args.batches} batches x {args.batch_size} anomalies)", rows,
+        ["subscribers", "deliveries", "deliveries/sec", "p50 ms", "p99 ms", "max ms"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.02, help="Seconds between published batches")
+    parser.add_argument("--replicas", type=int, default=2, help="In-process API replicas (broadcasters)")
+    parser.add_argument("--redis-url", help="Real Redis for the in-process mode instead of fakeredis")
+    parser.add_argument("--url", help="Base URL of a running ingest API to load instead")
+    asyncio.run(main_async(parser.parse_args()))
@@ -0,0 +1,127 @@
+"""
+Lines/sec of the log shipper's parser registry, per log format.
+
+A synthetic corpus of --lines lines is generated for each format (sshd, sudo,
+nginx/Apache access, auditd), where roughly --hit-rate of the lines produce an
+event and the rest is realistic noise in the same format, plus a "mixed"
+corpus interleaving all four. Each corpus is parsed by the registry (keyword
+prefilter + dispatch) and, for comparison, by trying every parser's regex on
+every decoded line.
+
+    python automation/benchmarks/bench_log_parsers.py --lines 1000000
+"""
+import argparse
+import random
+import time
+
+import common  # noqa: F401  (sets up sys.path and env)
+
+from parsers import ParserRegistry
+
+HOST_IP = "192.168.1.10"
+
+def ip(rng):
+    return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+def sshd_line(rng, hit):
+    ts = f"Oct 21 10:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} web1 sshd[{rng.randint(100, 65000)}]:"
+    if hit:
+        result = rng.choice(["Failed password for", "Failed password for invalid user", "Accepted publickey for"])
+        return f"{ts} {result} user{rng.randint(0, 999)} from {ip(rng)} port {rng.randint(1024, 65535)} ssh2"
+    return rng.choice([
+        f"{ts} Connection closed by {ip(rng)} port {rng.randint(1024, 65535)} [preauth]",
+        f"{ts} pam_unix(sshd:session): session closed for user deploy",
+        f"{ts} Received disconnect from {ip(rng)} port 22:11: disconnected by user",
+        f"{ts} Disconnected from user deploy {ip(rng)} port 22",
+    ])
+
+def sudo_line(rng, hit):
+    ts = f"Oct 21 10:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} web1"
+    if hit:
+        command = rng.choice(["/usr/bin/vim /etc/hosts", "/usr/bin/systemctl restart nginx", "/usr/bin/id"])
+        prefix = "3 incorrect password attempts ; " if rng.random() < 0.2 else ""
+        return f"{ts} sudo:   user{rng.randint(0, 99)} : {prefix}TTY=pts/0 ; PWD=/home ; USER=root ; COMMAND={command}"
+    return rng.choice([
+        f"{ts} sudo: pam_unix(sudo:session): session opened for user root(uid=0) by deploy(uid=1000)",
+        f"{ts} sudo: pam_unix(sudo:session): session closed for user root",
+        f"{ts} CRON[{rng.randint(100, 65000)}]: pam_unix(cron:session): session opened for user root",
+    ])
+
+def access_line(rng, hit):
+    stamp = f"[21/Oct/2024:10:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} +0000]"
+    if hit:
+        request = rng.choice(['"POST /wp-login.php HTTP/1.1" 401', '"POST /api/login HTTP/1.1" 302',
+                              '"PUT /dav/file.txt HTTP/1.1" 201'])
+    else:
+        request = f'"GET /static/app.{rng.randint(0, 99)}.js HTTP/1.1" {rng.choice([200, 200, 304, 404])}'
+    return f'{ip(rng)} - - {stamp} {request} {rng.randint(100, 90000)} "https://example.com/" "Mozilla/5.0"'
+
+def audit_lines(rng, hit):
+    serial = rng.randint(1, 10**7)
+    head = f"msg=audit(1729504800.{rng.randint(100, 999)}:{serial}):"
+    if hit and rng.random() < 0.5:
+        res = rng.choice(["success", "failed"])
+        return [f"type=USER_AUTH {head} pid=1 uid=0 auid=4294967295 ses=4294967295 msg='op=PAM:authentication "
+                f"grantors=? acct=\"user{rng.randint(0, 99)}\" exe=\"/usr/sbin/sshd\" hostname={ip(rng)} "
+                f"addr={ip(rng)} terminal=ssh res={res}'"]
+    key = 'key="identity"' if hit else "key=(null)"
+    return [
+        f"type=SYSCALL {head} arch=c000003e syscall=257 success=yes exit=3 ppid=1 pid=2 auid=1000 uid=0 "
+        f"comm=\"vim\" exe=\"/usr/bin/vim\" {key}",
+        f"type=CWD {head} cwd=\"/root\"",
+        f"type=PATH {head} item=0 name=\"/etc/\" inode=1 nametype=PARENT",
+        f"type=PATH {head} item=1 name=\"/etc/passwd\" inode=2 nametype=NORMAL",
+        f"type=PROCTITLE {head} proctitle=76696D002F6574632F706173737764",
+    ]
+
+GENERATORS = {"sshd": sshd_line, "sudo": sudo_line, "access": access_line, "audit": audit_lines}
+
+def corpus(fmt: str, n: int, hit_rate: float, rng: random.Random) -> list:
+    lines = []
+    formats = list(GENERATORS) if fmt == "mixed" else [fmt]
+    while len(lines) < n:
+        out = GENERATORS[rng.choice(formats)](rng, rng.random() < hit_rate)
+        lines.extend(out if isinstance(out, list) else [out])
+    return [line.encode() for line in lines[:n]]
+
+def run_registry(lines):
+    registry = ParserRegistry.from_names()
+    start = time.perf_counter()
+    events = sum(1 for raw in lines if registry.parse(raw, HOST_IP) is not None)
+    return time.perf_counter() - start, events
+
+def run_every_parser(lines):
+    parsers = ParserRegistry.from_names().parsers
+    start = time.perf_counter()
+    events = 0
+    for raw in lines:
+        line = raw.decode("utf-8", "replace")
+        for parser in parsers:
+            if parser.parse(line, HOST_IP) is not None:
+                events += 1
+                break
+    return time.perf_counter() - start, events
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=500000, help="Lines per format corpus")
+    parser.add_argument("--hit-rate", type=float, default=0.1, help="Share of lines that are events")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = []
+    for fmt in [*GENERATORS, "mixed"]:
+        lines = corpus(fmt, args.lines, args.hit_rate, rng)
+        dispatched, events = run_registry(lines)
+        naive, naive_events = run_every_parser(lines)
+        rows.append({
+            "format": fmt,
+            "lines": len(lines),
+            "events": events,
+            "lines/sec": len(lines) / dispatched,
+            "every-parser lines/sec": len(lines) / naive,
+            "speedup": naive / dispatched,
+        })
+    common.report(f"Parser registry ({args.hit_rate:.0%} event lines)", rows,
+                  ["format", "lines", "events", "lines/sec", "every-parser lines/sec", "speedup"])
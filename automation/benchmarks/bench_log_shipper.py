@@ -0,0 +1,166 @@
+"""
+Replay throughput of the log shipper over a large synthetic auth.log.
+
+A file of --size-mb is generated (sshd password failures/successes mixed with
+cron, systemd and other sshd noise) and shipped from the start with
+LogShipper.run(follow=False) to a local stub API that decodes every batch.
+For reference, the original engine's loop (readline + per-line regex search,
+no sending) is timed over the first --legacy-mb of the same file.
+
+    python automation/benchmarks/bench_log_shipper.py --size-mb 4096
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import common  # noqa: F401  (sets up sys.path and env)
+
+import log_shipper
+
+NOISE = [
+    "{ts} web1 CRON[{pid}]: pam_unix(cron:session): session opened for user root by (uid=0)",
+    "{ts} web1 systemd[1]: Started Session {pid} of user deploy.",
+    "{ts} web1 sshd[{pid}]: Connection closed by 10.{a}.{b}.{c} port {port} [preauth]",
+    "{ts} web1 sshd[{pid}]: Received disconnect from 10.{a}.{b}.{c} port {port}:11: disconnected by user",
+    "{ts} web1 sudo:   deploy : TTY=pts/0 ; PWD=/home/deploy ; USER=root ; COMMAND=/usr/bin/systemctl restart nginx",
+]
+FAILED = "{ts} web1 sshd[{pid}]: Failed password for {invalid}user{u} from 10.{a}.{b}.{c} port {port} ssh2"
+ACCEPTED = "{ts} web1 sshd[{pid}]: Accepted password for user{u} from 10.{a}.{b}.{c} port {port} ssh2"
+
+def make_block(rng: random.Random, n_lines: int) -> bytes:
+    lines = []
+    for i in range(n_lines):
+        roll = rng.random()
+        template = FAILED if roll < 0.08 else ACCEPTED if roll < 0.10 else rng.choice(NOISE)
+        lines.append(template.format(
+            ts=f"Oct 21 10:{i // 60 % 60:02d}:{i % 60:02d}", pid=rng.randint(1000, 65000),
+            invalid="invalid user " if rng.random() < 0.3 else "", u=rng.randint(0, 5000),
+            a=rng.randint(0, 255), b=rng.randint(0, 255), c=rng.randint(1, 254),
+            port=rng.randint(1024, 65535)))
+    return ("\n".join(lines) + "\n").encode()
+
+def generate(path: str, size_mb: int, seed: int):
+    """Writes ~size_mb of log by repeating a few distinct 4 MB blocks."""
+    rng = random.Random(seed)
+    blocks = [make_block(rng, 40000) for _ in range(4)]
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "wb") as f:
+        while written < target:
+            block = blocks[written // len(blocks[0]) % len(blocks)]
+            f.write(block)
+            written += len(block)
+
+class StubServer:
+    """Accepts batches and counts the decoded events."""
+
+    def __init__(self):
+        self.received = 0
+        self.requests = 0
+        lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, as the real API
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = gzip.decompress(self.rfile.read(int(self.headers["Content-Length"])))
+                with lock:
+                    stub.received += len(json.loads(body))
+                    stub.requests += 1
+                reply = b'{"status": "batch accepted", "rejected": []}'
+                self.send_response(202)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def legacy_parse(line):
+    """The pre-rewrite parse_line: substring checks plus two uncompiled searches."""
+    if "Failed password" in line or "Accepted password" in line:
+        user_match = re.search(r"for (\w+)", line)
+        ip_match = re.search(r"from ([\d\.]+)", line)
+        if user_match and ip_match:
+            return {"username": user_match.group(1), "source_ip": ip_match.group(1),
+                    "success": "Accepted" in line}
+    return None
+
+def run_legacy(path: str, limit_bytes: int) -> dict:
+    lines = events = 0
+    start = time.perf_counter()
+    with open(path) as f:
+        read = 0
+        while read < limit_bytes:
+            line = f.readline()
+            if not line:
+                break
+            read += len(line)
+            lines += 1
+            if legacy_parse(line):
+                events += 1
+    elapsed = time.perf_counter() - start
+    return {"engine": "legacy (parse only)", "MB": read / 2**20, "MB/sec": read / 2**20 / elapsed,
+            "lines/sec": lines / elapsed, "events": events, "requests": 0}
+
+def run_shipper(path: str, args) -> dict:
+    stub = StubServer()
+    with tempfile.TemporaryDirectory() as state_dir:
+        shipper = log_shipper.LogShipper(path, stub.url, "bench-token",
+                                         state_file=os.path.join(state_dir, "state.json"),
+                                         batch_size=args.batch_size, chunk_size=args.chunk_kb * 1024,
+                                         from_start=True)
+        start = time.perf_counter()
+        shipper.run(follow=False)
+        elapsed = time.perf_counter() - start
+    stub.close()
+    assert stub.received == shipper.stats["events"], (stub.received, shipper.stats)
+    mb = shipper.stats["bytes"] / 2**20
+    return {"engine": "chunked + batched", "MB": mb, "MB/sec": mb / elapsed,
+            "lines/sec": shipper.stats["lines"] / elapsed, "events": stub.received,
+            "requests": stub.requests}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--legacy-mb", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--file", help="Replay this file instead of generating one")
+    args = parser.parse_args()
+
+    log_shipper.logging.getLogger().setLevel(log_shipper.logging.WARNING)
+    tmp = None
+    path = args.file
+    if path is None:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "auth.log")
+        start = time.perf_counter()
+        generate(path, args.size_mb, args.seed)
+        print(f"Generated {os.path.getsize(path) / 2**20:.0f} MB in {time.perf_counter() - start:.1f}s")
+    try:
+        rows = [run_legacy(path, args.legacy_mb * 2**20), run_shipper(path, args)]
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    common.report(f"Log shipper replay ({os.path.basename(path)})", rows,
+                  ["engine", "MB", "MB/sec", "lines/sec", "events", "requests"])
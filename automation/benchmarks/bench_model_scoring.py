@@ -0,0 +1,47 @@
+"""
+Compares IsolationForest.decision_function against the worker's array-based
+CompiledForest at batch sizes from 1 to 100k rows, and checks that both give
+the same scores.
+
+    python automation/benchmarks/bench_model_scoring.py --sizes 1 10 100 1000 10000 100000
+"""
+import argparse
+
+import common  # noqa: F401  (sets up sys.path and env)
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from worker.compiled_forest import CompiledForest
+
+def make_model(n_estimators: int):
+    X_train = np.random.RandomState(0).rand(1000, 2) * [5, 10]
+    return IsolationForest(n_estimators=n_estimators, contamination=0.05, random_state=42).fit(X_train)
+
+def main(args):
+    model = make_model(args.trees)
+    compiled = CompiledForest.from_sklearn(model)
+    rng = np.random.RandomState(1)
+    rows = []
+    for size in args.sizes:
+        # Mostly normal rows with some outliers, like the worker's login matrix
+        X = rng.rand(size, 2) * [60, 120]
+        repeat = max(3, min(args.repeat, 2000 // max(size // 100, 1)))
+        sklearn_s, expected = common.timed(model.decision_function, X, repeat=repeat)
+        compiled_s, scores = common.timed(compiled.decision_function, X, repeat=repeat)
+        rows.append({
+            "rows": size,
+            "sklearn ms": sklearn_s * 1e3,
+            "compiled ms": compiled_s * 1e3,
+            "speedup": sklearn_s / compiled_s,
+            "compiled rows/sec": size / compiled_s,
+            "max |diff|": f"{np.abs(scores - expected).max():.1e}",
+        })
+    common.report(f"IsolationForest scoring ({args.trees} trees)", rows,
+                  ["rows", "sklearn ms", "compiled ms", "speedup", "compiled rows/sec", "max |diff|"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000, 100000])
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
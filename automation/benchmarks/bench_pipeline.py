@@ -0,0 +1,409 @@
+"""
+End-to-end pipeline benchmark: ingest RPS, stream lag, event-to-detection latency and DB insert rate.
+
+Everything runs in one process: the load generator drives the FastAPI app
+through httpx's ASGI transport, the app appends to a Redis stream, and a
+worker loop reads the stream with XREADGROUP and hands each batch to the ML
+worker's process_batch, whose bulk report goes back into the app and down to
+the database.
+
+Redis is fakeredis by default; --redis-url uses a running server and
+--spawn-redis starts a throwaway redis-server. The database is an in-memory
+stub of the anomalies table unless --postgres-dsn points at a scratch
+Postgres. Detection latency is measured from the moment the API appended an
+IP's newest event in the batch to the stream (the entry ID's timestamp) to the
+commit of that IP's anomaly row.
+
+Results are written as JSON with --output; --baseline compares against an
+earlier run's file and exits non-zero when a metric regressed by more than
+--tolerance.
+
+    python automation/benchmarks/bench_pipeline.py --rps 50 --batch-size 100 --duration 20
+    python automation/benchmarks/bench_pipeline.py --output new.json --baseline main.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import common  # noqa: F401  (sets up sys.path and env)
+import httpx
+import numpy as np
+import orjson
+from sklearn.ensemble import IsolationForest
+
+import generate
+from app import database, main
+from scenarios import TrafficMix, load_profile, score_detections
+from worker import run_worker
+
+class StubConnection:
+    """Takes the ingest service's anomaly writes and keeps the rows in memory."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.rows.extend(records)
+
+    async def execute(self, query, *args):
+        self.rows.append(args)
+
+class StubPool:
+    """Stands in for the asyncpg pool behind get_postgres_conn_dependency."""
+
+    def __init__(self):
+        self.rows = []
+
+    def acquire(self):
+        return contextlib.nullcontext(StubConnection(self.rows))
+
+    async def close(self):
+        pass
+
+class ASGISession:
+    """
+    The slice of aiohttp.ClientSession that report_anomalies_async uses,
+    sending through an httpx client so reports reach the in-process app.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+
+    def post(self, url, json=None, headers=None):
+        return _PendingResponse(self.client.post(url, json=json, headers=headers))
+
+class _PendingResponse:
+    def __init__(self, request):
+        self._request = request
+        self._response = None
+        self.status = None
+
+    async def __aenter__(self):
+        self._response = await self._request
+        self.status = self._response.status_code
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def text(self):
+        return self._response.text
+
+def entry_time(entry_id) -> float:
+    """Seconds since the epoch at which Redis appended a stream entry."""
+    if isinstance(entry_id, str):
+        entry_id = entry_id.encode()
+    return int(entry_id.split(b"-", 1)[0]) / 1000
+
+class InsertProbe:
+    """
+    Wraps database.log_anomalies_to_db to count rows and time the writes, and
+    to record each anomaly's latency from its IP's newest event in `batch`
+    (the batch the worker is currently processing).
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.calls = 0
+        self.seconds = 0.0
+        self.latencies = []
+        self.detected_ips = set()
+        self.batch = []
+        self._original = None
+
+    def install(self):
+        self._original = database.log_anomalies_to_db
+        database.log_anomalies_to_db = self._log
+
+    def uninstall(self):
+        database.log_anomalies_to_db = self._original
+
+    async def _log(self, anomalies, conn):
+        start = time.perf_counter()
+        await self._original(anomalies, conn)
+        self.seconds += time.perf_counter() - start
+        committed = time.time()
+        self.rows += len(anomalies)
+        self.calls += 1
+        appended = self._newest_entry_per_ip({str(a.source_ip) for a in anomalies})
+        for anomaly in anomalies:
+            ip = str(anomaly.source_ip)
+            self.detected_ips.add(ip)
+            if ip in appended:
+                self.latencies.append(committed - appended[ip])
+
+    def _newest_entry_per_ip(self, ips: set) -> dict:
+        # Only batches that produced anomalies are decoded a second time.
+        newest = {}
+        for entry_id, data in self.batch:
+            ip = orjson.loads(data.get(b"data") or data.get("data"))["source_ip"]
+            if ip in ips:
+                newest[ip] = entry_time(entry_id)
+        return newest
+
+async def worker_loop(r, model, session, probe: InsertProbe, counters: dict, batch_size: int,
+                      stop: asyncio.Event):
+    """
+    The worker's read -> process_batch -> ack cycle, one batch at a time.
+    Runs until `stop` is set and the stream has nothing left to deliver.
+    """
+    await run_worker.create_consumer_group(r)
+    while True:
+        response = await r.xreadgroup(
+            run_worker.CONSUMER_GROUP, "bench-worker", {run_worker.STREAM_NAME: ">"},
+            count=batch_size, block=100,
+        )
+        events = response[0][1] if response else []
+        if not events:
+            if stop.is_set():
+                return
+            # fakeredis ignores `block`, so don't spin on an empty stream
+            await asyncio.sleep(0.005)
+            continue
+        read_at = time.time()
+        counters["queue_delays"].append(read_at - entry_time(events[0][0]))
+        probe.batch = events
+        await run_worker.process_batch(events, model, session)
+        await r.xack(run_worker.STREAM_NAME, run_worker.CONSUMER_GROUP, *[e[0] for e in events])
+        counters["consumed"] += len(events)
+        counters["batches"] += 1
+        counters["first_read"] = counters["first_read"] or read_at
+        counters["last_ack"] = time.time()
+
+async def sample_lag(r, counters: dict, interval: float):
+    """Stream lag: entries appended by the API but not yet processed by the worker."""
+    while True:
+        appended = await r.xlen(run_worker.STREAM_NAME)
+        counters["lag_samples"].append(appended - counters["consumed"])
+        await asyncio.sleep(interval)
+
+def summarize(values: list, scale: float = 1.0) -> dict:
+    values = sorted(values)
+    return {f"p{q}": generate.percentile(values, q) * scale for q in (50, 90, 99)} \
+        | {"max": (values[-1] if values else 0) * scale}
+
+def make_model(path: str = None):
+    if path:
+        import joblib
+        return joblib.load(path)
+    return IsolationForest(contamination=0.05, random_state=42).fit(np.random.RandomState(0).rand(1000, 2) * [5, 10])
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@contextlib.contextmanager
+def spawned_redis():
+    """Starts a throwaway, non-persistent redis-server and yields its URL."""
+    binary = shutil.which("redis-server")
+    if binary is None:
+        sys.exit("--spawn-redis needs redis-server on PATH")
+    port = free_port()
+    proc = subprocess.Popen([binary, "--port", str(port), "--save", "", "--appendonly", "no"],
+                            stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                break
+            if time.monotonic() > deadline:
+                sys.exit("redis-server did not start")
+            time.sleep(0.05)
+        yield f"redis://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.wait()
+
+async def make_redis(redis_url):
+    if redis_url:
+        import redis.asyncio as redis
+        return redis.from_url(redis_url)
+    import fakeredis
+    return fakeredis.aioredis.FakeRedis()
+
+async def make_pool(postgres_dsn):
+    if not postgres_dsn:
+        return StubPool()
+    database.POSTGRES_DSN = postgres_dsn
+    pool = await database.create_postgres_pool()
+    async with pool.acquire() as conn:
+        await database.init_schema(conn)
+    return pool
+
+async def run_pipeline(args, redis_url) -> dict:
+    r = await make_redis(redis_url)
+    await r.delete(run_worker.STREAM_NAME)
+    main.app.state.redis = r
+    main.app.state.postgres_pool = await make_pool(args.postgres_dsn)
+    main.app.state.broadcaster = None
+    model = make_model(args.model)
+
+    probe = InsertProbe()
+    probe.install()
+    counters = {"consumed": 0, "batches": 0, "first_read": None, "last_ack": None,
+                "queue_delays": [], "lag_samples": []}
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=main.app)
+    labels = io.StringIO()
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            worker = asyncio.create_task(worker_loop(r, model, ASGISession(client), probe, counters,
+                                                     args.worker_batch_size, stop))
+            sampler = asyncio.create_task(sample_lag(r, counters, args.sample_interval))
+
+            total_events = int(args.rps * args.duration) * (args.batch_size or 1)
+            mix = TrafficMix(load_profile(args.profile), args.seed, total_events)
+            ingest = await generate.run_load("http://bench/ingest", mix, args.rps, args.duration,
+                                             args.batch_size, labels_file=labels, transport=transport)
+
+            # Let the worker catch up with whatever the load left in the stream
+            load_done = time.perf_counter()
+            appended = await r.xlen(run_worker.STREAM_NAME)
+            while counters["consumed"] < appended and time.perf_counter() - load_done < args.drain_timeout:
+                await asyncio.sleep(0.01)
+            drain_s = time.perf_counter() - load_done
+            stop.set()
+            await worker
+            sampler.cancel()
+    finally:
+        probe.uninstall()
+        await main.app.state.postgres_pool.close()
+        await r.aclose()
+
+    worker_seconds = (counters["last_ack"] or 0) - (counters["first_read"] or 0)
+    ground_truth = [json.loads(line) for line in labels.getvalue().splitlines()]
+    accuracy = score_detections(ground_truth, probe.detected_ips)
+    return {
+        "config": {
+            "profile": args.profile, "seed": args.seed, "rps": args.rps, "duration": args.duration,
+            "batch_size": args.batch_size, "worker_batch_size": args.worker_batch_size,
+            "redis": "fakeredis" if not redis_url else ("spawned" if args.spawn_redis else redis_url),
+            "database": "postgres" if args.postgres_dsn else "stub",
+        },
+        "ingest": {k: ingest[k] for k in ("requests", "ok", "events", "skipped", "errors", "duration_s",
+                                           "achieved_rps", "events_per_sec", "latency_ms")},
+        "stream": {
+            "appended": appended,
+            "lag_events": summarize(counters["lag_samples"]),
+            "queue_delay_ms": summarize(counters["queue_delays"], 1000),
+            "drain_s": drain_s,
+            "unprocessed": appended - counters["consumed"],
+        },
+        "worker": {
+            "events": counters["consumed"],
+            "batches": counters["batches"],
+            "events_per_sec": counters["consumed"] / worker_seconds if worker_seconds > 0 else 0.0,
+        },
+        "detection": {
+            "anomalies": probe.rows,
+            "latency_ms": summarize(probe.latencies, 1000),
+            "precision": accuracy["precision"],
+            "recall": accuracy["recall"],
+        },
+        "database": {
+            "rows": probe.rows,
+            "writes": probe.calls,
+            "insert_seconds": probe.seconds,
+            "rows_per_sec": probe.rows / probe.seconds if probe.seconds else 0.0,
+        },
+    }
+
+# (section, key path, True if higher is better) for --baseline comparisons
+TRACKED = [
+    ("ingest", ("events_per_sec",), True),
+    ("ingest", ("latency_ms", "p99"), False),
+    ("stream", ("lag_events", "max"), False),
+    ("worker", ("events_per_sec",), True),
+    ("detection", ("latency_ms", "p99"), False),
+    ("database", ("rows_per_sec",), True),
+]
+
+def lookup(results: dict, section: str, path: tuple):
+    value = results[section]
+    for key in path:
+        value = value[key]
+    return value
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """One row per tracked metric; `regressed` when it moved the wrong way by more than tolerance."""
+    rows = []
+    for section, path, higher_is_better in TRACKED:
+        new, old = lookup(results, section, path), lookup(baseline, section, path)
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        rows.append({"metric": ".".join((section,) + path), "baseline": float(old), "run": float(new),
+                     "change %": change * 100, "regressed": "YES" if worse > tolerance else ""})
+    return rows
+
+def print_results(results: dict):
+    ingest, stream, detection = results["ingest"], results["stream"], results["detection"]
+    rows = [
+        {"metric": "ingest req/sec", "value": ingest["achieved_rps"]},
+        {"metric": "ingest events/sec", "value": ingest["events_per_sec"]},
+        {"metric": "ingest p99 ms", "value": ingest["latency_ms"]["p99"]},
+        {"metric": "stream lag max (events)", "value": stream["lag_events"]["max"]},
+        {"metric": "stream queue delay p99 ms", "value": stream["queue_delay_ms"]["p99"]},
+        {"metric": "drain after load s", "value": stream["drain_s"]},
+        {"metric": "worker events/sec", "value": results["worker"]["events_per_sec"]},
+        {"metric": "anomalies stored", "value": detection["anomalies"]},
+        {"metric": "detection p50 ms", "value": detection["latency_ms"]["p50"]},
+        {"metric": "detection p99 ms", "value": detection["latency_ms"]["p99"]},
+        {"metric": "detection precision", "value": detection["precision"]},
+        {"metric": "detection recall", "value": detection["recall"]},
+        {"metric": "db rows/sec (write time)", "value": results["database"]["rows_per_sec"]},
+    ]
+    config = results["config"]
+    common.report(f"Pipeline ({config['profile']}, {config['rps']:g} req/s x {config['batch_size'] or 1} events, "
+                  f"redis {config['redis']}, db {config['database']})", rows, ["metric", "value"])
+
+def main_sync(args) -> int:
+    if args.spawn_redis:
+        with spawned_redis() as url:
+            results = asyncio.run(run_pipeline(args, url))
+    else:
+        results = asyncio.run(run_pipeline(args, args.redis_url))
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["config"] != results["config"]:
+            print(f"Note: {args.baseline} was run with a different configuration: {baseline['config']}")
+        rows = compare(results, baseline, args.tolerance)
+        common.report(f"Against {args.baseline} (tolerance {args.tolerance:.0%})", rows,
+                      ["metric", "baseline", "run", "change %", "regressed"])
+        if any(row["regressed"] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profile", default="credential-stuffing", help="Load generator profile")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rps", type=float, default=50, help="Ingest requests per second (open loop)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load")
+    parser.add_argument("--batch-size", type=int, default=100, help="Events per /ingest/batch request (0: /ingest)")
+    parser.add_argument("--worker-batch-size", type=int, default=run_worker.BATCH_SIZE)
+    parser.add_argument("--model", help="joblib model file (default: a small IsolationForest fitted here)")
+    parser.add_argument("--redis-url", help="Use this Redis instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="Start a throwaway redis-server")
+    parser.add_argument("--postgres-dsn", help="Write anomalies to this scratch Postgres instead of a stub")
+    parser.add_argument("--sample-interval", type=float, default=0.1, help="Seconds between stream lag samples")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="Max seconds to wait for the worker after the load")
+    parser.add_argument("--output", help="Write results as JSON here")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression")
+    sys.exit(main_sync(parser.parse_args()))
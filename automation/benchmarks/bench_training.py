@@ -0,0 +1,72 @@
+"""
+Training time and peak RSS of worker.training as the replayed history grows.
+
+Each size trains in a fresh process, so peak RSS is that run's alone; it
+should stay flat as --events grows (IP window + row sample, not history).
+The synthetic source skips JSON decoding; pass --archive to time a real
+export instead (its size is then fixed by the file).
+
+    python automation/benchmarks/bench_training.py --events 1000000,10000000,100000000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import common  # noqa: F401  (sets up sys.path and env)
+
+from worker import training
+
+def run_child(args):
+    """Trains once in this process and prints the measurements as JSON."""
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if args.archive:
+        batches = training.archive_batches(args.archive)
+    else:
+        batches = training.synthetic_batches(args.child, n_ips=args.ips)
+    start = time.perf_counter()
+    _, metadata = training.train(batches, sample_size=args.sample_size, n_estimators=args.n_estimators)
+    print(json.dumps({
+        "events": metadata["events"],
+        "rows seen": metadata["rows_seen"],
+        "replay s": metadata["replay_seconds"],
+        "fit s": metadata["fit_seconds"],
+        "total s": time.perf_counter() - start,
+        "us/event": (time.perf_counter() - start) / metadata["events"] * 1e6,
+        # ru_maxrss is KiB on Linux
+        "peak RSS MiB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "import RSS MiB": baseline_kb / 1024,
+    }))
+
+def main(args):
+    sizes = [0] if args.archive else [int(float(n)) for n in args.events.split(",")]
+    rows = []
+    for n in sizes:
+        command = [sys.executable, __file__, "--child", str(n), "--ips", str(args.ips),
+                   "--sample-size", str(args.sample_size), "--n-estimators", str(args.n_estimators)]
+        if args.archive:
+            command += ["--archive", args.archive]
+        out = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        row = json.loads(out.strip().splitlines()[-1])
+        rows.append(row)
+        print(f"  {row['events']:,} events: {row['total s']:.1f}s, peak RSS {row['peak RSS MiB']:.0f} MiB", flush=True)
+    common.report(f"Training on {args.archive or 'synthetic baseline traffic'} "
+                  f"(sample {args.sample_size:,} rows, {args.n_estimators} trees)",
+                  rows, ["events", "rows seen", "replay s", "fit s", "us/event", "import RSS MiB", "peak RSS MiB"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", default="100000,1000000,5000000",
+                        help="comma-separated event counts for the synthetic source")
+    parser.add_argument("--archive", help="train on this NDJSON(.gz) export instead")
+    parser.add_argument("--ips", type=int, default=50_000, help="distinct source IPs in the synthetic traffic")
+    parser.add_argument("--sample-size", type=int, default=training.SAMPLE_SIZE)
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        run_child(args)
+    else:
+        main(args)
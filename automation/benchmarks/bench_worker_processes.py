@@ -0,0 +1,87 @@
+"""
+Throughput of the worker's CPU path (parse -> features -> IsolationForest)
+with 1..N forked consumer processes, the way `run_worker --processes N` runs
+them: the model is loaded once and the GC heap frozen before fork, so every
+child scores with the same copy-on-write model.
+
+Redis is left out so the numbers show how detection scales with cores.
+
+    python automation/benchmarks/bench_worker_processes.py --max-processes 4
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import time
+
+import common  # noqa: F401  (sets up sys.path and env)
+import numpy as np
+import orjson
+from sklearn.ensemble import IsolationForest
+
+from worker import run_worker
+from worker.ip_stats import IPStatsStore
+
+def make_batches(n_batches: int, batch_size: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    batches = []
+    for b in range(n_batches):
+        events = []
+        for i in range(batch_size):
+            event = {
+                "event_id": f"evt_{b}_{i}",
+                "timestamp": "2025-10-21T10:00:00Z",
+                "source_ip": f"10.0.{rng.integers(0, 8)}.{rng.integers(0, 250)}",
+                "event_type": "LOGIN_ATTEMPT",
+                "username": "root",
+                "success": bool(rng.random() < 0.5),
+            }
+            events.append((f"{b}-{i}".encode(), {b"data": orjson.dumps(event)}))
+        batches.append(events)
+    return batches
+
+def consumer(model, batches, start_event, done_queue):
+    stats = IPStatsStore()
+    start_event.wait()
+    begin = time.perf_counter()
+    events = 0
+    for batch in batches:
+        run_worker.detect_anomalies(batch, model, stats)
+        events += len(batch)
+    done_queue.put((events, time.perf_counter() - begin))
+
+def run(n_processes, model, batches):
+    ctx = multiprocessing.get_context("fork")
+    start_event = ctx.Event()
+    done = ctx.Queue()
+    procs = [ctx.Process(target=consumer, args=(model, batches, start_event, done)) for _ in range(n_processes)]
+    for proc in procs:
+        proc.start()
+    begin = time.perf_counter()
+    start_event.set()
+    results = [done.get() for _ in procs]
+    wall = time.perf_counter() - begin
+    for proc in procs:
+        proc.join()
+    return sum(events for events, _ in results) / wall
+
+def main(args):
+    model = IsolationForest(contamination=0.05, random_state=42).fit(np.random.rand(1000, 2) * [5, 10])
+    batches = make_batches(args.batches, args.batch_size)
+    gc.freeze()
+
+    rows = []
+    baseline = None
+    for n in range(1, args.max_processes + 1):
+        rate = run(n, model, batches)
+        baseline = baseline or rate
+        rows.append({"processes": n, "events/sec": rate, "speedup": rate / baseline, "efficiency": rate / baseline / n})
+    common.report(f"Worker CPU path, {args.batch_size}-event batches ({os.cpu_count()} cores)", rows,
+                  ["processes", "events/sec", "speedup", "efficiency"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count())
+    parser.add_argument("--batches", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=500)
+    main(parser.parse_args())
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+# Benchmarks run the services in-process, straight from their source trees.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "services", "event-ingest-stream"))
+sys.path.insert(0, os.path.join(ROOT, "services", "ml-anomaly-service"))
+sys.path.insert(0, os.path.join(ROOT, "integrations", "python-client"))
+sys.path.insert(0, os.path.join(ROOT, "integrations", "log-shipper"))
+sys.path.insert(0, os.path.join(ROOT, "automation", "data-generator"))
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key")
+
+def timed(fn, *args, repeat: int = 5, **kwargs):
+    """Runs fn `repeat` times and returns (best_seconds, last_result)."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+async def timed_async(coro_fn, *args, repeat: int = 5, **kwargs):
+    """Async counterpart of timed(); coro_fn is called fresh on every run."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await coro_fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def report(title: str, rows: list, columns: list):
+    """Prints benchmark rows (dicts) as an aligned table."""
+    print(f"\n== {title} ==")
+    widths = [max(len(col), *(len(_fmt(row[col])) for row in rows)) for col in columns]
+    print("  ".join(col.rjust(w) for col, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(_fmt(row[col]).rjust(w) for col, w in zip(columns, widths)))
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
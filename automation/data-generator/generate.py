@@ -1,72 +1,191 @@
-import httpx
+"""
+Securify load generator.
+
+Drives the ingest API at a constant, open-loop request rate with a seeded
+traffic profile (see scenarios.py), then reports achieved throughput, latency
+percentiles and errors. Requests are scheduled on a fixed timetable and
+latency is measured from each request's scheduled time, so a slow server shows
+up as latency instead of silently lowering the offered load.
+
+    python generate.py                                    # mixed profile, 100 req/s for 10s
+    python generate.py --profile credential-stuffing --rps 500 --duration 60 --batch-size 100
+    python generate.py --seed 7 --labels labels.jsonl --report report.json
+    python generate.py evaluate --labels labels.jsonl --since 2024-10-21T10:00:00Z
+"""
+import argparse
 import asyncio
-import random
 import datetime
-import time
+import json
 import os
+from collections import Counter
+
+import httpx
 from jose import jwt
 
+from scenarios import PROFILES, TrafficMix, load_profile, score_detections
+
 API_URL = os.environ.get("INGEST_API_URL", "http://event-ingest-stream:8000/ingest")
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
 if not SECRET_KEY:
     raise ValueError("No JWT_SECRET_KEY set for application. Please set the environment variable.")
 ALGORITHM = "HS256"
 
-def create_token():
+def create_token(scope: str = "ingest"):
     payload = {
         "sub": "data-generator",
-        "scope": "ingest"
+        "scope": scope
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-HEADERS = {
-    "Authorization": f"Bearer {create_token()}",
-    "Content-Type": "application/json"
-}
-
-async def send_event(client: httpx.AsyncClient, event_id: int, semaphore: asyncio.Semaphore):
-    """Sends a single, randomly generated security event."""
-    ip = f"192.168.{random.randint(1, 254)}.{random.randint(1, 254)}"
-    event = {
-        "event_id": f"evt_{event_id}_{int(time.time())}",
-        "timestamp": datetime.datetime.now().isoformat(),
-        "source_ip": ip,
-        "event_type": "LOGIN_ATTEMPT",
-        "username": f"user_{random.randint(1, 100)}",
-        "success": random.choice([True, True, True, False]) # 25% fail rate
-    }
-    
-    # Wait to acquire the semaphore before running
-    # This ensures only 100 requests can be active at a time
-    async with semaphore:
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+async def run_load(url: str, mix: TrafficMix, rps: float, duration: float, batch_size: int = 0,
+                   max_in_flight: int = 1000, labels_file=None, transport=None) -> dict:
+    """
+    Sends rps * duration requests on a fixed schedule: single events to `url`
+    (batch_size 0) or batches of batch_size events to `url`/batch. Requests
+    due while max_in_flight are still outstanding are skipped and counted,
+    rather than delayed, to keep the schedule open-loop.
+    """
+    headers = {"Authorization": f"Bearer {create_token()}", "Content-Type": "application/json"}
+    target = url.rstrip("/") + ("/batch" if batch_size else "")
+    n_requests = int(rps * duration)
+    latencies = []
+    errors = Counter()
+    stats = {"sent": 0, "skipped": 0, "events": 0, "max_send_lag_ms": 0.0}
+    in_flight = set()
+    loop = asyncio.get_running_loop()
+
+    async def send(client, body, scheduled):
         try:
-            response = await client.post(API_URL, json=event, headers=HEADERS)
+            response = await client.post(target, json=body, headers=headers)
             if response.status_code != 202:
-                # This is a cleaner error message
-                print(f"Failed to send event {event_id}: HTTP {response.status_code}")
-        except httpx.RequestError as e:
-            # We'll keep this just in case
-            print(f"Request error for event {event_id}: TYPE={type(e)}, REPR={repr(e)}")
-
-async def main():
-    """Generates a high-volume burst of concurrent events."""
-    event_count = 1000
-    
-    # Create a semaphore to limit concurrency
-    concurrency_limit = 100
-    semaphore = asyncio.Semaphore(concurrency_limit)
-    
-    print(f"Sending {event_count} events to {API_URL} (concurrency limit: {concurrency_limit})...")
-    
-    # Set a more generous timeout
-    timeout_config = httpx.Timeout(30.0, connect=10.0)
-    
-    async with httpx.AsyncClient(timeout=timeout_config) as client:
-        # Pass the semaphore to each task
-        tasks = [send_event(client, i, semaphore) for i in range(event_count)]
-        await asyncio.gather(*tasks)
-        
-    print(f"Sent {event_count} events.")
+                errors[f"HTTP {response.status_code}"] += 1
+                return
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] += 1
+            return
+        latencies.append(loop.time() - scheduled)
+
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    timeout = httpx.Timeout(30.0, connect=10.0)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, transport=transport) as client:
+        start = loop.time()
+        for i in range(n_requests):
+            scheduled = start + i / rps
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stats["max_send_lag_ms"] = max(stats["max_send_lag_ms"], (loop.time() - scheduled) * 1000)
+            # Events are drawn even for skipped requests so the sequence stays reproducible.
+            drawn = [mix.next() for _ in range(batch_size or 1)]
+            if len(in_flight) >= max_in_flight:
+                stats["skipped"] += 1
+                continue
+            if labels_file is not None:
+                labels_file.writelines(json.dumps(label) + "\n" for _, label in drawn)
+            body = [event for event, _ in drawn] if batch_size else drawn[0][0]
+            task = asyncio.create_task(send(client, body, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            stats["sent"] += 1
+            stats["events"] += len(drawn)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        elapsed = loop.time() - start
+
+    latencies.sort()
+    ok = len(latencies)
+    return {
+        "target": target,
+        "target_rps": rps,
+        "duration_s": elapsed,
+        "requests": stats["sent"],
+        "ok": ok,
+        "achieved_rps": ok / elapsed if elapsed else 0.0,
+        "events_per_sec": ok * (batch_size or 1) / elapsed if elapsed else 0.0,
+        "events": stats["events"],
+        "skipped": stats["skipped"],
+        "errors": dict(errors),
+        "max_send_lag_ms": stats["max_send_lag_ms"],
+        "latency_ms": {f"p{q}": percentile(latencies, q) * 1000 for q in (50, 90, 99, 99.9)}
+                      | {"max": (latencies[-1] if latencies else 0.0) * 1000},
+    }
+
+def print_report(report: dict):
+    print(f"Target: {report['target']} at {report['target_rps']:.0f} req/s")
+    print(f"  requests {report['requests']} ok {report['ok']} skipped {report['skipped']} "
+          f"in {report['duration_s']:.1f}s")
+    print(f"  achieved {report['achieved_rps']:.1f} req/s, {report['events_per_sec']:.1f} events/s")
+    print("  latency ms " + "  ".join(f"{k} {v:.1f}" for k, v in report["latency_ms"].items()))
+    print(f"  errors {report['errors'] or 'none'}")
+
+async def fetch_detected_ips(api_base: str, since: str) -> set:
+    """Source IPs of every anomaly reported since `since`, following X-Next-Cursor."""
+    headers = {"Authorization": f"Bearer {create_token('dashboard:read')}"}
+    params = {"since": since, "limit": 1000, "fields": "source_ip"}
+    ips = set()
+    async with httpx.AsyncClient(timeout=30) as client:
+        while True:
+            response = await client.get(f"{api_base}/api/v1/anomalies", params=params, headers=headers)
+            response.raise_for_status()
+            ips.update(row["source_ip"] for row in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return ips
+            params["cursor"] = cursor
+
+def evaluate(args):
+    with open(args.labels, encoding="utf-8") as f:
+        labels = [json.loads(line) for line in f if line.strip()]
+    api_base = API_URL.rsplit("/ingest", 1)[0]
+    detected = asyncio.run(fetch_detected_ips(api_base, args.since))
+    result = score_detections(labels, detected)
+    print(json.dumps(result, indent=2))
+
+def main(args):
+    profile = load_profile(args.profile)
+    total_events = int(args.rps * args.duration) * (args.batch_size or 1)
+    mix = TrafficMix(profile, args.seed, total_events)
+    started = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    print(f"Profile {args.profile} (seed {args.seed}): {args.rps} req/s for {args.duration}s"
+          f"{f' in batches of {args.batch_size}' if args.batch_size else ''} -> {API_URL}")
+    labels_file = open(args.labels, "w", encoding="utf-8") if args.labels else None
+    try:
+        report = asyncio.run(run_load(API_URL, mix, args.rps, args.duration, args.batch_size,
+                                      args.max_in_flight, labels_file))
+    finally:
+        if labels_file is not None:
+            labels_file.close()
+    report.update(profile=args.profile, seed=args.seed, started=started)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.labels:
+        print(f"Labels in {args.labels}; score with: python generate.py evaluate "
+              f"--labels {args.labels} --since {started}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Securify load generator")
+    sub = parser.add_subparsers(dest="command")
+    score = sub.add_parser("evaluate", help="Score reported anomalies against a run's labels")
+    score.add_argument("--labels", required=True, help="Labels file written by a run")
+    score.add_argument("--since", required=True, help="Run start time (printed by the run)")
+    parser.add_argument("--profile", default="mixed",
+                        help=f"Built-in profile ({', '.join(PROFILES)}) or a JSON profile file")
+    parser.add_argument("--rps", type=float, default=100, help="Requests per second (open loop)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run")
+    parser.add_argument("--batch-size", type=int, default=0, help="Events per request to /ingest/batch (0: single events to /ingest)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for a reproducible run")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Outstanding requests before new ones are skipped")
+    parser.add_argument("--labels", help="Write ground-truth labels (JSON lines) here")
+    parser.add_argument("--report", help="Write the report as JSON here")
+    args = parser.parse_args()
+    if args.command == "evaluate":
+        evaluate(args)
+    else:
+        main(args)
@@ -0,0 +1,211 @@
+"""
+Seeded traffic scenarios for the load generator.
+
+Every scenario draws from its own random.Random derived from the run seed, so
+the same seed and profile always produce the same events in the same order,
+whatever the achieved send rate. Each event comes with a ground-truth label
+(the scenario that produced it and whether it is malicious) so detector output
+can be scored for precision and recall afterwards.
+"""
+import datetime
+import itertools
+import json
+import random
+
+SENSITIVE_FILES = (
+    "/etc/passwd", "/etc/shadow", "/etc/sudoers", "/etc/ssh/sshd_config", "/etc/crontab",
+    "/root/.ssh/authorized_keys", "/usr/bin/sudo", "/usr/sbin/sshd", "/etc/hosts", "/etc/ld.so.preload",
+)
+
+def login_event(event_id: str, timestamp: str, ip: str, username: str, success: bool) -> dict:
+    return {"event_id": event_id, "timestamp": timestamp, "source_ip": ip,
+            "event_type": "LOGIN_ATTEMPT", "username": username, "success": success}
+
+def file_change_event(event_id: str, timestamp: str, ip: str, file_path: str, user_id: str) -> dict:
+    return {"event_id": event_id, "timestamp": timestamp, "source_ip": ip,
+            "event_type": "FILE_CHANGE", "file_path": file_path, "user_id": user_id}
+
+class Scenario:
+    """A source of events; `make(event_id, timestamp)` returns the next one."""
+    name = ""
+    malicious = False
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def make(self, event_id: str, timestamp: str) -> dict:
+        raise NotImplementedError
+
+class Baseline(Scenario):
+    """
+    Ordinary users: each has a home address in 10.0.0.0/8, activity follows a
+    long-tailed popularity curve, a few percent of logins fail (typos), and
+    some events are routine file edits under the user's home directory.
+    """
+    name = "baseline"
+
+    def __init__(self, rng, users: int = 500, fail_rate: float = 0.05, file_change_share: float = 0.1):
+        super().__init__(rng)
+        self.users = [f"user{i:04d}" for i in range(users)]
+        self.home_ip = {u: f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+                        for u in self.users}
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(users)))
+        self.fail_rate = fail_rate
+        self.file_change_share = file_change_share
+
+    def make(self, event_id, timestamp):
+        user = self.rng.choices(self.users, cum_weights=self.cum_weights)[0]
+        ip = self.home_ip[user]
+        if self.rng.random() < self.file_change_share:
+            path = f"/home/{user}/{self.rng.choice(['notes.txt', 'app.log', '.bashrc', 'report.csv'])}"
+            return file_change_event(event_id, timestamp, ip, path, user)
+        return login_event(event_id, timestamp, ip, user, self.rng.random() >= self.fail_rate)
+
+class CredentialStuffing(Scenario):
+    """A handful of hosts (203.0.113.0/24) trying leaked usernames; nearly all fail."""
+    name = "credential_stuffing"
+    malicious = True
+
+    def __init__(self, rng, ips: int = 5, success_rate: float = 0.01):
+        super().__init__(rng)
+        self.ips = [f"203.0.113.{i + 1}" for i in range(ips)]
+        self.success_rate = success_rate
+
+    def make(self, event_id, timestamp):
+        username = f"{self.rng.choice(['john', 'maria', 'wei', 'admin', 'test'])}{self.rng.randint(0, 99999)}"
+        return login_event(event_id, timestamp, self.rng.choice(self.ips), username,
+                           self.rng.random() < self.success_rate)
+
+class SlowBruteForce(Scenario):
+    """
+    Low-and-slow password guessing against a few accounts from 198.51.100.0/24.
+    Given a small share of the rate, each worker batch sees at most one or two
+    attempts per address, which a per-batch detector cannot see.
+    """
+    name = "slow_brute_force"
+    malicious = True
+
+    def __init__(self, rng, ips: int = 3, targets=("root", "admin", "deploy")):
+        super().__init__(rng)
+        self.ips = [f"198.51.100.{i + 1}" for i in range(ips)]
+        self.targets = list(targets)
+
+    def make(self, event_id, timestamp):
+        return login_event(event_id, timestamp, self.rng.choice(self.ips), self.rng.choice(self.targets), False)
+
+class FileChangeBurst(Scenario):
+    """A compromised account (from 192.0.2.0/24) rewriting sensitive system files."""
+    name = "file_change_burst"
+    malicious = True
+
+    def __init__(self, rng, ips: int = 2, user_id: str = "svc-backup"):
+        super().__init__(rng)
+        self.ips = [f"192.0.2.{i + 1}" for i in range(ips)]
+        self.user_id = user_id
+
+    def make(self, event_id, timestamp):
+        return file_change_event(event_id, timestamp, self.rng.choice(self.ips),
+                                 self.rng.choice(SENSITIVE_FILES), self.user_id)
+
+SCENARIOS = {s.name: s for s in (Baseline, CredentialStuffing, SlowBruteForce, FileChangeBurst)}
+
+# Each entry: scenario, share of the event rate while active, and the active
+# window as fractions of the run. Extra keys are passed to the scenario.
+PROFILES = {
+    "baseline": [
+        {"scenario": "baseline", "share": 1.0},
+    ],
+    "mixed": [
+        {"scenario": "baseline", "share": 0.90},
+        {"scenario": "credential_stuffing", "share": 0.06, "start": 0.2, "end": 0.5},
+        {"scenario": "slow_brute_force", "share": 0.005},
+        {"scenario": "file_change_burst", "share": 0.035, "start": 0.6, "end": 0.7},
+    ],
+    "credential-stuffing": [
+        {"scenario": "baseline", "share": 0.7},
+        {"scenario": "credential_stuffing", "share": 0.3},
+    ],
+    "slow-brute-force": [
+        {"scenario": "baseline", "share": 0.99},
+        {"scenario": "slow_brute_force", "share": 0.01},
+    ],
+    "file-burst": [
+        {"scenario": "baseline", "share": 0.8},
+        {"scenario": "file_change_burst", "share": 0.2, "start": 0.4, "end": 0.6},
+    ],
+}
+
+def load_profile(name_or_path: str) -> list:
+    """A built-in profile by name, or a JSON file with the same structure."""
+    if name_or_path in PROFILES:
+        return PROFILES[name_or_path]
+    with open(name_or_path, encoding="utf-8") as f:
+        profile = json.load(f)
+    unknown = {entry["scenario"] for entry in profile} - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios in profile: {', '.join(sorted(unknown))}")
+    return profile
+
+class TrafficMix:
+    """
+    Interleaves a profile's scenarios. Which scenario produces event i depends
+    only on the seed and i's position in the run (i / total), never on the
+    clock, so a run is reproducible even when the target rate is not reached.
+    """
+
+    def __init__(self, profile: list, seed: int, total_events: int):
+        self.total = max(total_events, 1)
+        self.rng = random.Random(f"{seed}:mix")
+        self.run_id = f"lg{seed}"
+        self.components = []
+        for index, entry in enumerate(profile):
+            options = {k: v for k, v in entry.items() if k not in ("scenario", "share", "start", "end")}
+            scenario = SCENARIOS[entry["scenario"]](random.Random(f"{seed}:{index}:{entry['scenario']}"), **options)
+            self.components.append((scenario, entry["share"], entry.get("start", 0.0), entry.get("end", 1.0)))
+        self._counter = itertools.count()
+
+    def next(self) -> tuple:
+        """Returns (event, label) for the next event of the run."""
+        i = next(self._counter)
+        position = i / self.total
+        active = [(s, share) for s, share, start, end in self.components if start <= position < end]
+        if not active:
+            active = [(self.components[0][0], 1.0)]
+        scenario = self.rng.choices([s for s, _ in active], weights=[w for _, w in active])[0]
+        timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        event = scenario.make(f"{self.run_id}-{i}", timestamp)
+        label = {"event_id": event["event_id"], "source_ip": event["source_ip"],
+                 "scenario": scenario.name, "malicious": scenario.malicious}
+        return event, label
+
+def score_detections(labels: list, detected_ips) -> dict:
+    """
+    Per-IP precision/recall of a detector against ground-truth labels. An IP
+    is malicious if any of its labelled events is; detections of addresses
+    this run never used are ignored.
+    """
+    malicious = {}
+    seen = set()
+    for label in labels:
+        seen.add(label["source_ip"])
+        if label["malicious"]:
+            malicious.setdefault(label["source_ip"], label["scenario"])
+    detected = set(detected_ips) & seen
+    true_positives = detected & set(malicious)
+    precision = len(true_positives) / len(detected) if detected else 0.0
+    recall = len(true_positives) / len(malicious) if malicious else 0.0
+    per_scenario = {}
+    for ip, scenario in malicious.items():
+        stats = per_scenario.setdefault(scenario, {"ips": 0, "detected": 0})
+        stats["ips"] += 1
+        stats["detected"] += ip in detected
+    for stats in per_scenario.values():
+        stats["recall"] = stats["detected"] / stats["ips"]
+    return {
+        "precision": precision,
+        "recall": recall,
+        "true_positives": len(true_positives),
+        "false_positives": len(detected - true_positives),
+        "false_negatives": len(set(malicious) - detected),
+        "by_scenario": per_scenario,
+    }
@@ -0,0 +1,140 @@
+import gzip
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The services and integrations are not installed packages; make their source trees importable
+# so in-process tests can exercise them without a live deployment.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "services", "event-ingest-stream"))
+sys.path.insert(0, os.path.join(ROOT, "services", "ml-anomaly-service"))
+sys.path.insert(0, os.path.join(ROOT, "integrations", "python-client"))
+sys.path.insert(0, os.path.join(ROOT, "integrations", "log-shipper"))
+sys.path.insert(0, os.path.join(ROOT, "automation", "data-generator"))
+
+# Both services refuse to import without a signing key.
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key")
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+    async def text(self):
+        return ""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeSession:
+    """Stands in for aiohttp.ClientSession; records every POST it receives."""
+
+    def __init__(self, status=201):
+        self.status = status
+        self.posts = []
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        self.posts.append({"url": url, "json": json, "headers": headers})
+        return FakeResponse(self.status)
+
+class StubIngestServer:
+    """
+    Local HTTP server standing in for the ingest API. Records every decoded
+    batch posted to it; `statuses` lists the codes to answer with in turn
+    (202 once it runs out).
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.headers = []
+        self.statuses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status = stub.statuses.pop(0) if stub.statuses else 202
+                if status < 300:
+                    if self.headers.get("Content-Encoding") == "gzip":
+                        body = gzip.decompress(body)
+                    stub.headers.append(dict(self.headers))
+                    stub.batches.append(json.loads(body))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"status": "batch accepted", "rejected": []}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def events(self) -> list:
+        return [event for batch in self.batches for event in batch]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_api():
+    server = StubIngestServer()
+    yield server
+    server.close()
+
+@pytest.fixture
+def fake_session():
+    return FakeSession()
+
+@pytest.fixture
+def make_batch():
+    """Builds raw stream entries: `fails_per_ip` failed root logins from each of `n_attackers` IPs."""
+    import orjson
+
+    def build(n_attackers, fails_per_ip=30):
+        events = []
+        for ip in range(n_attackers):
+            for i in range(fails_per_ip):
+                event = {
+                    "event_id": f"evt_{ip}_{i}",
+                    "timestamp": "2025-10-21T10:00:00Z",
+                    "source_ip": f"10.0.0.{ip + 1}",
+                    "event_type": "LOGIN_ATTEMPT",
+                    "username": "root",
+                    "success": False,
+                }
+                events.append((f"{ip}-{i}".encode(), {b"data": orjson.dumps(event)}))
+        return events
+    return build
+
+@pytest.fixture(scope="session")
+def trained_model():
+    """A small IsolationForest on (failed logins, file changes), like the original dummy model."""
+    import numpy as np
+    from sklearn.ensemble import IsolationForest
+
+    rng = np.random.RandomState(0)
+    X_train = rng.rand(1000, 2)
+    X_train[:, 0] *= 5
+    X_train[:, 1] *= 10
+    return IsolationForest(contamination=0.05, random_state=42).fit(X_train)
+
+@pytest.fixture
+def fresh_worker_stats(monkeypatch):
+    """Empty sliding windows (and report cooldowns) for tests that go through run_worker.process_batch."""
+    from worker import detectors, run_worker
+    from worker.ip_stats import IPStatsStore
+
+    monkeypatch.setattr(run_worker, "ip_stats", IPStatsStore(run_worker.STATS_WINDOW_SECONDS, run_worker.STATS_BUCKETS))
+    monkeypatch.setattr(run_worker, "keyed_detectors", detectors.create_detectors(
+        window_seconds=run_worker.STATS_WINDOW_SECONDS, n_buckets=run_worker.STATS_BUCKETS,
+        cooldown=run_worker.REPORT_COOLDOWN_SECONDS))
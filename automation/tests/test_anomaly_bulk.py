@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+import httpx
+from jose import jwt
+
+from app import database, main
+from worker import run_worker
+
+TOKEN = jwt.encode({"sub": "ml-worker", "scope": "report_anomaly"}, os.environ["JWT_SECRET_KEY"], algorithm="HS256")
+
+def make_report(i):
+    return {
+        "source_ip": f"10.0.0.{i}",
+        "score": 0.8,
+        "event_type": "AGG_LOGIN_FAIL",
+        "timestamp": "2025-10-21T10:00:00Z",
+        "details": {"failed_logins": 30},
+    }
+
+def test_bulk_endpoint_writes_all_reports_in_one_call(monkeypatch):
+    written = []
+
+    async def fake_log(anomalies, conn):
+        written.append(anomalies)
+
+    async def fake_conn():
+        yield None
+
+    monkeypatch.setattr(database, "log_anomalies_to_db", fake_log)
+    main.app.dependency_overrides[main.get_postgres_conn_dependency] = fake_conn
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/v1/anomalies/bulk",
+                json=[make_report(i) for i in range(1, 26)],
+                headers={"Authorization": f"Bearer {TOKEN}"},
+            )
+    try:
+        response = asyncio.run(run())
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 201
+    assert response.json() == {"status": "anomalies logged", "count": 25}
+    assert len(written) == 1 and len(written[0]) == 25
+
+def test_worker_sends_one_bulk_call_per_batch(fake_session, trained_model, fresh_worker_stats, make_batch):
+    asyncio.run(run_worker.process_batch(make_batch(12), trained_model, fake_session))
+    assert len(fake_session.posts) == 1
+    assert fake_session.posts[0]["url"].endswith("/api/v1/anomalies/bulk")
+    # The per-IP model's reports; the username detector adds one for "root"
+    assert sum(r["event_type"] == "AGG_LOGIN_FAIL" for r in fake_session.posts[0]["json"]) == 12
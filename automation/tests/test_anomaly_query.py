@@ -0,0 +1,104 @@
+import asyncio
+import datetime
+import os
+
+import httpx
+from jose import jwt
+
+from app import database, main
+
+TOKEN = jwt.encode({"sub": "analyst", "scope": "dashboard:read"}, os.environ["JWT_SECRET_KEY"], algorithm="HS256")
+HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+T0 = datetime.datetime(2025, 10, 21, 10, 0, tzinfo=datetime.timezone.utc)
+
+class FakeConn:
+    """Answers anomaly queries from canned rows already in (timestamp, id) DESC order."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        rows = self.rows
+        if "(timestamp, id) <" in sql:
+            cursor = (args[0], args[1])
+            rows = [r for r in rows if (r["timestamp"], r["id"]) < cursor]
+        return rows[:args[-1]]
+
+def make_rows(n):
+    # Pairs of rows share a timestamp so the id tie-breaker matters.
+    return [
+        {
+            "id": n - i,
+            "source_ip": f"10.0.0.{i}",
+            "score": 0.9,
+            "event_type": "AGG_LOGIN_FAIL",
+            "timestamp": T0 - datetime.timedelta(minutes=i // 2),
+            "details": "{}",
+        }
+        for i in range(n)
+    ]
+
+def get(conn, params=None):
+    async def fake_conn():
+        yield conn
+
+    main.app.dependency_overrides[main.get_postgres_conn_dependency] = fake_conn
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/v1/anomalies", params=params or {}, headers=HEADERS)
+    try:
+        return asyncio.run(run())
+    finally:
+        main.app.dependency_overrides.clear()
+
+def test_default_response_is_still_a_plain_list():
+    response = get(FakeConn(make_rows(5)))
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert "x-next-cursor" not in response.headers
+
+def test_cursor_walks_every_row_exactly_once():
+    conn = FakeConn(make_rows(25))
+    seen, cursor = [], None
+    for _ in range(10):
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        response = get(conn, params)
+        seen.extend(row["id"] for row in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert seen == list(range(25, 0, -1))
+
+def test_filters_become_parameters_not_sql_text():
+    conn = FakeConn([])
+    get(conn, {
+        "since": "2025-10-20T00:00:00Z", "source_ip": "10.1.2.3/16",
+        "event_type": "AGG_LOGIN_FAIL'; DROP TABLE anomalies; --", "min_score": 0.5,
+    })
+    sql, args = conn.queries[0]
+    assert "source_ip::inet <<= $2::inet" in sql
+    assert "DROP TABLE" not in sql
+    assert args[1] == "10.1.0.0/16"
+    assert args[-1] == 101  # limit + 1 to detect another page
+
+def test_fields_limits_returned_columns():
+    conn = FakeConn(make_rows(3))
+    response = get(conn, {"fields": "source_ip,score"})
+    assert response.json()[0] == {"source_ip": "10.0.0.0", "score": 0.9}
+    assert conn.queries[0][0].startswith("SELECT id, timestamp, source_ip, score FROM")
+
+def test_invalid_parameters_are_rejected():
+    conn = FakeConn([])
+    assert get(conn, {"fields": "password"}).status_code == 422
+    assert get(conn, {"source_ip": "not-an-ip"}).status_code == 422
+    assert get(conn, {"cursor": "garbage"}).status_code == 400
+    assert get(conn, {"limit": 0}).status_code == 422
+    assert conn.queries == []
+
+def test_cursor_round_trip():
+    cursor = database.encode_cursor(T0, 42)
+    assert database.decode_cursor(cursor) == (T0, 42)
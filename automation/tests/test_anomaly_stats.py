@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+import os
+
+import httpx
+from jose import jwt
+
+from app import main
+
+TOKEN = jwt.encode({"sub": "analyst", "scope": "dashboard:read"}, os.environ["JWT_SECRET_KEY"], algorithm="HS256")
+HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+
+class FakeConn:
+    """Records aggregate queries and answers them with canned rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        return self.rows
+
+def get(conn, path, params=None):
+    async def fake_conn():
+        yield conn
+
+    main.app.dependency_overrides[main.get_postgres_conn_dependency] = fake_conn
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(f"/api/v1/anomalies/stats/{path}", params=params or {}, headers=HEADERS)
+    try:
+        return asyncio.run(run())
+    finally:
+        main.app.dependency_overrides.clear()
+
+def test_top_ips_aggregates_in_sql_over_default_window():
+    conn = FakeConn([{"source_ip": "10.0.0.1", "count": 42, "max_score": 0.9, "last_seen": None}])
+    response = get(conn, "top-ips", {"limit": 5})
+    assert response.status_code == 200
+    assert response.json()[0]["count"] == 42
+    sql, (since, until, limit) = conn.queries[0]
+    assert "GROUP BY source_ip" in sql and "ORDER BY count DESC" in sql
+    assert until - since == datetime.timedelta(hours=24)
+    assert limit == 5
+
+def test_top_ips_can_rank_by_max_score():
+    conn = FakeConn([])
+    get(conn, "top-ips", {"order_by": "max_score"})
+    assert "ORDER BY max_score DESC" in conn.queries[0][0]
+    assert get(conn, "top-ips", {"order_by": "source_ip; --"}).status_code == 422
+
+def test_timeseries_buckets_and_percentiles():
+    conn = FakeConn([{"bucket": "2025-10-21T10:00:00Z", "count": 3,
+                      "p50_score": 0.7, "p95_score": 0.9, "max_score": 0.95}])
+    response = get(conn, "timeseries", {
+        "since": "2025-10-21T00:00:00Z", "until": "2025-10-22T00:00:00Z", "bucket_seconds": 900,
+    })
+    assert response.status_code == 200
+    sql, args = conn.queries[0]
+    assert "date_bin" in sql and "percentile_cont(0.95)" in sql
+    assert args[2] == 900
+
+def test_timeseries_rejects_too_many_buckets_and_inverted_windows():
+    conn = FakeConn([])
+    params = {"since": "2020-01-01T00:00:00Z", "until": "2025-01-01T00:00:00Z", "bucket_seconds": 60}
+    assert get(conn, "timeseries", params).status_code == 422
+    inverted = {"since": "2025-10-22T00:00:00Z", "until": "2025-10-21T00:00:00Z"}
+    assert get(conn, "event-types", inverted).status_code == 422
+    assert conn.queries == []
+
+def test_naive_timestamps_are_treated_as_utc():
+    conn = FakeConn([])
+    response = get(conn, "event-types", {"since": "2025-10-21T00:00:00"})
+    assert response.status_code == 200
+    since = conn.queries[0][1][0]
+    assert since.tzinfo is not None
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+
+import fakeredis
+import httpx
+from jose import jwt
+
+from app import broadcast, database, main
+from app.models import AnomalyReport
+
+TOKEN = jwt.encode({"sub": "ml-worker", "scope": "report_anomaly"}, os.environ["JWT_SECRET_KEY"], algorithm="HS256")
+
+def make_report(i):
+    return AnomalyReport(source_ip=f"10.0.0.{i}", score=0.8, event_type="AGG_LOGIN_FAIL",
+                         timestamp="2025-10-21T10:00:00Z", details={})
+
+async def subscribers(broadcaster):
+    return (await broadcaster.r.pubsub_numsub(broadcaster.channel))[0][1]
+
+async def started(broadcaster):
+    """Starts the relay and waits until its Redis subscription is live."""
+    before = await subscribers(broadcaster)
+    task = asyncio.create_task(broadcaster.run())
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if await subscribers(broadcaster) > before:
+            break
+    return task
+
+def test_published_batch_reaches_every_subscriber_on_every_replica():
+    async def run():
+        server = fakeredis.FakeServer()
+        replicas = [broadcast.AnomalyBroadcaster(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(2)]
+        tasks = [await started(b) for b in replicas]
+        queues = [b.subscribe() for b in replicas for _ in range(3)]
+
+        await replicas[0].publish([make_report(1), make_report(2)])
+        received = [await asyncio.wait_for(q.get(), timeout=2) for q in queues]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return received
+
+    received = asyncio.run(run())
+    assert len(received) == 6
+    assert all(json.loads(m)[1]["source_ip"] == "10.0.0.2" for m in received)
+
+def test_slow_subscriber_drops_oldest_instead_of_blocking_others():
+    b = broadcast.AnomalyBroadcaster(None, queue_size=2)
+
+    async def run():
+        slow, fast = b.subscribe(), b.subscribe()
+        drained = []
+        for i in range(5):
+            b.deliver(f"{i}".encode())
+            drained.append(fast.get_nowait())
+        return [slow.get_nowait() for _ in range(slow.qsize())], drained
+
+    slow, fast = asyncio.run(run())
+    assert slow == [b"3", b"4"]
+    assert fast == [f"{i}".encode() for i in range(5)]
+
+def test_sse_framing_and_keepalive():
+    async def run():
+        queue = asyncio.Queue()
+        events = broadcast.sse_events(queue, keepalive=0.01)
+        keepalive = await events.__anext__()
+        queue.put_nowait(b'[{"score": 0.8}]')
+        return keepalive, await events.__anext__()
+
+    assert asyncio.run(run()) == (b": keepalive\n\n", b'data: [{"score": 0.8}]\n\n')
+
+def test_bulk_report_is_published_live(monkeypatch):
+    async def fake_log(anomalies, conn):
+        pass
+
+    async def fake_conn():
+        yield None
+
+    monkeypatch.setattr(database, "log_anomalies_to_db", fake_log)
+    main.app.dependency_overrides[main.get_postgres_conn_dependency] = fake_conn
+
+    async def run():
+        main.app.state.broadcaster = broadcast.AnomalyBroadcaster(fakeredis.aioredis.FakeRedis())
+        task = await started(main.app.state.broadcaster)
+        queue = main.app.state.broadcaster.subscribe()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post(
+                "/api/v1/anomalies/bulk",
+                json=[make_report(i).model_dump(mode="json") for i in range(3)],
+                headers={"Authorization": f"Bearer {TOKEN}"},
+            )
+        message = await asyncio.wait_for(queue.get(), timeout=2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return message
+    try:
+        message = asyncio.run(run())
+    finally:
+        main.app.dependency_overrides.clear()
+        del main.app.state.broadcaster
+
+    assert [a["source_ip"] for a in json.loads(message)] == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
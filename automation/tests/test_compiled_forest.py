@@ -0,0 +1,48 @@
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from worker import run_worker
+from worker.compiled_forest import CompiledForest, average_path_length, export_forest
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"max_features": 1},
+    {"max_samples": 40, "n_estimators": 25},
+    {"contamination": "auto"},
+])
+def test_scores_match_sklearn(options):
+    rng = np.random.RandomState(3)
+    model = IsolationForest(random_state=0, **options).fit(rng.rand(800, 2) * [5, 10])
+    compiled = CompiledForest.from_sklearn(model)
+    X = np.vstack((rng.rand(3000, 2) * [60, 120], rng.randint(0, 40, (500, 2))))
+    # Points exactly on split thresholds must fall on the same side as in sklearn
+    X[:50, 0] = model.estimators_[0].tree_.threshold[0]
+    np.testing.assert_allclose(compiled.decision_function(X), model.decision_function(X), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+
+def test_average_path_length_matches_the_paper():
+    assert list(average_path_length([0, 1, 2])) == [0.0, 0.0, 1.0]
+    n = 256
+    assert average_path_length([n])[0] == pytest.approx(2 * (np.log(n - 1) + np.euler_gamma) - 2 * (n - 1) / n)
+
+def test_exported_artifact_round_trips_memory_mapped(tmp_path, trained_model):
+    path = tmp_path / "model.joblib"
+    joblib.dump(export_forest(trained_model), path)
+    compiled = CompiledForest(joblib.load(path, mmap_mode="r"))
+    assert isinstance(compiled.threshold, np.memmap)
+    X = np.array([[0.0, 0.0], [2.0, 5.0], [50.0, 100.0]])
+    np.testing.assert_allclose(compiled.decision_function(X), trained_model.decision_function(X), atol=1e-12)
+
+def test_worker_reports_the_same_anomalies_with_the_compiled_model(trained_model, make_batch):
+    events = make_batch(8) + make_batch(4, fails_per_ip=4)
+    expected = run_worker.detect_anomalies(events, trained_model)
+    reports = run_worker.detect_anomalies(events, CompiledForest.from_sklearn(trained_model))
+    key = lambda r: r["source_ip"]
+    assert [(r["source_ip"], r["score"]) for r in sorted(reports, key=key)] == \
+        pytest.approx([(r["source_ip"], r["score"]) for r in sorted(expected, key=key)])
+
+def test_rejects_wrong_feature_count(trained_model):
+    with pytest.raises(ValueError):
+        CompiledForest.from_sklearn(trained_model).decision_function(np.zeros((2, 3)))
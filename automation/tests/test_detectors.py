@@ -0,0 +1,80 @@
+import orjson
+import pytest
+
+from worker import detectors, features, run_worker
+from worker.ip_stats import IPStatsStore
+
+def entries(events):
+    return [(f"{i}-0".encode(), {b"data": orjson.dumps(e)}) for i, e in enumerate(events)]
+
+def login(ip, username, success=False):
+    return {"event_id": "l", "timestamp": "2025-10-21T10:00:00Z", "source_ip": ip,
+            "event_type": "LOGIN_ATTEMPT", "username": username, "success": success}
+
+def file_change(ip, path, user_id):
+    return {"event_id": "f", "timestamp": "2025-10-21T10:00:00Z", "source_ip": ip,
+            "event_type": "FILE_CHANGE", "file_path": path, "user_id": user_id}
+
+def test_key_activity_counts_flags_and_sources():
+    events = [login("10.0.0.1", "root"), login("10.0.0.2", "root"), login("10.0.0.2", "root", True),
+              login("10.0.0.3", "alice", True), {"event_type": "LOGIN_ATTEMPT", "source_ip": "10.0.0.4"}]
+    activity = features.extract_key_activity(events, lambda e: e.get("username"), detectors.is_failed_login)
+    assert activity.keys == ["root", "alice"]
+    assert activity.counts.tolist() == [[3, 2], [1, 0]]
+    assert activity.top_ips == ["10.0.0.2", "10.0.0.3"]
+    assert activity.sources.tolist() == [2, 1]
+
+def test_path_prefix():
+    assert detectors.path_prefix("/etc/ssh/sshd_config") == "/etc/ssh"
+    assert detectors.path_prefix("/etc/passwd") == "/etc"
+    assert detectors.path_prefix("/home/user0001/notes.txt") == "/home/user0001"
+    assert detectors.path_prefix("notes.txt") == "/"
+    assert detectors.path_prefix(None) is None
+
+def test_distributed_attack_on_one_account(trained_model):
+    keyed = detectors.create_detectors("username", window_seconds=600)
+    # One failure per address per batch: invisible to the per-IP model even with a window
+    ips = IPStatsStore(600, 10)
+
+    def attack(b):
+        batch = [login(f"172.16.{b}.{i}", "admin") for i in range(5)] + [login("10.0.0.1", "alice", True)]
+        return run_worker.detect_anomalies(entries(batch), trained_model, ips, keyed=keyed)
+
+    per_batch = [attack(b) for b in range(10)]
+    # Over the threshold from the 4th batch on, but reported once per cooldown.
+    assert [len(reports) for reports in per_batch] == [0, 0, 0, 1, 0, 0, 0, 0, 0, 0]
+    first = per_batch[3][0]
+    assert first["event_type"] == "AGG_USER_LOGIN_FAIL"
+    assert first["details"]["username"] == "admin"
+    assert first["details"]["failed_logins"] == detectors.USER_LOGIN_MIN_FAILED
+    assert first["details"]["source_ips"] == 5
+    assert 0 < first["score"] < 1
+
+    # Once the cooldown has passed, the still-running attack is reported again.
+    keyed[0].cooldown = 0
+    assert len(attack(10)) == 1
+
+def test_file_change_burst_is_reported_per_user_and_per_path(trained_model):
+    keyed = detectors.create_detectors("user_id,path_prefix", window_seconds=600)
+    batch = [file_change("192.0.2.1", "/etc/ssh/sshd_config", "svc-backup") for _ in range(12)]
+    batch += [file_change(f"10.0.0.{i}", f"/home/user{i}/notes.txt", f"user{i}") for i in range(50)]
+    reports = run_worker.detect_anomalies(entries(batch), trained_model, keyed=keyed)
+    by_type = {r["event_type"]: r for r in reports}
+    assert set(by_type) == {"AGG_USER_FILE_CHANGE", "AGG_PATH_FILE_CHANGE"}
+    assert by_type["AGG_USER_FILE_CHANGE"]["details"]["user_id"] == "svc-backup"
+    assert by_type["AGG_PATH_FILE_CHANGE"]["details"]["path_prefix"] == "/etc/ssh"
+    assert all(r["source_ip"] == "192.0.2.1" for r in reports)
+    # The burst goes on: one report per detector per cooldown.
+    assert run_worker.detect_anomalies(entries(batch), trained_model, keyed=keyed) == []
+
+def test_detectors_share_one_parse(trained_model, monkeypatch):
+    calls = []
+    parse = features.parse_events
+    monkeypatch.setattr(features, "parse_events", lambda events: calls.append(len(events)) or parse(events))
+    batch = [login("10.0.0.1", "root")] * 3 + [file_change("10.0.0.1", "/etc/passwd", "u1")]
+    run_worker.detect_anomalies(entries(batch), trained_model, keyed=detectors.create_detectors())
+    assert calls == [4]
+
+def test_unknown_detector_is_rejected():
+    with pytest.raises(ValueError, match="hostname"):
+        detectors.create_detectors("username,hostname")
@@ -0,0 +1,45 @@
+import random
+
+import numpy as np
+import pytest
+
+from worker import features
+
+def make_events(n, n_ips, seed=0):
+    rng = random.Random(seed)
+    events = []
+    for i in range(n):
+        if rng.random() < 0.2:
+            events.append({
+                "event_id": f"f{i}", "event_type": "FILE_CHANGE", "source_ip": f"10.0.{rng.randrange(n_ips) // 250}.{rng.randrange(250)}",
+                "file_path": "/etc/passwd", "user_id": "u1", "timestamp": "2025-10-21T10:00:00Z",
+            })
+        else:
+            events.append({
+                "event_id": f"l{i}", "event_type": "LOGIN_ATTEMPT", "source_ip": f"10.0.{rng.randrange(n_ips) // 250}.{rng.randrange(250)}",
+                "username": "root", "success": rng.random() < 0.6, "timestamp": "2025-10-21T10:00:00Z",
+            })
+    return events
+
+def as_dict(result):
+    return {ip: (int(t), int(f), int(c))
+            for ip, t, f, c in zip(result.ips, result.total_logins, result.failed_logins, result.file_changes)}
+
+@pytest.mark.parametrize("n,n_ips", [(1, 1), (500, 20), (5000, 800)])
+def test_numpy_path_matches_pandas_reference(n, n_ips):
+    events = make_events(n, n_ips)
+    fast = features.extract_login_features(events)
+    reference = features.extract_login_features_pandas(events)
+    assert as_dict(fast) == as_dict(reference)
+
+def test_no_login_events():
+    events = [e for e in make_events(200, 5) if e["event_type"] == "FILE_CHANGE"]
+    assert features.extract_login_features(events).ips == []
+    assert features.extract_login_features([]).ips == []
+
+def test_login_matrix_applies_prefilter():
+    result = features.LoginFeatures(["a", "b", "c"], np.array([5, 3, 9]), np.array([3, 2, 9]), np.array([0, 4, 7]))
+    candidates, X = features.build_login_matrix(result)
+    assert candidates.tolist() == [0, 2]
+    assert X.tolist() == [[3.0, 0.0], [9.0, 7.0]]
+    assert X.shape[1] == len(features.MODEL_FEATURES)
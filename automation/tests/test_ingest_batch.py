@@ -0,0 +1,92 @@
+import asyncio
+import gzip
+import json
+import os
+
+import fakeredis
+import httpx
+from jose import jwt
+
+from app import main
+
+TOKEN = jwt.encode({"sub": "test-user", "scope": "ingest"}, os.environ["JWT_SECRET_KEY"], algorithm="HS256")
+HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+
+def make_event(i, **overrides):
+    event = {
+        "event_id": f"evt_{i}",
+        "timestamp": "2025-10-21T10:00:00Z",
+        "source_ip": "1.2.3.4",
+        "event_type": "LOGIN_ATTEMPT",
+        "username": "test",
+        "success": False,
+    }
+    event.update(overrides)
+    return event
+
+def post_batch(content, content_type="application/json", **headers):
+    """Posts a batch to the in-process app and returns (response, stream length)."""
+    async def run():
+        main.app.state.redis = fakeredis.aioredis.FakeRedis()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post(
+                "/ingest/batch", content=content, headers={**HEADERS, "Content-Type": content_type, **headers}
+            )
+        return response, await main.app.state.redis.xlen("events:raw")
+    return asyncio.run(run())
+
+def test_batch_json_array_writes_all_events():
+    events = [make_event(i) for i in range(50)]
+    response, stream_len = post_batch(json.dumps(events))
+    assert response.status_code == 202
+    assert response.json() == {"status": "batch accepted", "accepted": 50, "rejected": []}
+    assert stream_len == 50
+
+def test_batch_ndjson_reports_rejects_by_index():
+    lines = [
+        json.dumps(make_event(0)),
+        json.dumps(make_event(1, source_ip="not-an-ip")),
+        "{broken json",
+        json.dumps({"event_id": "x", "event_type": "FILE_CHANGE"}),
+        json.dumps(make_event(4, event_type="FILE_CHANGE", file_path="/etc/passwd", user_id="u1")),
+    ]
+    response, stream_len = post_batch("\n".join(lines), "application/x-ndjson")
+    assert response.status_code == 202
+    body = response.json()
+    assert body["accepted"] == 2
+    assert [r["index"] for r in body["rejected"]] == [1, 2, 3]
+    assert stream_len == 2
+
+def test_batch_with_no_valid_events_is_rejected():
+    response, stream_len = post_batch(json.dumps([make_event(0, success="maybe")]))
+    assert response.status_code == 422
+    assert stream_len == 0
+
+def test_batch_over_limit_is_rejected():
+    events = [make_event(i) for i in range(main.MAX_BATCH_EVENTS + 1)]
+    response, stream_len = post_batch(json.dumps(events))
+    assert response.status_code == 413
+    assert stream_len == 0
+
+def test_batch_accepts_gzip_body():
+    events = [make_event(i) for i in range(50)]
+    body = gzip.compress(json.dumps(events).encode())
+    response, stream_len = post_batch(body, **{"Content-Encoding": "gzip"})
+    assert response.status_code == 202
+    assert stream_len == 50
+
+def test_gzip_bomb_and_corrupt_bodies_are_rejected(monkeypatch):
+    monkeypatch.setattr(main, "MAX_BATCH_BYTES", 1024)
+    bomb = gzip.compress(b"[" + b" " * 100_000 + b"]")
+    assert post_batch(bomb, **{"Content-Encoding": "gzip"})[0].status_code == 413
+    truncated = gzip.compress(json.dumps([make_event(0)]).encode())[:-8]
+    assert post_batch(truncated, **{"Content-Encoding": "gzip"})[0].status_code == 400
+    assert post_batch(b"[]", **{"Content-Encoding": "br"})[0].status_code == 400
+
+def test_batch_requires_ingest_scope():
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/ingest/batch", json=[make_event(0)])
+    assert asyncio.run(run()).status_code == 401
@@ -0,0 +1,110 @@
+import asyncio
+
+import fakeredis
+import numpy as np
+import orjson
+
+from worker import run_worker
+from worker.ip_stats import IPStatsStore, write_snapshot
+
+def counts(*rows):
+    return np.array(rows, dtype=np.int64)
+
+def test_counts_accumulate_across_batches_and_expire():
+    store = IPStatsStore(window_seconds=60, n_buckets=6)
+    for t in (0, 10, 20):
+        store.update(["1.1.1.1"], counts([2, 2, 0]), now=1000 + t)
+    slots = store.update(["1.1.1.1"], counts([1, 0, 1]), now=1030)
+    assert store.window_totals(slots).tolist() == [[7, 6, 1]]
+
+    # Buckets written at t=0..20 fall out of the window; t=30 is still in it.
+    slots = store.update(["1.1.1.1"], counts([0, 0, 0]), now=1085)
+    assert store.window_totals(slots).tolist() == [[1, 0, 1]]
+
+def test_idle_ips_are_evicted_after_a_window():
+    store = IPStatsStore(window_seconds=60, n_buckets=6)
+    store.update(["1.1.1.1", "2.2.2.2"], counts([1, 1, 0], [1, 0, 0]), now=1000)
+    store.update(["2.2.2.2"], counts([1, 0, 0]), now=1050)
+    store.update(["3.3.3.3"], counts([1, 0, 0]), now=1070)
+    assert len(store) == 2
+
+def test_lru_eviction_caps_memory():
+    store = IPStatsStore(window_seconds=600, n_buckets=10, max_ips=100, initial_capacity=8)
+    for batch in range(10):
+        ips = [f"10.0.{batch}.{i}" for i in range(30)]
+        store.update(ips, np.ones((30, 3), dtype=np.int64), now=1000 + batch)
+    assert len(store) <= 100
+    assert store.capacity == 100
+    assert store.evictions > 0
+    # The most recent batch always survives eviction.
+    assert all(f"10.0.9.{i}" in store._slots for i in range(30))
+
+def test_snapshot_round_trip():
+    async def run():
+        r = fakeredis.aioredis.FakeRedis()
+        store = IPStatsStore(window_seconds=60, n_buckets=6)
+        store.update(["1.1.1.1", "2.2.2.2"], counts([5, 4, 0], [1, 0, 3]), now=1000)
+        await store.save_snapshot(r, "ml:ip_stats:test")
+
+        warm = IPStatsStore(window_seconds=60, n_buckets=6)
+        restored = await warm.load_snapshot(r, "ml:ip_stats:test", now=1010)
+        slots = warm.update(["1.1.1.1", "2.2.2.2"], counts([0, 0, 0], [0, 0, 0]), now=1010)
+        ttls = [await r.ttl(key) for key in ("ml:ip_stats:test", "ml:ip_stats:test:meta")]
+        return restored, warm.window_totals(slots).tolist(), ttls, sorted(await r.keys("*"))
+
+    restored, totals, ttls, keys = asyncio.run(run())
+    assert restored == 2
+    assert totals == [[5, 4, 0], [1, 0, 3]]
+    # Snapshots of dead consumers expire after a window; no temp hash is left behind.
+    assert all(0 < ttl <= 60 for ttl in ttls)
+    assert keys == [b"ml:ip_stats:test", b"ml:ip_stats:test:meta"]
+
+def test_snapshot_copy_is_written_in_chunks_while_the_store_moves_on():
+    async def run():
+        r = fakeredis.aioredis.FakeRedis()
+        store = IPStatsStore(window_seconds=60, n_buckets=6)
+        store.update(["1.1.1.1", "2.2.2.2", "3.3.3.3"], counts([1, 1, 0], [2, 0, 0], [3, 0, 1]), now=1000)
+        snapshot = store.snapshot()
+        writing = asyncio.create_task(write_snapshot(r, "ml:ip_stats:test", snapshot, chunk_size=1, ttl=60))
+        # Scoring goes on while the copy is written.
+        store.update(["1.1.1.1", "4.4.4.4"], counts([9, 9, 0], [1, 0, 0]), now=1001)
+        await writing
+
+        warm = IPStatsStore(window_seconds=60, n_buckets=6)
+        restored = await warm.load_snapshot(r, "ml:ip_stats:test", now=1010)
+        return restored, warm.window_totals(warm.update(["1.1.1.1"], counts([0, 0, 0]), now=1010)).tolist()
+
+    restored, totals = asyncio.run(run())
+    assert restored == 3
+    assert totals == [[1, 1, 0]]
+
+def test_attack_spread_across_batches_is_detected(trained_model):
+    def batch(n_failures):
+        event = {"event_id": "e", "timestamp": "2025-10-21T10:00:00Z", "source_ip": "172.16.0.9",
+                 "event_type": "LOGIN_ATTEMPT", "username": "root", "success": False}
+        return [(f"{i}".encode(), {b"data": orjson.dumps(event)}) for i in range(n_failures)]
+
+    # Two failures per batch never clears the per-batch pre-filter...
+    stateless = [run_worker.detect_anomalies(batch(2), trained_model) for _ in range(20)]
+    assert not any(stateless)
+
+    # ...but the sliding window accumulates them.
+    store = IPStatsStore(window_seconds=600, n_buckets=10)
+    reports = [run_worker.detect_anomalies(batch(2), trained_model, store) for _ in range(20)]
+    assert any(r and r[0]["source_ip"] == "172.16.0.9" for r in reports)
+
+def test_window_reports_each_ip_once_per_cooldown(trained_model, monkeypatch):
+    def batch(ips):
+        events = [{"event_id": "e", "timestamp": "2025-10-21T10:00:00Z", "source_ip": ip,
+                   "event_type": "LOGIN_ATTEMPT", "username": "root", "success": False} for ip in ips for _ in range(10)]
+        return [(f"{i}".encode(), {b"data": orjson.dumps(e)}) for i, e in enumerate(events)]
+
+    store = IPStatsStore(window_seconds=600, n_buckets=10)
+    reported = [r["source_ip"] for _ in range(10)
+                for r in run_worker.detect_anomalies(batch(["172.16.0.1", "172.16.0.2"]), trained_model, store)]
+    assert sorted(reported) == ["172.16.0.1", "172.16.0.2"]
+
+    # Still attacking once the cooldown has passed: reported again, once.
+    monkeypatch.setattr(run_worker, "REPORT_COOLDOWN_SECONDS", 0)
+    again = run_worker.detect_anomalies(batch(["172.16.0.1"]), trained_model, store)
+    assert [r["source_ip"] for r in again] == ["172.16.0.1"]
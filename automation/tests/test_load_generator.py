@@ -0,0 +1,76 @@
+import asyncio
+import io
+import json
+
+import httpx
+
+import generate
+from app.models import IngestEventAdapter
+from scenarios import PROFILES, TrafficMix, score_detections
+
+def draw(profile: str, seed: int, n: int) -> list:
+    mix = TrafficMix(PROFILES[profile], seed, n)
+    return [mix.next() for _ in range(n)]
+
+def strip_timestamps(pairs):
+    return [({k: v for k, v in event.items() if k != "timestamp"}, label) for event, label in pairs]
+
+def test_same_seed_reproduces_the_same_traffic():
+    assert strip_timestamps(draw("mixed", 7, 2000)) == strip_timestamps(draw("mixed", 7, 2000))
+    assert strip_timestamps(draw("mixed", 7, 2000)) != strip_timestamps(draw("mixed", 8, 2000))
+
+def test_events_are_valid_and_labelled():
+    pairs = draw("mixed", 1, 5000)
+    for event, label in pairs:
+        IngestEventAdapter.validate_python(event)
+        assert label["event_id"] == event["event_id"]
+    scenarios = {label["scenario"] for _, label in pairs}
+    assert scenarios == {"baseline", "credential_stuffing", "slow_brute_force", "file_change_burst"}
+    assert not any(label["malicious"] for _, label in pairs if label["scenario"] == "baseline")
+
+def test_scenarios_only_run_in_their_window():
+    pairs = draw("mixed", 1, 10000)
+    stuffing = [i for i, (_, label) in enumerate(pairs) if label["scenario"] == "credential_stuffing"]
+    assert 2000 <= min(stuffing) and max(stuffing) < 5000
+    assert len(stuffing) / 3000 > 0.03
+
+def test_score_detections():
+    labels = [
+        {"source_ip": "10.0.0.1", "scenario": "baseline", "malicious": False},
+        {"source_ip": "203.0.113.1", "scenario": "credential_stuffing", "malicious": True},
+        {"source_ip": "198.51.100.1", "scenario": "slow_brute_force", "malicious": True},
+    ]
+    result = score_detections(labels, {"203.0.113.1", "10.0.0.1", "8.8.8.8"})
+    assert (result["precision"], result["recall"]) == (0.5, 0.5)
+    assert result["by_scenario"]["slow_brute_force"]["recall"] == 0.0
+
+def run(rps, duration, batch_size=0, statuses=None, **kwargs):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        status = statuses.pop(0) if statuses else 202
+        return httpx.Response(status, json={"status": "accepted"})
+
+    mix = TrafficMix(PROFILES["mixed"], 3, int(rps * duration) * (batch_size or 1))
+    labels = io.StringIO()
+    report = asyncio.run(generate.run_load("http://api/ingest", mix, rps, duration, batch_size,
+                                           labels_file=labels, transport=httpx.MockTransport(handler), **kwargs))
+    return report, requests, [json.loads(line) for line in labels.getvalue().splitlines()]
+
+def test_open_loop_run_holds_the_schedule():
+    report, requests, labels = run(rps=200, duration=0.5)
+    assert report["requests"] == report["ok"] == len(requests) == 100
+    assert 0.45 <= report["duration_s"] < 1.0
+    assert report["errors"] == {}
+    assert str(requests[0].url) == "http://api/ingest"
+    assert len(labels) == 100
+    assert set(report["latency_ms"]) == {"p50", "p90", "p99", "p99.9", "max"}
+
+def test_batch_mode_and_error_counts():
+    report, requests, labels = run(rps=40, duration=0.25, batch_size=50, statuses=[503, 401])
+    assert str(requests[0].url) == "http://api/ingest/batch"
+    assert len(json.loads(requests[0].content)) == 50
+    assert report["errors"] == {"HTTP 503": 1, "HTTP 401": 1}
+    assert report["ok"] == 8
+    assert len(labels) == report["events"] == 500
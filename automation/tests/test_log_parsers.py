@@ -0,0 +1,97 @@
+import pytest
+
+from app.models import IngestEventAdapter
+from parsers import Parser, ParserRegistry, syslog_timestamp
+
+HOST_IP = "192.168.1.10"
+
+def parse(line: str, formats=None):
+    event = ParserRegistry.from_names(formats).parse(line.encode(), HOST_IP)
+    if event is not None:
+        IngestEventAdapter.validate_python(event)  # every event must be accepted by the API
+    return event
+
+@pytest.mark.parametrize("line, username, ip, success", [
+    ("Oct 21 10:00:00 web1 sshd[411]: Failed password for root from 203.0.113.9 port 52311 ssh2",
+     "root", "203.0.113.9", False),
+    ("Oct 21 10:00:00 web1 sshd[411]: Failed password for invalid user admin from 203.0.113.9 port 1 ssh2",
+     "admin", "203.0.113.9", False),
+    ("2024-10-21T10:00:00.123456+02:00 web1 sshd[9]: Accepted publickey for deploy from 10.0.0.4 port 2 ssh2: ED25519",
+     "deploy", "10.0.0.4", True),
+])
+def test_sshd(line, username, ip, success):
+    event = parse(line)
+    assert event["event_type"] == "LOGIN_ATTEMPT"
+    assert (event["username"], event["source_ip"], event["success"]) == (username, ip, success)
+
+def test_sshd_noise_is_ignored():
+    assert parse("Oct 21 10:00:00 web1 sshd[411]: Connection closed by 203.0.113.9 port 52311 [preauth]") is None
+
+def test_sudo_failure_and_escalation():
+    failed = parse("Oct 21 10:00:00 web1 sudo:    alice : 3 incorrect password attempts ; TTY=pts/0 ; "
+                   "PWD=/home/alice ; USER=root ; COMMAND=/usr/bin/id")
+    assert (failed["username"], failed["success"], failed["source_ip"]) == ("alice", False, HOST_IP)
+    ok = parse("Oct 21 10:00:00 web1 sudo:    alice : TTY=pts/0 ; PWD=/home/alice ; USER=root ; COMMAND=/usr/bin/id")
+    assert (ok["event_type"], ok["success"]) == ("LOGIN_ATTEMPT", True)
+
+def test_sudo_file_writers_are_file_changes():
+    event = parse("Oct 21 10:00:00 web1 sudo:    bob : TTY=pts/1 ; PWD=/root ; USER=root ; "
+                  "COMMAND=/usr/bin/vim /etc/ssh/sshd_config")
+    assert (event["event_type"], event["file_path"], event["user_id"]) == ("FILE_CHANGE", "/etc/ssh/sshd_config", "bob")
+    visudo = parse("Oct 21 10:00:00 web1 sudo:    bob : TTY=pts/1 ; PWD=/root ; USER=root ; COMMAND=/usr/sbin/visudo")
+    assert visudo["file_path"] == "/etc/sudoers"
+
+def test_access_log_logins_and_writes():
+    failed = parse('198.51.100.7 - - [21/Oct/2024:10:00:00 +0000] "POST /wp-login.php HTTP/1.1" 401 512 "-" "curl/8"')
+    assert (failed["source_ip"], failed["success"], failed["timestamp"]) == \
+        ("198.51.100.7", False, "2024-10-21T10:00:00+00:00")
+    ok = parse('198.51.100.7 - - [21/Oct/2024:10:00:00 +0000] "POST /api/login?next=/ HTTP/1.1" 302 0')
+    assert ok["success"] is True
+    put = parse('198.51.100.8 - carol [21/Oct/2024:10:00:00 +0000] "PUT /dav/report.xlsx HTTP/1.1" 201 0 "-" "-"')
+    assert (put["event_type"], put["file_path"], put["user_id"]) == ("FILE_CHANGE", "/dav/report.xlsx", "carol")
+    assert parse('198.51.100.7 - - [21/Oct/2024:10:00:00 +0000] "GET /index.html HTTP/1.1" 200 512') is None
+
+def test_audit_user_auth():
+    event = parse("type=USER_AUTH msg=audit(1729504800.123:4242): pid=1 uid=0 auid=4294967295 ses=4294967295 "
+                  "msg='op=PAM:authentication grantors=? acct=\"alice\" exe=\"/usr/sbin/sshd\" "
+                  "hostname=203.0.113.5 addr=203.0.113.5 terminal=ssh res=failed'")
+    assert (event["username"], event["source_ip"], event["success"]) == ("alice", "203.0.113.5", False)
+    assert event["timestamp"].startswith("2024-10-21T10:00:00")
+
+def test_audit_file_change_joins_syscall_and_path_records():
+    registry = ParserRegistry.from_names(["audit"])
+    syscall = ("type=SYSCALL msg=audit(1729504800.5:77): arch=c000003e syscall=257 success=yes exit=3 "
+               "ppid=1 pid=2 auid=1000 uid=0 comm=\"vim\" exe=\"/usr/bin/vim\" key=\"identity\"")
+    parent = "type=PATH msg=audit(1729504800.5:77): item=0 name=\"/etc/\" inode=1 nametype=PARENT"
+    path = "type=PATH msg=audit(1729504800.5:77): item=1 name=2F6574632F706173737764 inode=2 nametype=NORMAL"
+    assert registry.parse(syscall.encode(), HOST_IP) is None
+    assert registry.parse(parent.encode(), HOST_IP) is None
+    event = registry.parse(path.encode(), HOST_IP)
+    assert (event["file_path"], event["user_id"], event["source_ip"]) == ("/etc/passwd", "1000", HOST_IP)
+    IngestEventAdapter.validate_python(event)
+    # An unkeyed syscall (not a watched file) produces nothing.
+    assert registry.parse(syscall.replace(':77', ':78').replace('key="identity"', "key=(null)").encode(),
+                          HOST_IP) is None
+    assert registry.parse(path.replace(":77", ":78").encode(), HOST_IP) is None
+
+def test_registry_only_offers_lines_to_matching_parsers():
+    calls = []
+
+    class Recorder(Parser):
+        name = "recorder"
+        keywords = (b"kernel:",)
+
+        def parse(self, line, host_ip):
+            calls.append(line)
+
+    registry = ParserRegistry([Recorder()])
+    assert registry.parse(b"Oct 21 10:00:00 web1 kernel: eth0 link up", HOST_IP) is None
+    assert registry.parse(b"Oct 21 10:00:00 web1 cron[1]: job done", HOST_IP) is None
+    assert len(calls) == 1
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        ParserRegistry.from_names(["syslog-ng"])
+
+def test_syslog_timestamp_falls_back_on_garbage():
+    assert syslog_timestamp("not a timestamp at all")
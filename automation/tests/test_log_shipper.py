@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+
+from log_shipper import Checkpoint, FileTailer, InotifyWatcher, LogShipper
+
+def auth_line(i: int, result: str = "Failed") -> str:
+    return f"Oct 21 10:00:00 host sshd[1]: {result} password for user{i} from 10.0.0.{i % 250 + 1} port 22 ssh2\n"
+
+def write(path, text, mode="a"):
+    with open(path, mode) as f:
+        f.write(text)
+
+def make_shipper(log, url, tmp_path, **options):
+    options.setdefault("flush_interval", 0.05)
+    options.setdefault("from_start", True)
+    shipper = LogShipper(str(log), url, "test-token", state_file=str(tmp_path / "state.json"), **options)
+    shipper.retry_delay = 0.01
+    return shipper
+
+def test_tailer_carries_partial_lines_across_chunks(tmp_path):
+    log = tmp_path / "auth.log"
+    write(log, "first line\nsecond li")
+    tailer = FileTailer(str(log), offset=0, chunk_size=4)
+    assert tailer.read_lines() == [b"first line"]
+    assert tailer.offset == len("first line\n")
+    assert tailer.read_lines() == []
+    write(log, "ne\n")
+    assert tailer.read_lines() == [b"second line"]
+    assert tailer.offset == os.path.getsize(log)
+
+def test_tailer_without_checkpoint_starts_at_end(tmp_path):
+    log = tmp_path / "auth.log"
+    write(log, "old\n")
+    tailer = FileTailer(str(log))
+    write(log, "new\n")
+    assert tailer.read_lines() == [b"new"]
+
+def test_tailer_follows_rotation_without_losing_lines(tmp_path):
+    log = tmp_path / "auth.log"
+    write(log, "a\n")
+    tailer = FileTailer(str(log), offset=0)
+    assert tailer.read_lines() == [b"a"]
+    write(log, "b\n")
+    os.rename(log, tmp_path / "auth.log.1")
+    write(log, "c\n", mode="w")
+    # The rest of the rotated file comes first, then the new file from the start.
+    assert tailer.read_lines() == [b"b"]
+    assert tailer.read_lines() == [b"c"]
+    assert tailer.inode == os.stat(log).st_ino
+
+def test_tailer_rereads_truncated_file(tmp_path):
+    log = tmp_path / "auth.log"
+    write(log, "a long first line\n")
+    tailer = FileTailer(str(log), offset=0)
+    assert tailer.read_lines() == [b"a long first line"]
+    write(log, "x\n", mode="w")
+    assert tailer.read_lines() == []
+    assert tailer.read_lines() == [b"x"]
+
+def test_tailer_resumes_rotated_file_from_checkpoint(tmp_path):
+    log = tmp_path / "auth.log"
+    write(log, "a\nb\n")
+    inode = os.stat(log).st_ino
+    os.rename(log, tmp_path / "auth.log.1")
+    write(log, "c\n", mode="w")
+    tailer = FileTailer(str(log), offset=2, inode=inode)
+    assert tailer.read_lines() == [b"b"]
+    assert tailer.read_lines() == [b"c"]
+
+def test_checkpoint_is_replaced_atomically(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "state.json"))
+    assert checkpoint.load() == {}
+    checkpoint.save(42, 1000)
+    assert checkpoint.load() == {"inode": 42, "offset": 1000}
+    assert os.listdir(tmp_path) == ["state.json"]
+
+def test_shipper_batches_events_to_batch_endpoint(stub_api, tmp_path):
+    log = tmp_path / "auth.log"
+    write(log, "".join(auth_line(i) + "Oct 21 10:00:00 host cron[2]: noise\n" for i in range(250)))
+    write(log, auth_line(999, "Accepted"))
+    shipper = make_shipper(log, stub_api.url, tmp_path, batch_size=100)
+    shipper.run(follow=False)
+
+    assert [len(b) for b in stub_api.batches] == [100, 100, 51]
+    assert stub_api.headers[0]["Content-Encoding"] == "gzip"
+    last = stub_api.events[-1]
+    assert (last["username"], last["source_ip"], last["success"]) == ("user999", "10.0.0.250", True)
+    assert shipper.stats["lines"] == 501
+    assert Checkpoint(str(tmp_path / "state.json")).load()["offset"] == os.path.getsize(log)
+
+def test_shipper_resumes_from_checkpoint_without_duplicates(stub_api, tmp_path):
+    log = tmp_path / "auth.log"
+    write(log, "".join(auth_line(i) for i in range(10)))
+    make_shipper(log, stub_api.url, tmp_path).run(follow=False)
+    write(log, "".join(auth_line(i) for i in range(10, 15)))
+    make_shipper(log, stub_api.url, tmp_path).run(follow=False)
+    assert [e["username"] for e in stub_api.events] == [f"user{i}" for i in range(15)]
+
+def test_shipper_retries_server_errors_before_checkpointing(stub_api, tmp_path):
+    stub_api.statuses = [503, 503]
+    log = tmp_path / "auth.log"
+    write(log, auth_line(1))
+    shipper = make_shipper(log, stub_api.url, tmp_path)
+    shipper.run(follow=False)
+    assert len(stub_api.events) == 1
+
+def test_stop_interrupts_retries_without_checkpointing(stub_api, tmp_path):
+    stub_api.statuses = [503] * 1000
+    log = tmp_path / "auth.log"
+    write(log, auth_line(1))
+    shipper = make_shipper(log, stub_api.url, tmp_path, poll=True)
+    runner = threading.Thread(target=shipper.run)
+    runner.start()
+    deadline = time.monotonic() + 5
+    while len(stub_api.statuses) > 995 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    shipper.stop()
+    runner.join(5)
+    assert not runner.is_alive()
+    assert stub_api.events == []
+    # The batch was never sent, so a restart reads it again.
+    assert Checkpoint(str(tmp_path / "state.json")).load() == {}
+
+def test_inotify_watcher_wakes_on_write(tmp_path):
+    log = tmp_path / "auth.log"
+    write(log, "")
+    watcher = InotifyWatcher(str(log))
+    threading.Timer(0.05, write, (log, "x\n")).start()
+    start = time.monotonic()
+    watcher.wait(5)
+    watcher.close()
+    assert time.monotonic() - start < 2
+
+def test_shipper_spools_during_outage_and_keeps_tailing(stub_api, tmp_path):
+    stub_api.statuses = [503] * 4
+    log = tmp_path / "auth.log"
+    write(log, "".join(auth_line(i) for i in range(20)))
+    shipper = make_shipper(log, stub_api.url, tmp_path, batch_size=10, poll=True,
+                           spool_dir=str(tmp_path / "spool"))
+    runner = threading.Thread(target=shipper.run)
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while Checkpoint(str(tmp_path / "state.json")).load().get("offset") != os.path.getsize(log):
+            assert time.monotonic() < deadline, "tailing stalled behind the outage"
+            time.sleep(0.02)
+        write(log, "".join(auth_line(i) for i in range(20, 25)))
+        deadline = time.monotonic() + 10
+        while len(stub_api.events) < 25 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        shipper.stop()
+        runner.join(5)
+    assert sorted(int(e["username"][4:]) for e in stub_api.events) == list(range(25))
+    assert shipper.stats["spooled"] > 0
+
+def test_spool_report_keeps_a_pending_stop(tmp_path):
+    class Replayer:
+        def metrics(self):
+            return {"depth_batches": 1, "depth_bytes": 10, "replay_rate": 0.0, "evicted": 0}
+
+    shipper = make_shipper(tmp_path / "auth.log", "http://127.0.0.1:9", tmp_path)
+    shipper.replayer = Replayer()
+    shipper._last_report = time.monotonic() - 120
+    shipper.stop()
+    shipper._report_spool()
+    assert shipper._stopping.is_set()
@@ -0,0 +1,103 @@
+import os
+import time
+
+import fakeredis
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from worker import health_server
+from worker.compiled_forest import CompiledForest, export_forest
+from worker.model_registry import ModelRegistry, ModelValidationError, validate_model, version_key
+
+def fit(seed: int, n_features: int = 2):
+    X = np.random.RandomState(seed).rand(200, n_features) * 10
+    return IsolationForest(n_estimators=10, random_state=seed).fit(X)
+
+def publish(directory, version, model):
+    # Dump under a temp name and rename, as a trainer shipping to MODEL_DIR must.
+    tmp = os.path.join(directory, f".{version}.tmp")
+    joblib.dump(model, tmp)
+    os.replace(tmp, os.path.join(directory, f"{version}.joblib"))
+
+def test_validation_rejects_models_the_worker_cannot_use():
+    validate_model(fit(0))
+    with pytest.raises(ModelValidationError):
+        validate_model(fit(0, n_features=3))
+    with pytest.raises(ModelValidationError):
+        validate_model(object())
+
+def test_versions_sort_naturally():
+    assert max(["model-9", "model-10", "model-2"], key=version_key) == "model-10"
+
+def test_newest_version_is_swapped_in_and_old_one_kept(tmp_path):
+    publish(tmp_path, "v1", export_forest(fit(1)))
+    registry = ModelRegistry(str(tmp_path), mmap=True)
+    first = registry.load_initial()
+    assert registry.version == "v1"
+    assert isinstance(first, CompiledForest)
+    assert isinstance(first.children, np.memmap)
+    assert registry.check() is False
+
+    publish(tmp_path, "v2", fit(2))
+    assert registry.check() is True
+    assert (registry.version, registry.previous.version) == ("v2", "v1")
+    assert registry.model is not first
+
+    # Deleting the bad artifact makes v1 wanted again: swapped back without reloading.
+    os.remove(tmp_path / "v2.joblib")
+    assert registry.check() is True
+    assert registry.version == "v1" and registry.model is first
+
+def test_broken_artifact_is_rejected_once_and_current_model_kept(tmp_path, capsys):
+    publish(tmp_path, "v1", fit(1))
+    registry = ModelRegistry(str(tmp_path))
+    registry.load_initial()
+    publish(tmp_path, "v3-wrong-shape", fit(3, n_features=3))
+    assert registry.check() is False
+    assert registry.version == "v1"
+    assert "Rejected model version v3-wrong-shape" in capsys.readouterr().out
+    assert registry.check() is False
+    assert capsys.readouterr().out == ""  # not retried until the file changes
+
+def test_redis_key_pins_the_fleet_version(tmp_path):
+    publish(tmp_path, "v1", fit(1))
+    publish(tmp_path, "v2", fit(2))
+    r = fakeredis.FakeRedis()
+    r.set("ml:model:active", "v1")
+    registry = ModelRegistry(str(tmp_path), redis_client=r, redis_key="ml:model:active")
+    registry.load_initial()
+    assert registry.version == "v1"
+    r.set("ml:model:active", "v2")
+    assert registry.check() is True and registry.version == "v2"
+    r.set("ml:model:active", "../etc/passwd")
+    with pytest.raises(ValueError):
+        registry.check()
+
+def test_falls_back_to_model_path_without_versions(tmp_path):
+    path = tmp_path / "model.joblib"
+    joblib.dump(fit(1), path)
+    registry = ModelRegistry(str(tmp_path / "versions"), fallback_path=str(path), compile=False)
+    assert isinstance(registry.load_initial(), IsolationForest)
+    assert registry.version == "model"
+
+def test_watcher_swaps_in_background_and_health_reports_version(tmp_path, monkeypatch):
+    publish(tmp_path, "v1", fit(1))
+    registry = ModelRegistry(str(tmp_path), poll_interval=0.02)
+    registry.load_initial()
+    registry.start()
+    try:
+        publish(tmp_path, "v2", fit(2))
+        deadline = time.monotonic() + 5
+        while registry.version != "v2":
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+    finally:
+        registry.stop()
+
+    monkeypatch.setattr(health_server, "MODEL_IS_READY", True)
+    monkeypatch.setattr(health_server, "MODEL_STATUS_PROVIDER", registry.status)
+    body = health_server.app.test_client().get("/readyz").get_json()
+    assert body["model"]["version"] == "v2"
+    assert body["model"]["previous_version"] == "v1"
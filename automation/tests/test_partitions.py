@@ -0,0 +1,104 @@
+import asyncio
+import datetime
+import os
+import uuid
+
+import pytest
+
+from app import database, partitions
+from app.models import AnomalyReport
+
+TEST_POSTGRES_DSN = os.environ.get("TEST_POSTGRES_DSN")
+DAY = datetime.date(2025, 10, 21)  # a Tuesday
+
+def test_partition_start_aligns_days_and_weeks():
+    assert partitions.partition_start(DAY, "day") == DAY
+    assert partitions.partition_start(DAY, "week") == datetime.date(2025, 10, 20)
+    assert partitions.partition_name(DAY) == "anomalies_p20251021"
+
+def test_upper_bound_parses_pg_get_expr_output():
+    bound = "FOR VALUES FROM ('2025-10-21 00:00:00+00') TO ('2025-10-22 00:00:00+00')"
+    assert partitions.upper_bound(bound) == datetime.datetime(2025, 10, 22, tzinfo=datetime.timezone.utc)
+
+# --- Against a real Postgres (skipped unless TEST_POSTGRES_DSN is set) ---
+
+def with_scratch_schema(fn):
+    """Runs fn(conn) on a connection whose search_path is a throwaway schema."""
+    if not TEST_POSTGRES_DSN:
+        pytest.skip("TEST_POSTGRES_DSN not set")
+    import asyncpg
+
+    async def run():
+        conn = await asyncpg.connect(TEST_POSTGRES_DSN)
+        schema = f"test_{uuid.uuid4().hex[:12]}"
+        await conn.execute(f"CREATE SCHEMA {schema}")
+        await conn.execute(f"SET search_path TO {schema}")
+        try:
+            return await fn(conn)
+        finally:
+            await conn.execute(f"DROP SCHEMA {schema} CASCADE")
+            await conn.close()
+    return asyncio.run(run())
+
+def report_at(ts):
+    return AnomalyReport(source_ip="10.0.0.1", score=0.8, event_type="AGG_LOGIN_FAIL",
+                         timestamp=ts, details={})
+
+def at(day, hour=12):
+    return datetime.datetime.combine(day, datetime.time(hour), tzinfo=datetime.timezone.utc)
+
+def test_time_range_queries_prune_to_matching_partitions():
+    async def body(conn):
+        await database.init_schema(conn)
+        await partitions.ensure_partitions(conn, DAY, DAY + datetime.timedelta(days=2), "day")
+        await database.log_anomalies_to_db(
+            [report_at(at(DAY + datetime.timedelta(days=d))) for d in range(3) for _ in range(10)], conn)
+        await conn.execute("ANALYZE anomalies")
+
+        sql, args = database.build_anomaly_query(
+            100, since=at(DAY + datetime.timedelta(days=1), 0), until=at(DAY + datetime.timedelta(days=2), 0))
+        plan = "\n".join(r[0] for r in await conn.fetch(f"EXPLAIN {sql}", *args))
+        rows, _ = await database.query_anomalies(
+            conn, since=at(DAY + datetime.timedelta(days=1), 0), until=at(DAY + datetime.timedelta(days=2), 0))
+        return plan, rows
+
+    plan, rows = with_scratch_schema(body)
+    assert "anomalies_p20251022" in plan
+    assert "anomalies_p20251021" not in plan
+    assert "anomalies_p20251023" not in plan
+    assert "anomalies_default" not in plan
+    assert len(rows) == 10
+
+def test_new_partition_adopts_rows_from_default_and_old_ones_expire():
+    async def body(conn):
+        await database.init_schema(conn)
+        # No partition yet: the row lands in the default partition.
+        await database.log_anomaly_to_db(report_at(at(DAY)), conn)
+        await partitions.ensure_partitions(conn, DAY, DAY, "day")
+        in_partition = await conn.fetchval("SELECT count(*) FROM anomalies_p20251021")
+        in_default = await conn.fetchval("SELECT count(*) FROM anomalies_default")
+        expired = await partitions.expire_partitions(conn, at(DAY + datetime.timedelta(days=1), 0), "drop")
+        remaining = await conn.fetchval("SELECT count(*) FROM anomalies")
+        return in_partition, in_default, expired, remaining
+
+    assert with_scratch_schema(body) == (1, 0, ["anomalies_p20251021"], 0)
+
+def test_legacy_table_is_migrated_with_its_rows():
+    async def body(conn):
+        await conn.execute("""
+            CREATE TABLE anomalies (
+                id SERIAL PRIMARY KEY, source_ip VARCHAR(100), score FLOAT,
+                event_type VARCHAR(100), timestamp TIMESTAMPTZ, details JSONB
+            )
+        """)
+        for d in range(2):
+            await database.log_anomaly_to_db(report_at(at(DAY + datetime.timedelta(days=d))), conn)
+        await database.init_schema(conn)
+        relkind = await conn.fetchval("SELECT relkind::text FROM pg_class WHERE oid = 'anomalies'::regclass")
+        rows = await database.fetch_anomalies_from_db(conn)
+        # New inserts continue the id sequence.
+        await database.log_anomaly_to_db(report_at(at(DAY)), conn)
+        max_id = await conn.fetchval("SELECT max(id) FROM anomalies")
+        return relkind, len(rows), max_id
+
+    assert with_scratch_schema(body) == ("p", 2, 3)
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from prometheus_client import REGISTRY
+
+from worker.pipeline import BatchPipeline
+
+def stage_count(stage):
+    return REGISTRY.get_sample_value("securify_worker_stage_seconds_count", {"stage": stage}) or 0
+
+def run_pipeline(n_batches, score_seconds, depth=2):
+    reads = []
+    finished = []
+
+    async def run():
+        done = asyncio.Event()
+
+        async def read_batch():
+            if len(reads) == n_batches:
+                await asyncio.sleep(3600)  # like an XREADGROUP blocking on an idle stream
+            reads.append(time.perf_counter())
+            return [(f"{len(reads)}-0".encode(), {b"data": b"{}"})]
+
+        def score(events):
+            time.sleep(score_seconds)
+            return [{"batch": events[0][0]}]
+
+        async def finish(events, reports):
+            finished.append((events[0][0], reports))
+            if len(finished) == n_batches:
+                done.set()
+
+        pipeline = BatchPipeline(read_batch, score, finish, depth=depth)
+        task = asyncio.create_task(pipeline.run())
+        await asyncio.wait_for(done.wait(), timeout=10)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    return reads, finished
+
+def test_batches_finish_in_order_with_their_reports():
+    _, finished = run_pipeline(6, 0.01)
+    assert [key for key, _ in finished] == [f"{i}-0".encode() for i in range(1, 7)]
+    assert all(reports == [{"batch": key}] for key, reports in finished)
+
+def test_reads_are_prefetched_while_scoring_but_bounded():
+    # Scoring is the bottleneck: the reader keeps the next batches queued
+    # (prefetch) but stops once the bounded queues are full (backpressure).
+    reads, _ = run_pipeline(8, 0.05, depth=1)
+    assert reads[3] - reads[0] < 0.05 * 2
+    assert reads[-1] - reads[0] > 0.05 * 4
+
+def test_stage_latencies_are_recorded():
+    before = {stage: stage_count(stage) for stage in ("read", "queue_wait", "score", "report")}
+    run_pipeline(3, 0.0)
+    for stage, count in before.items():
+        assert stage_count(stage) >= count + 3
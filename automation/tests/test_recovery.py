@@ -0,0 +1,110 @@
+import asyncio
+
+import fakeredis.aioredis
+
+from worker.recovery import PendingRecovery
+
+STREAM = "events:raw"
+GROUP = "ml-workers"
+
+async def setup_stream(n):
+    r = fakeredis.aioredis.FakeRedis()
+    await r.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+    for i in range(n):
+        await r.xadd(STREAM, {"data": b'{"n": %d}' % i})
+    return r
+
+def recovery_for(r, consumer, **kwargs):
+    kwargs.setdefault("min_idle_ms", 60000)
+    kwargs.setdefault("interval", 3600)
+    return PendingRecovery(r, STREAM, GROUP, consumer, **kwargs)
+
+async def drain(recovery):
+    entries = []
+    while batch := await recovery.next_batch():
+        entries.extend(batch)
+    return entries
+
+def test_startup_drains_own_pending_entries_in_batches():
+    async def run():
+        r = await setup_stream(7)
+        # A previous process read these and died before acking.
+        await r.xreadgroup(GROUP, "worker-a", {STREAM: ">"}, count=7)
+        recovery = recovery_for(r, "worker-a", count=3)
+        batches = [await recovery.next_batch() for _ in range(3)]
+        assert [len(b) for b in batches] == [3, 3, 1]
+        assert await recovery.next_batch() == []
+        return batches
+
+    batches = asyncio.run(run())
+    assert [e[1][b"data"] for b in batches for e in b][0] == b'{"n": 0}'
+
+def test_idle_entries_of_dead_consumer_are_claimed_and_processed():
+    async def run():
+        r = await setup_stream(5)
+        await r.xreadgroup(GROUP, "crashed-pod", {STREAM: ">"}, count=5)
+        recovery = recovery_for(r, "worker-b", min_idle_ms=0)
+        claimed = await drain(recovery)
+        # Processed through the normal path: acked after the batch.
+        await r.xack(STREAM, GROUP, *(entry_id for entry_id, _ in claimed))
+        return claimed, await r.xpending(STREAM, GROUP)
+
+    claimed, pending = asyncio.run(run())
+    assert len(claimed) == 5
+    assert pending["pending"] == 0
+
+def test_entries_not_yet_idle_are_left_alone():
+    async def run():
+        r = await setup_stream(3)
+        await r.xreadgroup(GROUP, "busy-pod", {STREAM: ">"}, count=3)
+        return await drain(recovery_for(r, "worker-b"))
+
+    assert asyncio.run(run()) == []
+
+def test_repeatedly_failing_entries_go_to_dead_letter_stream():
+    async def run():
+        r = await setup_stream(2)
+        await r.xreadgroup(GROUP, "worker-a", {STREAM: ">"}, count=2)
+        recovery = recovery_for(r, "worker-a", max_deliveries=3, min_idle_ms=0, interval=0)
+        rounds = []
+        # Every claim is a new delivery; the batch "fails" and is never acked.
+        for _ in range(4):
+            rounds.append(len(await recovery.next_batch()))
+        dead = await r.xrange("events:dead")
+        return rounds, dead, await r.xpending(STREAM, GROUP)
+
+    rounds, dead, pending = asyncio.run(run())
+    assert rounds == [2, 0, 0, 0]
+    assert len(dead) == 2
+    assert dead[0][1][b"data"] == b'{"n": 0}'
+    assert int(dead[0][1][b"deliveries"]) == 3
+    assert pending["pending"] == 0
+
+def test_entries_trimmed_from_stream_are_acked_not_processed():
+    async def run():
+        r = await setup_stream(3)
+        read = await r.xreadgroup(GROUP, "worker-a", {STREAM: ">"}, count=3)
+        await r.xdel(STREAM, read[0][1][1][0])
+        entries = await drain(recovery_for(r, "worker-a"))
+        return entries, await r.xpending(STREAM, GROUP)
+
+    entries, pending = asyncio.run(run())
+    assert len(entries) == 2
+    assert pending["pending"] == 2
+
+def test_claimed_entries_interleaved_with_our_own_in_flight_ones_are_dead_lettered():
+    async def run():
+        r = await setup_stream(6)
+        await r.xreadgroup(GROUP, "crashed-pod", {STREAM: ">"}, count=6)
+        recovery = recovery_for(r, "worker-b", min_idle_ms=100, max_deliveries=2, interval=0)
+        assert await recovery.next_batch() == []  # own PEL empty, nothing idle yet
+        await asyncio.sleep(0.2)
+        # worker-b took over entries 1, 3 and 5 and is still processing them.
+        ids = [entry_id for entry_id, _ in await r.xrange(STREAM)]
+        await r.xclaim(STREAM, GROUP, "worker-b", 0, ids[1::2])
+        returned = await recovery.next_batch()
+        return ids, returned, await r.xrange("events:dead")
+
+    ids, returned, dead = asyncio.run(run())
+    assert returned == []
+    assert [entry[1][b"original_id"] for entry in dead] == ids[0::2]
@@ -0,0 +1,124 @@
+import gzip
+import json
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from securify_client import BatchSender, SecurifyClient
+
+class GatedSession:
+    """Stands in for requests.Session; every post() waits until `release` is set."""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.batches = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.entered.set()
+        self.release.wait(5)
+        self.batches.append(json.loads(gzip.decompress(data)))
+        return SimpleNamespace(status_code=202, json=dict)
+
+def make_client(url, **options):
+    options.setdefault("flush_interval", 0.05)
+    options.setdefault("backoff_base", 0.01)
+    return SecurifyClient(url, "test-token", buffered=True, **options)
+
+def test_buffered_client_batches_gzip_to_batch_endpoint(stub_api):
+    client = make_client(stub_api.url, batch_size=100)
+    for i in range(250):
+        assert client.log_login(f"user{i}", False, "10.0.0.1")
+    assert client.flush(timeout=5)
+    client.close()
+
+    assert len(stub_api.events) == 250
+    assert [len(b) for b in stub_api.batches] == [100, 100, 50]
+    assert stub_api.headers[0]["Content-Encoding"] == "gzip"
+    assert stub_api.headers[0]["Authorization"] == "Bearer test-token"
+
+def test_time_based_flush_sends_partial_batches(stub_api):
+    client = make_client(stub_api.url, batch_size=1000, flush_interval=0.05)
+    client.log_file_change("/etc/shadow", "u1", "10.0.0.2")
+    deadline = time.monotonic() + 5
+    while not stub_api.events and time.monotonic() < deadline:
+        time.sleep(0.01)
+    client.close()
+    assert stub_api.events[0]["file_path"] == "/etc/shadow"
+
+def test_server_errors_are_retried(stub_api):
+    stub_api.statuses = [503, 503]
+    client = make_client(stub_api.url)
+    client.log_login("alice", True, "10.0.0.1")
+    assert client.flush(timeout=5)
+    client.close()
+    assert len(stub_api.events) == 1
+    assert client.sender.stats["retries"] == 2
+
+def test_client_errors_are_not_retried(stub_api):
+    stub_api.statuses = [401]
+    client = make_client(stub_api.url)
+    client.log_login("alice", True, "10.0.0.1")
+    assert client.flush(timeout=5)
+    client.close()
+    assert stub_api.events == []
+    assert client.sender.stats == {**client.sender.stats, "retries": 0, "rejected": 1}
+
+def test_drop_policy_discards_when_buffer_is_full():
+    session = GatedSession()
+    sender = BatchSender(session, "http://stub/ingest/batch", max_queue=5, batch_size=1, flush_interval=0.05)
+    assert sender.submit({"n": 0})
+    # The sender has taken event 0 and is stuck posting it: the queue holds 5 more.
+    assert session.entered.wait(5)
+    accepted = [sender.submit({"n": i}) for i in range(1, 51)]
+    session.release.set()
+    sender.close()
+
+    assert accepted == [True] * 5 + [False] * 45
+    assert sender.stats["dropped"] == 45
+    assert sender.stats["sent"] == 6
+    assert [batch[0]["n"] for batch in session.batches] == list(range(6))
+
+def test_spill_policy_writes_overflow_to_spool_and_replays_it(stub_api, tmp_path):
+    stub_api.statuses = [503] * 3
+    client = make_client(stub_api.url, max_queue=10, batch_size=10, max_retries=2,
+                         overflow="spill", spool_dir=str(tmp_path / "spool"))
+    for i in range(100):
+        assert client.log_login(f"user{i}", False, "10.0.0.1")
+    deadline = time.monotonic() + 10
+    while len(stub_api.events) < 100 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    client.close()
+
+    assert sorted(e["username"] for e in stub_api.events) == sorted(f"user{i}" for i in range(100))
+    assert client.sender.stats["spilled"] > 0
+    assert client.spool.depth() == (0, 0)
+
+def test_spill_policy_needs_a_spool():
+    with pytest.raises(ValueError):
+        SecurifyClient("http://localhost", "t", buffered=True, overflow="spill")
+
+def test_unbuffered_client_spools_during_outage(stub_api, tmp_path):
+    stub_api.statuses = [503]
+    client = SecurifyClient(stub_api.url, "test-token", spool_dir=str(tmp_path / "spool"))
+    assert client.log_login("alice", False, "10.0.0.1")
+    deadline = time.monotonic() + 10
+    while not stub_api.events and time.monotonic() < deadline:
+        time.sleep(0.02)
+    client.close()
+    assert [e["username"] for e in stub_api.events] == ["alice"]
+    assert stub_api.headers[-1]["Content-Encoding"] == "gzip"
+
+def test_local_ip_is_resolved_once(monkeypatch, stub_api):
+    calls = []
+    monkeypatch.setattr(socket, "gethostbyname", lambda host: calls.append(host) or "10.9.9.9")
+    client = make_client(stub_api.url)
+    for _ in range(20):
+        client.log_login("u", True)
+    client.flush(timeout=5)
+    client.close()
+    assert len(calls) == 1
+    assert {e["source_ip"] for e in stub_api.events} == {"10.9.9.9"}
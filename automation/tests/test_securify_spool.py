@@ -0,0 +1,183 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from securify_spool import HEADER, Spool, SpoolReplayer
+
+def batch(i: int, size: int = 1) -> list:
+    return [{"event_id": f"{i}-{j}", "username": f"user{i}"} for j in range(size)]
+
+def drain(spool: Spool) -> list:
+    out = []
+    while True:
+        records = spool.read(max_records=10)
+        if not records:
+            return out
+        out.extend(events for _, events in records)
+        spool.commit(records[-1][0])
+
+def segments(path) -> list:
+    return sorted(p for p in os.listdir(path) if p.endswith(".seg"))
+
+def test_read_commit_and_reopen(tmp_path):
+    spool = Spool(str(tmp_path))
+    for i in range(5):
+        spool.append(batch(i))
+    records = spool.read(max_records=2)
+    assert [events for _, events in records] == [batch(0), batch(1)]
+    spool.commit(records[-1][0])
+    assert spool.depth()[0] == 3
+    spool.close()
+
+    reopened = Spool(str(tmp_path))
+    assert reopened.depth()[0] == 3
+    assert drain(reopened) == [batch(2), batch(3), batch(4)]
+    assert reopened.depth() == (0, 0)
+    reopened.close()
+
+def test_uncommitted_batches_are_replayed_after_restart(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append(batch(1))
+    assert spool.read()  # sent, but the process dies before commit()
+    spool.close()
+    reopened = Spool(str(tmp_path))
+    assert drain(reopened) == [batch(1)]
+    reopened.close()
+
+def test_torn_tail_record_is_truncated_on_open(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append(batch(1))
+    spool.append(batch(2))
+    spool.close()
+    segment = tmp_path / segments(tmp_path)[-1]
+    good_size = segment.stat().st_size
+    with open(segment, "ab") as f:
+        f.write(HEADER.pack(1000, 0) + b'[{"partial')  # crash in the middle of a write
+
+    reopened = Spool(str(tmp_path))
+    assert segment.stat().st_size == good_size
+    reopened.append(batch(3))
+    assert drain(reopened) == [batch(1), batch(2), batch(3)]
+    reopened.close()
+
+def test_corrupt_record_in_old_segment_is_skipped(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1024, max_bytes=1 << 20)
+    for i in range(40):
+        spool.append(batch(i, size=3))
+    spool.close()
+    first = tmp_path / segments(tmp_path)[0]
+    data = bytearray(first.read_bytes())
+    data[HEADER.size + 5] ^= 0xFF  # flip a payload byte of the first record
+    first.write_bytes(bytes(data))
+
+    reopened = Spool(str(tmp_path), segment_bytes=1024, max_bytes=1 << 20)
+    replayed = drain(reopened)
+    assert replayed and batch(0, size=3) not in replayed
+    assert replayed[-1] == batch(39, size=3)
+    assert reopened.stats["corrupt"] > 0
+    reopened.close()
+
+def test_replayed_segments_are_deleted(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1024, max_bytes=1 << 20)
+    for i in range(50):
+        spool.append(batch(i, size=3))
+    assert len(segments(tmp_path)) > 3
+    assert len(drain(spool)) == 50
+    assert len(segments(tmp_path)) == 1
+    spool.close()
+
+def test_size_cap_evicts_oldest_first(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=2048, max_bytes=8192)
+    for i in range(200):
+        spool.append(batch(i, size=2))
+    depth_batches, depth_bytes = spool.depth()
+    assert depth_bytes <= 8192
+    assert spool.stats["evicted"] == 200 - depth_batches
+    replayed = drain(spool)
+    assert replayed[-1] == batch(199, size=2)
+    assert replayed == [batch(i, size=2) for i in range(200 - len(replayed), 200)]
+    spool.close()
+
+def test_spool_directory_is_locked(tmp_path):
+    spool = Spool(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        Spool(str(tmp_path))
+    spool.close()
+
+def test_killed_writer_loses_nothing_it_acknowledged(tmp_path):
+    # A child process appends as fast as it can and reports each append; it is
+    # SIGKILLed mid-stream. Everything it reported must survive the reopen.
+    client_dir = os.path.join(os.path.dirname(__file__), "..", "..", "integrations", "python-client")
+    script = (
+        "import sys; sys.path.insert(0, sys.argv[1]);"
+        "from securify_spool import Spool;"
+        "s = Spool(sys.argv[2], fsync='never', segment_bytes=4096)\n"
+        "for i in range(10**6):\n"
+        "    s.append([{'n': i, 'pad': 'x' * 100}]); print(i, flush=True)\n"
+    )
+    child = subprocess.Popen([sys.executable, "-c", script, client_dir, str(tmp_path)],
+                             stdout=subprocess.PIPE, text=True)
+    acknowledged = -1
+    for line in child.stdout:
+        acknowledged = int(line)
+        if acknowledged >= 300:
+            break
+    child.send_signal(signal.SIGKILL)
+    child.wait()
+
+    spool = Spool(str(tmp_path), fsync="never", segment_bytes=4096)
+    numbers = [events[0]["n"] for events in drain(spool)]
+    assert numbers == list(range(len(numbers)))
+    assert len(numbers) > acknowledged
+    spool.close()
+
+def test_replayer_delivers_in_merged_batches_and_retries(tmp_path):
+    spool = Spool(str(tmp_path))
+    for i in range(10):
+        spool.append(batch(i, size=30))
+    sent = []
+    outcomes = [False]
+
+    def send(events):
+        if outcomes:
+            return outcomes.pop(0)
+        sent.append(len(events))
+        return True
+
+    replayer = SpoolReplayer(spool, send, batch_size=100, retry_base=0.01)
+    assert replayer.replay_once() is False  # transient failure: nothing consumed
+    while replayer.replay_once():
+        pass
+    assert sent == [90, 90, 90, 30]
+    assert replayer.stats["replayed_events"] == 300
+    assert replayer.metrics()["depth_batches"] == 0
+    spool.close()
+
+def test_replay_reads_only_the_records_it_sends(tmp_path, monkeypatch):
+    spool = Spool(str(tmp_path))
+    for i in range(20):
+        spool.append(batch(i, size=500))  # one shipper batch per record
+    reads = []
+    read_record = Spool._read_record
+    monkeypatch.setattr(Spool, "_read_record", staticmethod(lambda f: reads.append(1) or read_record(f)))
+    sent = []
+    replayer = SpoolReplayer(spool, lambda events: sent.append(len(events)) or True, batch_size=500)
+    assert replayer.replay_once()
+    assert sent == [500] and len(reads) == 1
+    assert replayer.metrics()["depth_batches"] == 19
+
+def test_replayer_rate_limit(tmp_path):
+    spool = Spool(str(tmp_path))
+    for i in range(5):
+        spool.append(batch(i, size=100))
+    replayer = SpoolReplayer(spool, lambda events: True, batch_size=100, rate=1000)
+    start = time.monotonic()
+    while replayer.replay_once():
+        pass
+    assert time.monotonic() - start >= 0.35
+    assert replayer.replay_rate() == pytest.approx(50.0)  # 500 events over the 10s window
+    spool.close()
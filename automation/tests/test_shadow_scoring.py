@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+from prometheus_client import REGISTRY
+from sklearn.ensemble import IsolationForest
+
+from worker import run_worker
+from worker.shadow import ShadowScorer
+
+def sample(name, model):
+    return REGISTRY.get_sample_value(name, {"model": model}) or 0
+
+class FlagEverything:
+    def decision_function(self, X):
+        return np.full(len(X), -1.0)
+
+class Blocking:
+    """A shadow that takes as long as the test wants."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def decision_function(self, X):
+        self.release.wait(5)
+        return np.zeros(len(X))
+
+def test_only_primary_anomalies_are_reported_and_shadows_compared(monkeypatch, fake_session, trained_model,
+                                                                 fresh_worker_stats, make_batch):
+    scorer = ShadowScorer({"flag-all": FlagEverything(), "same": trained_model}, run_worker.ANOMALY_THRESHOLD)
+    monkeypatch.setattr(run_worker, "shadow_scorer", scorer)
+    disagreements = sample("securify_worker_shadow_disagreements_total", "flag-all")
+    same = sample("securify_worker_shadow_disagreements_total", "same")
+    compared = sample("securify_worker_shadow_compared_total", "flag-all")
+
+    asyncio.run(run_worker.process_batch(make_batch(5), trained_model, fake_session))
+    scorer.shutdown()
+
+    reported = [r["source_ip"] for post in fake_session.posts for r in post["json"] if r["event_type"] == "AGG_LOGIN_FAIL"]
+    assert len(reported) == 5
+    assert sample("securify_worker_shadow_compared_total", "flag-all") - compared == 5
+    assert sample("securify_worker_shadow_disagreements_total", "flag-all") == disagreements
+    assert sample("securify_worker_shadow_disagreements_total", "same") == same
+    assert sample("securify_worker_model_inference_seconds_count", "same") > 0
+    assert sample("securify_worker_model_scores_count", "primary") > 0
+
+def test_slow_shadow_never_holds_up_the_primary(fake_session, trained_model, make_batch):
+    blocking = Blocking()
+    scorer = ShadowScorer({"slow": blocking}, run_worker.ANOMALY_THRESHOLD, max_pending=2)
+    skipped = REGISTRY.get_sample_value("securify_worker_shadow_skipped_total") or 0
+    start = time.perf_counter()
+    for _ in range(5):
+        run_worker.detect_anomalies(make_batch(3), trained_model, shadow_scorer=scorer)
+    assert time.perf_counter() - start < 2
+    assert REGISTRY.get_sample_value("securify_worker_shadow_skipped_total") - skipped == 3
+    blocking.release.set()
+    scorer.shutdown()
+    assert sample("securify_worker_shadow_compared_total", "slow") >= 6
+
+def test_disagreement_counts_rows_that_cross_the_threshold():
+    primary = IsolationForest(n_estimators=10, random_state=0).fit(np.random.RandomState(0).rand(200, 2) * 10)
+    X = np.array([[1.0, 1.0], [60.0, 30.0]])
+    primary_scores = primary.decision_function(X)
+    scorer = ShadowScorer({"inverted": FlagEverything()}, threshold=0.1)
+    before = sample("securify_worker_shadow_disagreements_total", "inverted")
+    scorer.submit(X, primary_scores).result()
+    expected = int(np.count_nonzero(primary_scores >= 0.1))
+    assert sample("securify_worker_shadow_disagreements_total", "inverted") - before == expected
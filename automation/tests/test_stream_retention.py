@@ -0,0 +1,99 @@
+import asyncio
+
+import fakeredis
+
+from app import database, retention
+from app.models import IngestEventAdapter
+
+STREAM = database.STREAM_NAME
+
+def make_events(start, n):
+    return [
+        IngestEventAdapter.validate_python({
+            "event_id": f"evt_{i}",
+            "timestamp": "2025-10-21T10:00:00Z",
+            "source_ip": "1.2.3.4",
+            "event_type": "LOGIN_ATTEMPT",
+            "username": "test",
+            "success": False,
+        })
+        for i in range(start, start + n)
+    ]
+
+async def consume(r, group, count):
+    """Reads and acks up to `count` new entries for `group`."""
+    read = await r.xreadgroup(group, "c1", {STREAM: ">"}, count=count)
+    ids = [entry_id for entry_id, _ in read[0][1]] if read else []
+    if ids:
+        await r.xack(STREAM, group, *ids)
+    return ids
+
+def test_soak_stream_length_stays_flat_when_consumers_keep_up(monkeypatch):
+    # Only the background trimmer bounds the stream here.
+    monkeypatch.setattr(database, "STREAM_MAXLEN", 0)
+
+    async def run():
+        r = fakeredis.aioredis.FakeRedis()
+        await r.xgroup_create(STREAM, "ml-workers", id="0", mkstream=True)
+        trimmer = retention.StreamTrimmer(r, STREAM, approximate=False)
+        lengths = []
+        for round_ in range(200):
+            await database.add_events_to_stream(make_events(round_ * 100, 100), r)
+            await consume(r, "ml-workers", 100)
+            await trimmer.trim_once()
+            lengths.append(await r.xlen(STREAM))
+        return lengths
+
+    lengths = asyncio.run(run())
+    # 20k events ingested; the stream never holds more than about one round.
+    assert max(lengths) <= 100
+    assert max(lengths[100:]) <= max(lengths[:100])
+
+def test_trimmer_keeps_entries_the_slowest_group_still_needs(monkeypatch):
+    monkeypatch.setattr(database, "STREAM_MAXLEN", 0)
+
+    async def run():
+        r = fakeredis.aioredis.FakeRedis()
+        await r.xgroup_create(STREAM, "fast", id="0", mkstream=True)
+        await r.xgroup_create(STREAM, "slow", id="0")
+        await database.add_events_to_stream(make_events(0, 100), r)
+        await consume(r, "fast", 100)
+        # The slow group read 40 entries but only acked 30 of them.
+        read = await r.xreadgroup("slow", "c1", {STREAM: ">"}, count=40)
+        ids = [entry_id for entry_id, _ in read[0][1]]
+        await r.xack(STREAM, "slow", *ids[:30])
+
+        trimmed = await retention.StreamTrimmer(r, STREAM, approximate=False).trim_once()
+        first_left = (await r.xrange(STREAM, count=1))[0][0]
+        return trimmed, first_left, ids
+
+    trimmed, first_left, ids = asyncio.run(run())
+    assert trimmed == 30
+    assert first_left == ids[30]
+
+def test_no_trim_without_consumer_groups(monkeypatch):
+    monkeypatch.setattr(database, "STREAM_MAXLEN", 0)
+
+    async def run():
+        r = fakeredis.aioredis.FakeRedis()
+        await database.add_events_to_stream(make_events(0, 10), r)
+        return await retention.StreamTrimmer(r, STREAM).trim_once(), await r.xlen(STREAM)
+
+    assert asyncio.run(run()) == (0, 10)
+
+def test_write_time_maxlen_caps_the_stream(monkeypatch):
+    monkeypatch.setattr(database, "STREAM_MAXLEN", 500)
+
+    async def run():
+        r = fakeredis.aioredis.FakeRedis()
+        for round_ in range(20):
+            await database.add_events_to_stream(make_events(round_ * 100, 100), r)
+        return await r.xlen(STREAM)
+
+    # Approximate trimming may overshoot by up to one radix-tree node (100 entries).
+    assert asyncio.run(run()) <= 600
+
+def test_write_time_trim_by_age(monkeypatch):
+    monkeypatch.setattr(database, "STREAM_MAX_AGE_SECONDS", 3600)
+    args = database.stream_trim_args(now=10_000)
+    assert args == {"minid": "6400000-0", "approximate": True}
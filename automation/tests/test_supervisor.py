@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import time
+
+from worker import health_server, supervisor
+from worker.supervisor import Supervisor
+
+def crash_first_run(index, consumer_name, heartbeat):
+    marker = f"/tmp/securify-supervisor-test-{os.getppid()}-{index}"
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    os.remove(marker)
+    while True:
+        heartbeat()
+        time.sleep(0.05)
+
+# Runs in a fresh interpreter: the multi-process directory has to be set up
+# before prometheus_client is first imported, as run_worker does.
+MULTIPROCESS_SCRIPT = """
+import sys, threading, time
+from worker.supervisor import Supervisor, prepare_metrics_dir
+prepare_metrics_dir(2)
+from worker import metrics
+
+def count_events(index, consumer_name, heartbeat):
+    metrics.EVENTS_PROCESSED.inc(index + 1)
+    while True:
+        heartbeat()
+        time.sleep(0.05)
+
+sup = Supervisor(count_events, 2, "test-worker")
+
+def scrape():
+    deadline = time.time() + 5
+    while b"securify_worker_events_processed_total 3.0" not in metrics.render()[0] and time.time() < deadline:
+        time.sleep(0.05)
+    print(metrics.render()[0].decode())
+    sup.stop()
+
+threading.Thread(target=scrape).start()
+sup.run(poll_interval=0.05)
+"""
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_crashed_children_are_restarted(monkeypatch):
+    monkeypatch.setattr(supervisor, "RESTART_BACKOFF", 0)
+    sup = Supervisor(crash_first_run, 2, "test-worker")
+    try:
+        for index in range(2):
+            sup._start(index)
+        assert wait_for(lambda: not any(p.is_alive() for p in sup._children))
+        assert sup.status()["ready"] is False
+
+        for index in range(2):
+            sup._check(index)
+        assert wait_for(lambda: sup.status()["healthy_workers"] == 2)
+
+        status = sup.status()
+        assert [w["consumer"] for w in status["workers"]] == ["test-worker-0", "test-worker-1"]
+        assert [w["restarts"] for w in status["workers"]] == [1, 1]
+    finally:
+        for proc in sup._children:
+            proc.kill()
+            proc.join()
+
+def test_children_metrics_are_aggregated(tmp_path):
+    (tmp_path / "counter_1.db").write_bytes(b"left over from a previous run")
+    service_dir = os.path.dirname(os.path.dirname(supervisor.__file__))
+    env = {**os.environ, "PYTHONPATH": service_dir, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    out = subprocess.run([sys.executable, "-c", MULTIPROCESS_SCRIPT], env=env, capture_output=True,
+                         text=True, timeout=30, check=True).stdout
+    assert "securify_worker_events_processed_total 3.0" in out
+    assert not (tmp_path / "counter_1.db").exists()
+
+def test_readyz_reports_combined_worker_status(monkeypatch):
+    monkeypatch.setattr(health_server, "MODEL_IS_READY", True)
+    monkeypatch.setattr(health_server, "STATUS_PROVIDER", lambda: {"ready": False, "healthy_workers": 0, "workers": []})
+    response = health_server.app.test_client().get("/readyz")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "no_healthy_workers"
+
+    monkeypatch.setattr(health_server, "STATUS_PROVIDER", lambda: {"ready": True, "healthy_workers": 2, "workers": []})
+    response = health_server.app.test_client().get("/readyz")
+    assert response.status_code == 200
+    assert response.get_json()["healthy_workers"] == 2
@@ -0,0 +1,51 @@
+import os
+import time
+
+import pytest
+from jose import JWTError, jwt
+
+from app import auth
+from app.token_cache import TokenCache
+
+SECRET = os.environ["JWT_SECRET_KEY"]
+
+def make_token(sub="svc", scope="ingest", **claims):
+    return jwt.encode({"sub": sub, "scope": scope, **claims}, SECRET, algorithm="HS256")
+
+def test_repeated_token_skips_decode(monkeypatch):
+    auth.token_cache.clear()
+    token = make_token()
+    calls = []
+    real_decode = jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+
+    for _ in range(10):
+        payload, scopes = auth.decode_token(token)
+    assert payload["sub"] == "svc"
+    assert scopes == frozenset({"ingest"})
+    assert len(calls) == 1
+
+def test_cached_entry_never_outlives_exp():
+    cache = TokenCache(max_size=10, ttl=3600)
+    cache.put("expiring", {"sub": "svc", "exp": time.time() - 1}, frozenset())
+    cache.put("fresh", {"sub": "svc", "exp": time.time() + 60}, frozenset())
+    assert cache.get("expiring") is None
+    assert cache.get("fresh") is not None
+
+def test_lru_eviction_keeps_recently_used():
+    cache = TokenCache(max_size=2, ttl=60)
+    cache.put("a", {"sub": "a"}, frozenset())
+    cache.put("b", {"sub": "b"}, frozenset())
+    cache.get("a")
+    cache.put("c", {"sub": "c"}, frozenset())
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+def test_invalid_tokens_are_not_cached():
+    auth.token_cache.clear()
+    bad = jwt.encode({"sub": "svc", "scope": "ingest"}, "wrong-key", algorithm="HS256")
+    for _ in range(2):
+        with pytest.raises(JWTError):
+            auth.decode_token(bad)
+    assert len(auth.token_cache) == 0
@@ -0,0 +1,92 @@
+import gzip
+import json
+
+import fakeredis
+import numpy as np
+import orjson
+import pytest
+
+from worker import features, training
+from worker.compiled_forest import CompiledForest
+from worker.ip_stats import IPStatsStore
+from worker.model_registry import ModelRegistry, ModelValidationError, validate_model
+
+def test_replay_matches_the_worker_feature_path():
+    batches = list(training.synthetic_batches(3000, batch_size=500, n_ips=200))
+    store = IPStatsStore(600, 10)
+    expected = []
+    for events, now in batches:
+        activity = features.extract_ip_activity(events)
+        totals = store.window_totals(store.update(activity.ips, activity.counts, now))
+        expected.append(features.build_login_matrix(features.login_features_from_counts(activity.ips, totals))[1])
+    replayed = [X for _, X in training.feature_rows(iter(batches), 600, 10)]
+    assert len(replayed) == len(expected)
+    for got, want in zip(replayed, expected):
+        np.testing.assert_array_equal(got, want)
+
+def test_reservoir_is_bounded_and_uniform():
+    sample = training.ReservoirSample(1000, 1, seed=1)
+    for start in range(0, 100_000, 500):
+        sample.add(np.arange(start, start + 500, dtype=np.float64)[:, None])
+    rows = sample.sample()[:, 0]
+    assert sample.seen == 100_000 and len(rows) == 1000
+    assert len(np.unique(rows)) == 1000
+    # A uniform sample of 0..99999 has a mean near 50000 (sd ~ 900 for 1000 draws).
+    assert abs(rows.mean() - 50_000) < 5000
+
+def test_running_stats_match_numpy():
+    X = np.random.default_rng(0).random((5000, 2)) * [10, 100]
+    stats = training.RunningStats(2)
+    for block in np.array_split(X, 7):
+        stats.add(block)
+    np.testing.assert_allclose(stats.mean, X.mean(axis=0))
+    np.testing.assert_allclose(stats.std, X.std(axis=0))
+    np.testing.assert_array_equal(stats.max, X.max(axis=0))
+
+def test_stream_and_archive_sources_agree(tmp_path):
+    events = [e for batch, _ in training.synthetic_batches(2500, n_ips=50) for e in batch]
+    for i, event in enumerate(events):
+        event["timestamp"] = f"2025-10-21T10:{i // 1000:02d}:{i % 60:02d}Z"
+
+    r = fakeredis.FakeRedis()
+    for i, event in enumerate(events):
+        r.xadd("events:raw", {"data": orjson.dumps(event)}, id=f"{1761040800000 + i}-0")
+    from_stream = [batch for batch, _ in training.stream_batches(r, page_size=700)]
+
+    path = tmp_path / "events.ndjson.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(b"\n".join(orjson.dumps(e) for e in events) + b"\nnot json\n")
+    from_archive = [batch for batch, _ in training.archive_batches(str(path))]
+
+    assert [len(b) for b in from_stream] == [len(b) for b in from_archive] == [500] * 5
+    assert [e for b in from_stream for e in b] == [e for b in from_archive for e in b] == events
+
+def test_trained_artifact_carries_schema_and_loads_in_the_registry(tmp_path):
+    model, metadata = training.train(training.synthetic_batches(100_000), "synthetic", sample_size=5000,
+                                     n_estimators=20)
+    assert metadata["rows_sampled"] == min(5000, metadata["rows_seen"])
+    assert metadata["feature_schema"]["features"] == list(features.MODEL_FEATURES)
+    path = training.write_artifact(model, metadata, str(tmp_path / "v1.joblib"))
+    assert json.loads((tmp_path / "v1.json").read_text())["version"] == "v1"
+
+    schema = features.feature_schema(training.WINDOW_SECONDS, training.WINDOW_BUCKETS)
+    registry = ModelRegistry(str(tmp_path), feature_schema=schema)
+    loaded = registry.load_initial()
+    assert isinstance(loaded, CompiledForest) and registry.version == "v1"
+    assert loaded.metadata["events"] == 100_000
+    probe = np.array([[0.0, 0.0], [5.0, 10.0], [50.0, 100.0]])
+    np.testing.assert_allclose(loaded.decision_function(probe), model.decision_function(probe), atol=1e-9)
+    assert path == str(tmp_path / "v1.joblib")
+
+def test_registry_rejects_models_trained_on_other_features():
+    model, metadata = training.train(training.synthetic_batches(20_000), sample_size=1000, n_estimators=5)
+    forest = CompiledForest.from_sklearn(model)
+    forest.metadata = dict(metadata, feature_schema=dict(metadata["feature_schema"], version=1))
+    schema = features.feature_schema(training.WINDOW_SECONDS, training.WINDOW_BUCKETS)
+    with pytest.raises(ModelValidationError):
+        validate_model(forest, schema)
+    validate_model(forest)  # nothing to compare against
+
+def test_empty_history_is_an_error():
+    with pytest.raises(ValueError):
+        training.train(iter([]), "empty")
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+from jose import jwt
+
+from worker import run_worker, token_manager
+from worker.token_manager import TokenManager
+
+def count_signings(monkeypatch):
+    calls = []
+    real_encode = jwt.encode
+    monkeypatch.setattr(token_manager.jwt, "encode", lambda *a, **kw: calls.append(1) or real_encode(*a, **kw))
+    return calls
+
+def test_batch_of_reports_signs_at_most_once(monkeypatch, fake_session, trained_model, fresh_worker_stats,
+                                             make_batch):
+    signings = count_signings(monkeypatch)
+    monkeypatch.setattr(run_worker, "token_manager", TokenManager("secret", "ml-worker", "report_anomaly"))
+
+    asyncio.run(run_worker.process_batch(make_batch(20), trained_model, fake_session))
+
+    assert sum(r["event_type"] == "AGG_LOGIN_FAIL" for post in fake_session.posts for r in post["json"]) == 20
+    assert len(signings) == 1
+
+def test_token_is_refreshed_before_expiry(monkeypatch):
+    signings = count_signings(monkeypatch)
+    manager = TokenManager("secret", "ml-worker", "report_anomaly", ttl=600, refresh_margin=60)
+    first = manager.token
+    assert manager.token == first
+    assert jwt.decode(first, "secret", algorithms=["HS256"])["exp"] > time.time()
+
+    now = time.time()
+    monkeypatch.setattr(token_manager.time, "time", lambda: now + 545)
+    assert manager.headers["Authorization"] != f"Bearer {first}"
+    assert len(signings) == 2
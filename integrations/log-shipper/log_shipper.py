@@ -1,96 +1,420 @@
 import time
 import os
 import argparse
+import ctypes
+import ctypes.util
+import gzip
+import json
 import logging
-import re
+import random
+import select
 import requests
-import uuid
-import datetime
 import socket
+import sys
+import threading
+
+from parsers import PARSERS, ParserRegistry
+
+# The spool ships with the Python client next door.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python-client"))
+from securify_spool import Spool, SpoolReplayer  # noqa: E402
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# --- File change notification ---
+
+class PollingWatcher:
+    """Fallback wakeup source: just sleeps for the timeout."""
+
+    def wait(self, timeout: float):
+        time.sleep(timeout)
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """
+    Wakes the tail loop as soon as anything in the log's directory is written,
+    created or renamed (so rotation is noticed too). Uses the Linux inotify
+    syscalls through ctypes; make_watcher falls back to polling elsewhere.
+    """
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    MASK = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout: float):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+def make_watcher(path: str, poll: bool = False):
+    if not poll:
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError) as e:
+            logging.info(f"inotify unavailable ({e}); polling instead.")
+    return PollingWatcher()
+
+# --- Tailing ---
+
+class FileTailer:
+    """
+    Reads complete lines from a growing log file in large chunks.
+
+    `offset` is always the byte position just past the last complete line
+    returned, so it can be checkpointed and resumed exactly. Rotation is
+    detected by the path's inode changing: the old file is drained to EOF
+    before the new one is opened from the start. A file shrinking below the
+    offset is treated as truncation and read again from the start.
+    """
+
+    def __init__(self, path: str, offset: int = None, inode: int = None, chunk_size: int = 1 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.file = None
+        self.inode = None
+        self.offset = 0
+        self._pending = b""
+        self._open(offset, inode)
+
+    def _open(self, offset, inode):
+        if inode is not None and offset is not None:
+            rotated = self._find_by_inode(inode)
+            if rotated is not None and rotated != self.path:
+                # Rotated while we were down: finish the old file first.
+                logging.info(f"Resuming rotated file {rotated} at byte {offset}.")
+                self._open_file(rotated, offset)
+                return
+            if rotated == self.path:
+                self._open_file(self.path, offset)
+                return
+            # The checkpointed file is gone, so the current one is entirely new.
+            offset = 0
+        if not os.path.exists(self.path):
+            self.file, self.inode, self.offset = None, None, 0
+            return
+        # No usable checkpoint: start at the end (tail -f) unless told otherwise.
+        self._open_file(self.path, os.path.getsize(self.path) if offset is None else offset)
+
+    def _open_file(self, path, offset):
+        self.file = open(path, "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        size = os.fstat(self.file.fileno()).st_size
+        self.offset = offset if offset <= size else 0
+        self.file.seek(self.offset)
+        self._pending = b""
+
+    def _find_by_inode(self, inode):
+        """Path of the file with `inode` among the log and its rotated siblings."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        base = os.path.basename(self.path)
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return None
+        for entry in entries:
+            if entry.name.startswith(base) and entry.is_file(follow_symlinks=False) \
+                    and entry.inode() == inode:
+                return entry.path if entry.name != base else self.path
+        return None
+
+    def read_lines(self) -> list:
+        """Returns the complete lines available now (as bytes, without newlines)."""
+        if self.file is None:
+            if not os.path.exists(self.path):
+                return []
+            # The file appeared after we started: everything in it is new.
+            self._open_file(self.path, 0)
+
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                return self.read_lines() if self._check_rotation() else []
+            data = self._pending + chunk
+            end = data.rfind(b"\n")
+            if end < 0:
+                # A line longer than the chunk: keep reading until it ends.
+                self._pending = data
+                continue
+            self._pending = data[end + 1:]
+            self.offset += end + 1
+            return data[:end].split(b"\n")
+
+    def _check_rotation(self):
+        """
+        At EOF: switch to a new file at the path, or rewind after truncation.
+        Returns True when there is a new file to read.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # rotated away and not recreated yet; keep the old file open
+        if stat.st_ino != self.inode:
+            logging.info(f"{self.path} was rotated; switching to the new file.")
+            self.file.close()
+            self._open_file(self.path, 0)
+            return True
+        if stat.st_size < self.offset + len(self._pending):
+            logging.info(f"{self.path} was truncated; reading from the start.")
+            self.file.seek(0)
+            self.offset = 0
+            self._pending = b""
+        return False
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+# --- Checkpoints ---
+
+class Checkpoint:
+    """Byte offset + inode of the tailed file, persisted atomically as JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logging.warning(f"Ignoring unreadable checkpoint {self.path}.")
+            return {}
+
+    def save(self, inode: int, offset: int):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"inode": inode, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+def default_state_file(log_file: str) -> str:
+    name = os.path.abspath(log_file).strip(os.sep).replace(os.sep, "_")
+    return os.path.join(os.path.expanduser("~"), ".securify-shipper", f"{name}.json")
+
+# --- Shipper ---
+
 class LogShipper:
-    def __init__(self, log_file, api_url, api_token):
+    def __init__(self, log_file, api_url, api_token, state_file=None, batch_size=500,
+                 flush_interval=1.0, chunk_size=1 << 20, from_start=False, poll=False, formats=None,
+                 spool_dir=None, spool_max_bytes=512 * 1024 * 1024, replay_rate=None):
         self.log_file = log_file
-        self.api_url = api_url.rstrip("/") + "/ingest"
+        self.api_url = api_url.rstrip("/") + "/ingest/batch"
         self.api_token = api_token
         self.hostname = socket.gethostname()
         self.ip_address = socket.gethostbyname(self.hostname)
-
-    def follow(self):
-        """Generator that yields new lines in a file (like tail -f)."""
-        self.file.seek(0, 2)  # Go to the end of the file
-        while True:
-            line = self.file.readline()
-            if not line:
-                time.sleep(0.1)
-                continue
-            yield line
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self.from_start = from_start
+        self.poll = poll
+        self.parsers = ParserRegistry.from_names(formats)
+        self.checkpoint = Checkpoint(state_file or default_state_file(log_file))
+        self.spool_dir = spool_dir
+        self.spool_max_bytes = spool_max_bytes
+        self.replay_rate = replay_rate
+        self.spool = None
+        self.replayer = None
+        # One keep-alive connection for every batch.
+        self.session = self._new_session()
+        self.stats = {"lines": 0, "events": 0, "batches": 0, "bytes": 0, "spooled": 0}
+        self._saved = None
+        self._last_report = time.monotonic()
+        self._stopping = threading.Event()
+        # First retry waits about this long; doubles up to 30s.
+        self.retry_delay = 0.5
 
     def parse_line(self, line):
         """
-        Naive parser for demonstration.
-        Real-world usage would use Regex for Auth.log or Nginx logs.
+        Parses one log line (str or bytes) into an event, or None.
         """
-        line = line.strip()
-        if not line:
-            return None
+        if isinstance(line, str):
+            line = line.encode()
+        return self.parsers.parse(line.rstrip(b"\n"), self.ip_address)
 
-        # SSH Login
-        if "Failed password" in line or "Accepted password" in line:
-            success = "Accepted" in line
-            user_match = re.search(r"for (\w+)", line)
-            ip_match = re.search(r"from ([\d\.]+)", line)
-            
-            username = user_match.group(1) if user_match else "unknown"
-            source_ip = ip_match.group(1) if ip_match else "0.0.0.0"
-
-            return {
-                "event_id": str(uuid.uuid4()),
-                "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
-                "source_ip": source_ip,
-                "event_type": "LOGIN_ATTEMPT",
-                "username": username,
-                "success": success
-            }
-        
-        return None
+    def _new_session(self):
+        session = requests.Session()
+        session.headers.update({
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        })
+        return session
 
-    def send_event(self, event):
+    def _post(self, events, session=None):
+        """
+        One attempt at /ingest/batch. Returns False if it is worth retrying,
+        True once the API has taken (or for good refused) the batch.
+        """
+        body = gzip.compress(json.dumps(events).encode(), compresslevel=5)
         try:
-            headers = {"Authorization": f"Bearer {self.api_token}"}
-            resp = requests.post(self.api_url, json=event, headers=headers, timeout=2)
+            resp = (session or self.session).post(self.api_url, data=body, timeout=10)
             if resp.status_code == 202:
-                logging.info(f"Sent event: {event['username']} (Success: {event['success']})")
-            else:
-                logging.warning(f"Failed to send: {resp.status_code} - {resp.text}")
-        except Exception as e:
-            logging.error(f"Error sending event: {e}")
+                rejected = resp.json().get("rejected", [])
+                if rejected:
+                    logging.warning(f"API rejected {len(rejected)} events: {rejected[:3]}")
+                return True
+            if resp.status_code < 500 and resp.status_code not in (408, 429):
+                # Retrying won't fix a bad token or a batch with no valid events.
+                logging.error(f"Dropping batch of {len(events)}: {resp.status_code} - {resp.text[:200]}")
+                return True
+            logging.warning(f"Failed to send batch: {resp.status_code} - {resp.text[:200]}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"Error sending batch: {e}")
+        return False
+
+    def send_batch(self, events):
+        """
+        Sends a batch to /ingest/batch. Without a spool it retries with
+        backoff until the API takes it, pausing tailing (offsets are only
+        checkpointed afterwards, so nothing is lost). With a spool a failed
+        batch is written to disk instead and tailing carries on; while the
+        spool holds a backlog new batches queue behind it, keeping order.
+        Returns False if stop() was called before the batch could be sent.
+        """
+        if self.spool is not None:
+            if self.spool.depth()[0] or not self._post(events):
+                self.spool.append(events)
+                self.stats["spooled"] += len(events)
+                self.replayer.notify()
+            return True
+        delay = self.retry_delay
+        while not self._post(events):
+            if self._stopping.wait(random.uniform(0.5, 1.0) * delay):
+                return False
+            delay = min(delay * 2, 30)
+        return True
+
+    def _report_spool(self):
+        if self.replayer is None or time.monotonic() - self._last_report < 60:
+            return
+        self._last_report = time.monotonic()
+        metrics = self.replayer.metrics()
+        if metrics["depth_batches"] or metrics["replay_rate"]:
+            logging.info(f"Spool: {metrics['depth_batches']} batches / {metrics['depth_bytes']} bytes queued, "
+                         f"replaying {metrics['replay_rate']:.0f} events/s, {metrics['evicted']} evicted")
 
-    def run(self):
+    def _flush(self, tailer, events):
+        for i in range(0, len(events), self.batch_size):
+            if not self.send_batch(events[i:i + self.batch_size]):
+                return  # stopping: leave the checkpoint behind the unsent batch
+            self.stats["batches"] += 1
+        self.stats["events"] += len(events)
+        self._report_spool()
+        position = (tailer.inode, tailer.offset)
+        if tailer.inode is not None and position != self._saved:
+            self.checkpoint.save(*position)
+            self._saved = position
+
+    def run(self, follow=True):
+        """
+        Tails the log and ships events until interrupted. With follow=False,
+        stops once the file has been read to the end (replays, benchmarks).
+        """
         logging.info(f"Starting Log Shipper on {self.log_file} -> {self.api_url}")
-        
-        if not os.path.exists(self.log_file):
-            # Create dummy file if not exists for testing
-            with open(self.log_file, 'w') as f:
-                f.write("Log file created by Securify Shipper.\n")
-
-        with open(self.log_file, 'r') as f:
-            self.file = f
-            for line in self.follow():
-                event = self.parse_line(line)
-                if event:
-                    self.send_event(event)
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint.path)), exist_ok=True)
+        state = self.checkpoint.load()
+        tailer = FileTailer(
+            self.log_file,
+            offset=state.get("offset", 0 if self.from_start else None),
+            inode=state.get("inode"),
+            chunk_size=self.chunk_size,
+        )
+        watcher = make_watcher(self.log_file, self.poll) if follow else None
+        if self.spool_dir:
+            # Batches are checkpointed once spooled, so the spool fsyncs each one.
+            self.spool = Spool(self.spool_dir, max_bytes=self.spool_max_bytes, fsync="always")
+            replay_session = self._new_session()
+            self.replayer = SpoolReplayer(self.spool, lambda batch: self._post(batch, replay_session),
+                                          batch_size=self.batch_size, rate=self.replay_rate).start()
+        events = []
+        last_flush = time.monotonic()
+        try:
+            while not self._stopping.is_set():
+                lines = tailer.read_lines()
+                for raw in lines:
+                    event = self.parsers.parse(raw, self.ip_address)
+                    if event:
+                        events.append(event)
+                self.stats["lines"] += len(lines)
+                if len(events) >= self.batch_size or (events or lines) and \
+                        time.monotonic() - last_flush >= self.flush_interval:
+                    self._flush(tailer, events)
+                    events = []
+                    last_flush = time.monotonic()
+                if lines:
+                    continue
+                # Caught up: ship what is pending, then sleep until the file changes.
+                self._flush(tailer, events)
+                events = []
+                last_flush = time.monotonic()
+                if not follow:
+                    break
+                watcher.wait(self.flush_interval)
+        finally:
+            self.stats["bytes"] = tailer.offset
+            tailer.close()
+            if watcher is not None:
+                watcher.close()
+            if self.replayer is not None:
+                self.replayer.stop()
+                self.spool.close()
+                self.spool = self.replayer = None
+
+    def stop(self):
+        """Makes run() return after its current wait."""
+        self._stopping.set()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Securify AI Log Shipper")
     parser.add_argument("--file", required=True, help="Path to log file to watch")
     parser.add_argument("--url", default="http://localhost:8000", help="Securify API URL")
     parser.add_argument("--token", required=True, help="JWT Ingest Token")
-    
+    parser.add_argument("--state-file", help="Checkpoint file (default: ~/.securify-shipper/<path>.json)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Events per API request")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="Max seconds an event waits to be sent")
+    parser.add_argument("--from-start", action="store_true", help="Without a checkpoint, read the file from the beginning")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    parser.add_argument("--format", action="append", choices=sorted(PARSERS), dest="formats",
+                        help="Log formats to parse (repeatable; default: all)")
+    parser.add_argument("--spool-dir", help="Spool batches here while the API is unreachable")
+    parser.add_argument("--spool-max-mb", type=int, default=512, help="Spool size cap; oldest batches are evicted")
+    parser.add_argument("--replay-rate", type=float, help="Max events/sec replayed from the spool (default: unlimited)")
+
     args = parser.parse_args()
-    
-    shipper = LogShipper(args.file, args.url, args.token)
-    shipper.run()
+
+    shipper = LogShipper(args.file, args.url, args.token, state_file=args.state_file,
+                         batch_size=args.batch_size, flush_interval=args.flush_interval,
+                         from_start=args.from_start, poll=args.poll, formats=args.formats,
+                         spool_dir=args.spool_dir, spool_max_bytes=args.spool_max_mb * 1024 * 1024,
+                         replay_rate=args.replay_rate)
+    try:
+        shipper.run()
+    except KeyboardInterrupt:
+        logging.info("Log Shipper stopped.")
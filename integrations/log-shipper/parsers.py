@@ -0,0 +1,291 @@
+"""
+Log line parsers for the Securify log shipper.
+
+Each parser turns one line of a known format into a LOGIN_ATTEMPT or
+FILE_CHANGE event shaped like the ingest API's models (app/models.py), or
+returns None. A ParserRegistry combines the keywords of all its parsers into a
+single compiled alternation, so a line is scanned once and only offered to the
+parsers whose keyword it contains; most lines in a busy log match nothing and
+are skipped without being decoded.
+"""
+import collections
+import datetime
+import functools
+import re
+import uuid
+
+IPV4 = r"\d{1,3}(?:\.\d{1,3}){3}"
+
+def new_event(event_type: str, timestamp: str, source_ip: str, **fields) -> dict:
+    return {
+        "event_id": str(uuid.uuid4()),
+        "timestamp": timestamp,
+        "source_ip": source_ip,
+        "event_type": event_type,
+        **fields,
+    }
+
+def utc_now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+@functools.lru_cache(maxsize=4096)
+def _bsd_syslog_time(stamp: str) -> str:
+    # "Oct 21 10:00:00" is local time without a year: assume the current one,
+    # unless that lands in the future (a December line read in January).
+    now = datetime.datetime.now()
+    parsed = datetime.datetime.strptime(f"{now.year} {stamp}", "%Y %b %d %H:%M:%S")
+    if parsed - now > datetime.timedelta(days=1):
+        parsed = parsed.replace(year=now.year - 1)
+    return parsed.astimezone().isoformat()
+
+def syslog_timestamp(line: str) -> str:
+    """ISO timestamp of a syslog line (RFC 3339 or classic BSD prefix)."""
+    try:
+        if line[:4].isdigit() and line[4:5] == "-":
+            stamp = datetime.datetime.fromisoformat(line[:line.index(" ")])
+            if stamp.tzinfo is None:
+                stamp = stamp.astimezone()
+            return stamp.isoformat()
+        return _bsd_syslog_time(line[:15])
+    except ValueError:
+        return utc_now()
+
+class Parser:
+    """
+    Base class. `keywords` are byte strings, at least one of which appears in
+    every line the parser can turn into an event; they drive the registry's
+    prefilter, so the more specific they are the fewer lines reach `parse`.
+    """
+    name = ""
+    keywords = ()
+
+    def parse(self, line: str, host_ip: str):
+        raise NotImplementedError
+
+class SshdParser(Parser):
+    """OpenSSH password / public key / keyboard-interactive results."""
+    name = "sshd"
+    keywords = (b"]: Failed ", b"]: Accepted ")
+    pattern = re.compile(
+        r"sshd\[\d+\]: (Failed|Accepted) (?:password|publickey|keyboard-interactive/pam) "
+        rf"for (?:invalid user )?(\S+) from ({IPV4}) ")
+
+    def parse(self, line, host_ip):
+        match = self.pattern.search(line)
+        if match is None:
+            return None
+        result, username, ip = match.groups()
+        return new_event("LOGIN_ATTEMPT", syslog_timestamp(line), ip,
+                         username=username, success=result == "Accepted")
+
+class SudoParser(Parser):
+    """
+    sudo's own log lines. Failed authentications become failed LOGIN_ATTEMPTs;
+    commands that write a file (editors, cp, chmod, ...) become FILE_CHANGEs on
+    that file; any other command is a successful escalation LOGIN_ATTEMPT.
+    """
+    name = "sudo"
+    keywords = (b" ; COMMAND=",)
+    pattern = re.compile(r"sudo(?:\[\d+\])?:\s+(\S+) : (.*?)COMMAND=(\S+)(.*)$")
+    failures = ("incorrect password attempt", "NOT in sudoers", "command not allowed")
+    file_writers = frozenset({
+        "vi", "vim", "nano", "emacs", "sudoedit", "tee", "cp", "mv", "rm", "ln", "install",
+        "chmod", "chown", "chgrp", "sed", "truncate", "touch", "dd",
+    })
+
+    def parse(self, line, host_ip):
+        match = self.pattern.search(line)
+        if match is None:
+            return None
+        user, context, command, args = match.groups()
+        timestamp = syslog_timestamp(line)
+        if any(reason in context for reason in self.failures):
+            return new_event("LOGIN_ATTEMPT", timestamp, host_ip, username=user, success=False)
+        program = command.rsplit("/", 1)[-1]
+        if program == "visudo":
+            return new_event("FILE_CHANGE", timestamp, host_ip, file_path="/etc/sudoers", user_id=user)
+        if program in self.file_writers:
+            paths = [arg for arg in args.split() if arg.startswith("/")]
+            if paths:
+                return new_event("FILE_CHANGE", timestamp, host_ip, file_path=paths[-1], user_id=user)
+        return new_event("LOGIN_ATTEMPT", timestamp, host_ip, username=user, success=True)
+
+class AccessLogParser(Parser):
+    """
+    nginx / Apache common and combined access logs. 401s and POSTs to login
+    endpoints are LOGIN_ATTEMPTs; successful WebDAV-style writes (PUT, DELETE,
+    MOVE, ...) are FILE_CHANGEs on the request path.
+    """
+    name = "access"
+    # Only the requests that can become events: logins, writes and 401s.
+    keywords = (b'"POST ', b'"PUT ', b'"DELETE ', b'"MKCOL ', b'"MOVE ', b'"COPY ', b'"PATCH ', b'" 401 ')
+    pattern = re.compile(rf'^({IPV4}) \S+ (\S+) \[([^\]]+)\] "([A-Z]+) ([^ "?]+)\S* HTTP/[\d.]+" (\d{{3}}) ')
+    login_path = re.compile(r"/(?:login|log-in|signin|sign-in|sign_in|session|auth|wp-login\.php)\b", re.I)
+    write_methods = frozenset({"PUT", "DELETE", "MKCOL", "MOVE", "COPY", "PATCH"})
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _time(stamp: str) -> str:
+        return datetime.datetime.strptime(stamp, "%d/%b/%Y:%H:%M:%S %z").isoformat()
+
+    def parse(self, line, host_ip):
+        match = self.pattern.match(line)
+        if match is None:
+            return None
+        ip, user, stamp, method, path, status = match.groups()
+        status = int(status)
+        if status == 401:
+            success = False
+        elif method == "POST" and self.login_path.search(path):
+            success = status < 400
+        elif method in self.write_methods and 200 <= status < 300:
+            try:
+                timestamp = self._time(stamp)
+            except ValueError:
+                timestamp = utc_now()
+            return new_event("FILE_CHANGE", timestamp, ip, file_path=path, user_id=user)
+        else:
+            return None
+        try:
+            timestamp = self._time(stamp)
+        except ValueError:
+            timestamp = utc_now()
+        return new_event("LOGIN_ATTEMPT", timestamp, ip, username=user, success=success)
+
+class AuditParser(Parser):
+    """
+    Linux audit (auditd) records. USER_AUTH records are LOGIN_ATTEMPTs. File
+    changes span several records sharing a serial number: the SYSCALL record
+    carries who and whether it succeeded, the following PATH records the files.
+    A FILE_CHANGE is emitted for each PATH of a successful syscall that matched
+    a keyed audit rule (e.g. `-w /etc/passwd -p wa -k identity`).
+    """
+    name = "audit"
+    keywords = (b"type=SYSCALL ", b"type=PATH ", b"type=USER_AUTH ")
+    pattern = re.compile(r"type=(\w+) msg=audit\((\d+\.\d+):(\d+)\): (.*)$")
+    fields = re.compile(r"(\w+)=(\"[^\"]*\"|'[^']*'|\S+)")
+    unset_uid = "4294967295"
+    # Serials of SYSCALL records still waiting for their PATH records.
+    max_pending = 1024
+
+    def __init__(self):
+        self._syscalls = collections.OrderedDict()
+
+    @staticmethod
+    def _value(raw: str) -> str:
+        if raw[:1] in "\"'":
+            return raw[1:-1]
+        # auditd hex-encodes values containing spaces or special characters.
+        if len(raw) % 2 == 0 and len(raw) > 2:
+            try:
+                return bytes.fromhex(raw).decode("utf-8", "replace")
+            except ValueError:
+                pass
+        return raw
+
+    def parse(self, line, host_ip):
+        match = self.pattern.search(line)
+        if match is None:
+            return None
+        record_type, epoch, serial, body = match.groups()
+        if record_type == "SYSCALL":
+            fields = dict(self.fields.findall(body))
+            key = fields.get("key", "(null)")
+            if fields.get("success") == "yes" and key != "(null)":
+                auid = fields.get("auid", self.unset_uid)
+                self._syscalls[serial] = auid if auid != self.unset_uid else fields.get("uid", auid)
+                if len(self._syscalls) > self.max_pending:
+                    self._syscalls.popitem(last=False)
+            return None
+        if record_type == "PATH":
+            user_id = self._syscalls.get(serial)
+            if user_id is None:
+                return None
+            fields = dict(self.fields.findall(body))
+            if fields.get("nametype") == "PARENT" or "name" not in fields:
+                return None
+            return new_event("FILE_CHANGE", self._time(epoch), host_ip,
+                             file_path=self._value(fields["name"]), user_id=user_id)
+        if record_type == "USER_AUTH":
+            # The interesting fields sit inside msg='...'.
+            fields = dict(self.fields.findall(body.replace("msg='", "")))
+            account = fields.get("acct")
+            if account is None:
+                return None
+            addr = fields.get("addr", "?")
+            ip = addr if re.fullmatch(IPV4, addr) else host_ip
+            return new_event("LOGIN_ATTEMPT", self._time(epoch), ip,
+                             username=self._value(account), success=fields.get("res", "").startswith("success"))
+        return None
+
+    @staticmethod
+    def _time(epoch: str) -> str:
+        return datetime.datetime.fromtimestamp(float(epoch), datetime.timezone.utc).isoformat()
+
+def keyword_pattern(keywords) -> bytes:
+    """
+    A regex alternation matching any of the literal `keywords`, with shared
+    prefixes factored out. re tries alternatives one by one at each position,
+    so a trie-shaped pattern rejects most positions after a single byte.
+    """
+    children = {}
+    ends_here = False
+    for keyword in keywords:
+        if keyword:
+            children.setdefault(keyword[:1], []).append(keyword[1:])
+        else:
+            ends_here = True
+    branches = [re.escape(first) + keyword_pattern(rest) for first, rest in children.items()]
+    if not branches:
+        return b""
+    if len(branches) == 1 and not ends_here:
+        return branches[0]
+    # A keyword ending here is a prefix of longer ones: make the rest optional (greedy).
+    return b"(?:" + b"|".join(branches) + b")" + (b"?" if ends_here else b"")
+
+PARSERS = {parser.name: parser for parser in (SshdParser, SudoParser, AccessLogParser, AuditParser)}
+
+class ParserRegistry:
+    """
+    Dispatches raw (bytes) lines to registered parsers. All keywords are
+    compiled into one alternation; a line is decoded only when it contains a
+    keyword, and then only the parsers owning that keyword are tried.
+    """
+
+    def __init__(self, parsers=()):
+        self.parsers = []
+        self._dispatch = {}
+        self._prefilter = None
+        for parser in parsers:
+            self.register(parser)
+
+    @classmethod
+    def from_names(cls, names=None):
+        """A registry with fresh instances of the named parsers (all by default)."""
+        unknown = set(names or ()) - set(PARSERS)
+        if unknown:
+            raise ValueError(f"Unknown log formats: {', '.join(sorted(unknown))}")
+        return cls(PARSERS[name]() for name in (names or PARSERS))
+
+    def register(self, parser: Parser):
+        if not parser.keywords:
+            raise ValueError(f"Parser {parser.name!r} declares no keywords")
+        self.parsers.append(parser)
+        for keyword in parser.keywords:
+            self._dispatch.setdefault(keyword, []).append(parser)
+        self._prefilter = re.compile(keyword_pattern(sorted(self._dispatch)))
+
+    def parse(self, raw: bytes, host_ip: str):
+        """Returns the event for one line (bytes, no newline), or None."""
+        match = self._prefilter.search(raw)
+        if match is None:
+            return None
+        line = raw.decode("utf-8", "replace")
+        while match is not None:
+            for parser in self._dispatch[match.group()]:
+                event = parser.parse(line, host_ip)
+                if event is not None:
+                    return event
+            # Another parser's keyword may still appear later in the line.
+            match = self._prefilter.search(raw, match.end())
+        return None
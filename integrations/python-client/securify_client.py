@@ -3,18 +3,202 @@ import uuid
 import datetime
 import socket
 import logging
+import atexit
+import gzip
+import json
+import queue
+import random
+import threading
+import time
 from typing import Optional
 
+from securify_spool import Spool, SpoolReplayer
+
 # Configure basic logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("SecurifyClient")
 
+OVERFLOW_POLICIES = ("drop", "block", "spill")
+
+def _resolve_local_ip() -> str:
+    # Best effort to get local IP if not provided
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except OSError:
+        return "127.0.0.1"
+
+class BatchSender:
+    """
+    Background sender behind SecurifyClient(buffered=True).
+
+    Events go into a bounded in-memory queue and the caller returns at once.
+    A daemon thread sends them to /ingest/batch, gzip-compressed, whenever
+    `batch_size` events are waiting or `flush_interval` seconds have passed.
+    Failed sends are retried with exponential backoff and full jitter.
+    When the queue is full the overflow policy decides what happens:
+    "drop" discards the event, "block" waits for room, and "spill" writes it
+    to `spool`. With a spool, batches that still fail after `max_retries` are
+    spooled too instead of dropped; a SpoolReplayer sends them later.
+    """
+
+    def __init__(self, session: requests.Session, batch_url: str, timeout: float = 2,
+                 max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 1.0,
+                 overflow: str = "drop", spool: Optional[Spool] = None,
+                 max_retries: int = 5, backoff_base: float = 0.2, backoff_cap: float = 10.0,
+                 compress: bool = True):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        if overflow == "spill" and spool is None:
+            raise ValueError("overflow='spill' needs a spool (SecurifyClient(spool_dir=...))")
+        self.session = session
+        self.batch_url = batch_url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.spool = spool
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.compress = compress
+        self.stats = {"queued": 0, "sent": 0, "rejected": 0, "dropped": 0, "spilled": 0, "retries": 0}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="securify-sender", daemon=True)
+        self._thread.start()
+
+    # --- Caller side ---
+
+    def submit(self, event: dict) -> bool:
+        """Queues one event. Returns False if it was dropped."""
+        try:
+            if self.overflow == "block":
+                self._queue.put(event)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            if self.overflow == "spill":
+                self._spill([event])
+                return True
+            dropped = self._count("dropped")
+            if dropped % 1000 == 1:
+                logger.warning(f"Securify buffer full; dropped {dropped} events so far.")
+            return False
+        self._count("queued")
+        return True
+
+    def _count(self, stat: str, n: int = 1) -> int:
+        # Callers and the sender thread both update stats; share the queue's lock.
+        with self._queue.mutex:
+            self.stats[stat] += n
+            return self.stats[stat]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every queued event has been sent (or given up on)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 10):
+        """Sends what is still queued, then stops the background thread."""
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    # --- Background thread ---
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._send_with_retries(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _collect(self) -> list:
+        """Blocks for up to flush_interval, then returns up to batch_size events."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stopping.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _post(self, batch: list) -> requests.Response:
+        body = json.dumps(batch).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return self.session.post(self.batch_url, data=body, headers=headers, timeout=self.timeout)
+
+    def _send_with_retries(self, batch: list) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._post(batch)
+                if response.status_code < 300:
+                    self._count("sent", len(batch))
+                    try:
+                        rejected = response.json().get("rejected", [])
+                    except ValueError:
+                        rejected = []
+                    self._count("rejected", len(rejected))
+                    if rejected:
+                        logger.error(f"Securify rejected {len(rejected)} events: {rejected[:3]}")
+                    return True
+                if response.status_code not in (408, 429) and response.status_code < 500:
+                    # Our fault (bad token, invalid events): retrying won't help.
+                    self._count("rejected", len(batch))
+                    logger.error(f"Securify refused batch of {len(batch)}: {response.status_code} {response.text[:200]}")
+                    return False
+                error = f"HTTP {response.status_code}"
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+            if attempt == self.max_retries:
+                break
+            self._count("retries")
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+            logger.warning(f"Securify batch send failed ({error}); retrying in {delay:.2f}s")
+            if self._stopping.wait(delay) and attempt > 0:
+                break  # shutting down: one retry, then hand over to the fallback below
+
+        if self.spool is not None:
+            self._spill(batch)
+        else:
+            self._count("dropped", len(batch))
+            logger.error(f"Gave up on batch of {len(batch)} events after {self.max_retries} retries.")
+        return False
+
+    def _spill(self, events: list):
+        self.spool.append(events)
+        self._count("spilled", len(events))
+
 class SecurifyClient:
     """
     A simple client for integrating with the Securify AI Ingest API.
+
+    By default every log_* call is a blocking POST to /ingest. With
+    buffered=True, calls only enqueue the event and a background BatchSender
+    ships batches to /ingest/batch (extra keyword arguments configure it);
+    call flush() or close() before exiting to deliver what is still queued.
+
+    With spool_dir, events the API could not take during an outage are kept
+    in an on-disk Spool (spool_options configure it) instead of being lost,
+    and replayed in batches of up to `replay_batch_size` events at no more
+    than `replay_rate` events/sec once it is back.
     """
     
-    def __init__(self, api_url: str, api_token: str, timeout: int = 2):
+    def __init__(self, api_url: str, api_token: str, timeout: int = 2,
+                 buffered: bool = False, spool_dir: Optional[str] = None,
+                 spool_options: Optional[dict] = None, replay_rate: Optional[float] = None,
+                 replay_batch_size: int = 500, **buffer_options):
         self.api_url = api_url.rstrip("/") + "/ingest"
         self.api_token = api_token
         self.timeout = timeout
@@ -23,28 +207,87 @@ class SecurifyClient:
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json"
         })
+        self._local_ip = None
+        self.sender = None
+        self.spool = None
+        self.replayer = None
+        if spool_dir:
+            self.spool = Spool(spool_dir, **(spool_options or {}))
+            self.replayer = SpoolReplayer(self.spool, self._deliver_batch, batch_size=replay_batch_size,
+                                          rate=replay_rate).start()
+        if buffered:
+            self.sender = BatchSender(self.session, self.api_url + "/batch", timeout=timeout,
+                                      spool=self.spool, **buffer_options)
+        if self.sender or self.spool:
+            atexit.register(self.close)
+
+    @property
+    def local_ip(self) -> str:
+        """This host's IP, resolved once instead of on every event."""
+        if self._local_ip is None:
+            self._local_ip = _resolve_local_ip()
+        return self._local_ip
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Buffered mode: waits until queued events have been sent."""
+        return self.sender.flush(timeout) if self.sender else True
+
+    def close(self):
+        """Delivers queued events, then stops the sender and spool replay."""
+        if self.sender:
+            self.sender.close()
+        if self.replayer:
+            self.replayer.stop()
+            self.spool.close()
+            self.replayer = None
+
+    def _deliver_batch(self, events: list) -> bool:
+        """Spool replay: False means try again later, True that the API has decided."""
+        body = gzip.compress(json.dumps(events).encode(), compresslevel=5)
+        try:
+            response = self.session.post(self.api_url + "/batch", data=body, timeout=self.timeout,
+                                         headers={"Content-Encoding": "gzip"})
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Spool replay failed: {e}")
+            return False
+        if response.status_code in (408, 429) or response.status_code >= 500:
+            logger.warning(f"Spool replay failed: HTTP {response.status_code}")
+            return False
+        if response.status_code >= 300:
+            logger.error(f"Securify refused spooled batch of {len(events)}: "
+                         f"{response.status_code} {response.text[:200]}")
+        return True
 
     def _send_event(self, event_data: dict):
         """Internal method to send the event to the API."""
+        if self.sender:
+            return self.sender.submit(event_data)
         try:
             response = self.session.post(self.api_url, json=event_data, timeout=self.timeout)
-            response.raise_for_status()
-            logger.debug(f"Event sent successfully: {event_data['event_id']}")
-            return True
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to send event to Securify AI: {e}")
+            return self._send_failed(event_data, str(e))
+        if response.status_code in (408, 429) or response.status_code >= 500:
+            return self._send_failed(event_data, f"HTTP {response.status_code}")
+        if response.status_code >= 300:
+            logger.error(f"Securify refused event: {response.status_code} {response.text[:200]}")
             return False
+        logger.debug(f"Event sent successfully: {event_data['event_id']}")
+        return True
+
+    def _send_failed(self, event_data: dict, error: str) -> bool:
+        if self.spool is not None:
+            # Outage: keep it on disk; the replayer delivers it later.
+            self.spool.append([event_data])
+            return True
+        logger.error(f"Failed to send event to Securify AI: {error}")
+        return False
 
     def log_login(self, username: str, success: bool, ip_address: Optional[str] = None):
         """
         Log a user login attempt.
         """
         if not ip_address:
-            # Best effort to get local IP if not provided
-            try:
-                ip_address = socket.gethostbyname(socket.gethostname())
-            except:
-                ip_address = "127.0.0.1"
+            ip_address = self.local_ip
 
         payload = {
             "event_id": str(uuid.uuid4()),
@@ -61,10 +304,7 @@ class SecurifyClient:
         Log a sensitive file access or modification.
         """
         if not ip_address:
-             try:
-                ip_address = socket.gethostbyname(socket.gethostname())
-             except:
-                ip_address = "127.0.0.1"
+            ip_address = self.local_ip
 
         payload = {
             "event_id": str(uuid.uuid4()),
@@ -0,0 +1,433 @@
+"""
+Durable on-disk spool for Securify events that could not be delivered.
+
+Records are appended to numbered segment files in a directory. Each record is
+a length + CRC32 header followed by the payload (a JSON array of events), so a
+write torn by a crash is detected and cut off when the spool is reopened. A
+separate cursor file remembers how far replay has got; fully replayed
+segments are deleted. When the spool exceeds `max_bytes` the oldest segments
+are evicted, whether replayed or not.
+
+Delivery is at-least-once: a crash between sending a batch and saving the
+cursor resends that batch after restart.
+"""
+import collections
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+logger = logging.getLogger("SecurifySpool")
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+HEADER = struct.Struct("<II")  # payload length, crc32(payload)
+MAX_RECORD_BYTES = 64 * 1024 * 1024
+SEGMENT_SUFFIX = ".seg"
+
+class Spool:
+    """
+    Append-only segmented spool. Thread-safe; one process per directory.
+
+    fsync="always" syncs every append (survives power loss), "interval" at
+    most every `fsync_interval` seconds, "never" leaves it to the OS (survives
+    a process crash, not a host crash).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024,
+                 segment_bytes: int = 8 * 1024 * 1024, fsync: str = "interval",
+                 fsync_interval: float = 1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # At least two segments fit, so eviction never has to touch the active one.
+        self.segment_bytes = max(1024, min(segment_bytes, max_bytes // 2))
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.stats = {"appended": 0, "evicted": 0, "corrupt": 0}
+        self._lock = threading.Lock()
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = None
+        if fcntl is not None:
+            self._lock_file = open(os.path.join(directory, "LOCK"), "a")
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                raise RuntimeError(f"Spool {directory} is in use by another process")
+        self._recover()
+
+    # --- Opening and crash recovery ---
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:016d}{SEGMENT_SUFFIX}")
+
+    def _scan(self, seq: int, verify: bool) -> tuple:
+        """(records, valid_bytes) of a segment; stops at the first bad record."""
+        records = 0
+        offset = 0
+        with open(self._path(seq), "rb") as f:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                length, crc = HEADER.unpack(header)
+                if length > MAX_RECORD_BYTES:
+                    break
+                if verify:
+                    payload = f.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        break
+                else:
+                    f.seek(length, os.SEEK_CUR)
+                    if f.tell() > os.fstat(f.fileno()).st_size:
+                        break
+                records += 1
+                offset += HEADER.size + length
+        return records, offset
+
+    def _recover(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(SEGMENT_SUFFIX))
+        # seq -> [records, bytes]
+        self._segments = collections.OrderedDict(
+            (int(n[:-len(SEGMENT_SUFFIX)]), [0, 0]) for n in names)
+        for seq in self._segments:
+            last = seq == next(reversed(self._segments))
+            records, valid = self._scan(seq, verify=last)
+            size = os.path.getsize(self._path(seq))
+            if last and valid < size:
+                # A record torn by a crash mid-write: cut it off.
+                logger.warning(f"Spool segment {seq}: truncating {size - valid} bytes of incomplete record")
+                with open(self._path(seq), "r+b") as f:
+                    f.truncate(valid)
+                size = valid
+            self._segments[seq] = [records, size]
+
+        cursor = self._load_cursor()
+        self._read_seq, self._read_offset, self._read_records = None, 0, 0
+        if self._segments:
+            seq = cursor.get("segment")
+            if seq in self._segments:
+                self._read_seq = seq
+                self._read_offset = min(cursor.get("offset", 0), self._segments[seq][1])
+                self._read_records = self._count_until(seq, self._read_offset)
+            else:
+                self._read_seq = next(iter(self._segments))
+            # Replayed segments whose deletion was interrupted.
+            for old in [s for s in self._segments if s < self._read_seq]:
+                self._delete_segment(old)
+
+        if not self._segments:
+            self._segments[1] = [0, 0]
+            self._read_seq = 1
+        self._write_seq = next(reversed(self._segments))
+        self._writer = open(self._path(self._write_seq), "ab")
+
+    def _count_until(self, seq: int, offset: int) -> int:
+        records = 0
+        position = 0
+        with open(self._path(seq), "rb") as f:
+            while position < offset:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                length, _ = HEADER.unpack(header)
+                f.seek(length, os.SEEK_CUR)
+                position += HEADER.size + length
+                records += 1
+        return records
+
+    def _load_cursor(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, "cursor"), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, "cursor")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"segment": self._read_seq, "offset": self._read_offset}, f)
+            if self.fsync == "always":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    # --- Writing ---
+
+    def append(self, events: list):
+        """Durably queues one batch of events (subject to the fsync policy)."""
+        payload = json.dumps(events).encode()
+        if len(payload) > MAX_RECORD_BYTES:
+            raise ValueError(f"Spool record of {len(payload)} bytes exceeds {MAX_RECORD_BYTES}")
+        record = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._segments[self._write_seq][1] + len(record) > self.segment_bytes \
+                    and self._segments[self._write_seq][0]:
+                self._roll()
+            self._writer.write(record)
+            self._writer.flush()
+            self._dirty = True
+            segment = self._segments[self._write_seq]
+            segment[0] += 1
+            segment[1] += len(record)
+            self.stats["appended"] += 1
+            self._maybe_fsync()
+            self._evict()
+
+    def _maybe_fsync(self, force: bool = False):
+        if not self._dirty or self.fsync == "never" and not force:
+            return
+        now = time.monotonic()
+        if force or self.fsync == "always" or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._writer.fileno())
+            self._last_fsync = now
+            self._dirty = False
+
+    def _roll(self):
+        self._maybe_fsync(force=self.fsync != "never")
+        self._writer.close()
+        self._write_seq += 1
+        self._segments[self._write_seq] = [0, 0]
+        self._writer = open(self._path(self._write_seq), "ab")
+
+    def _evict(self):
+        while self._total_bytes() > self.max_bytes and len(self._segments) > 1:
+            oldest = next(iter(self._segments))
+            lost = self._segments[oldest][0]
+            if oldest == self._read_seq:
+                lost -= self._read_records
+                self._read_seq, self._read_offset, self._read_records = next(iter(list(self._segments)[1:])), 0, 0
+                self._save_cursor()
+            self.stats["evicted"] += lost
+            logger.warning(f"Spool over {self.max_bytes} bytes: evicted {lost} unsent batches (segment {oldest})")
+            self._delete_segment(oldest)
+
+    def _delete_segment(self, seq: int):
+        self._segments.pop(seq, None)
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+
+    def _total_bytes(self) -> int:
+        return sum(size for _, size in self._segments.values())
+
+    # --- Reading ---
+
+    def read(self, max_records: int = 100, max_events: Optional[int] = None) -> list:
+        """
+        Up to `max_records` unreplayed batches, oldest first, as
+        (position, events) pairs, stopping once they hold `max_events` events
+        (a batch that would go over is left for the next read). Nothing is
+        consumed until commit(position). Only the read position is taken under
+        the lock: the segments are read and decoded while appends go on.
+        """
+        with self._lock:
+            seq, offset, records = self._read_seq, self._read_offset, self._read_records
+            # Sizes as of now: anything appended later is left for the next read.
+            sizes = [(s, size) for s, (_, size) in self._segments.items() if s >= seq]
+        out, n_events = [], 0
+        for segment, size in sizes:
+            if segment != seq:
+                offset, records = 0, 0
+            try:
+                f = open(self._path(segment), "rb")
+            except FileNotFoundError:
+                continue  # evicted meanwhile; the cursor has moved past it
+            with f:
+                f.seek(offset)
+                while offset < size:
+                    if len(out) >= max_records or max_events and n_events >= max_events:
+                        return out
+                    payload = self._read_record(f)
+                    if payload is None:
+                        logger.error(f"Spool segment {segment}: corrupt record at byte {offset}; skipping segment")
+                        if out or not self._skip_corrupt(segment, records):
+                            return out  # hand over what is good; the next read skips the segment
+                        break
+                    events = json.loads(payload)
+                    if out and max_events and n_events + len(events) > max_events:
+                        return out
+                    offset = f.tell()
+                    records += 1
+                    out.append(((segment, offset, records), events))
+                    n_events += len(events)
+        return out
+
+    def _skip_corrupt(self, seq: int, records: int) -> bool:
+        """
+        Drops the rest of segment `seq`, corrupt after `records` good records.
+        Returns True if reading can go on with the next segment.
+        """
+        with self._lock:
+            if seq != self._read_seq:
+                return True  # evicted or skipped meanwhile
+            self.stats["corrupt"] += self._segments[seq][0] - records
+            if seq == self._write_seq:
+                return False
+            self._read_seq, self._read_offset, self._read_records = self._next_seq(seq), 0, 0
+            self._delete_segment(seq)
+            self._save_cursor()
+            return True
+
+    @staticmethod
+    def _read_record(f) -> Optional[bytes]:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return None
+        length, crc = HEADER.unpack(header)
+        if length > MAX_RECORD_BYTES:
+            return None
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return None
+        return payload
+
+    def _next_seq(self, seq: int) -> Optional[int]:
+        later = [s for s in self._segments if s > seq]
+        return later[0] if later else None
+
+    def commit(self, position: tuple):
+        """Marks everything up to `position` (from read()) as replayed."""
+        seq, offset, records = position
+        with self._lock:
+            if seq not in self._segments or (seq, offset) <= (self._read_seq, self._read_offset):
+                return  # evicted meanwhile, or already behind us
+            for old in [s for s in self._segments if s < seq]:
+                self._delete_segment(old)
+            self._read_seq, self._read_offset, self._read_records = seq, offset, records
+            if offset >= self._segments[seq][1] and seq != self._write_seq:
+                # Fully replayed and no longer written to.
+                self._read_seq, self._read_offset, self._read_records = self._next_seq(seq), 0, 0
+                self._delete_segment(seq)
+            self._save_cursor()
+
+    # --- Introspection ---
+
+    def depth(self) -> tuple:
+        """(batches, bytes) waiting to be replayed."""
+        with self._lock:
+            records = sum(r for seq, (r, _) in self._segments.items() if seq >= self._read_seq)
+            size = sum(b for seq, (_, b) in self._segments.items() if seq >= self._read_seq)
+            return records - self._read_records, size - self._read_offset
+
+    def metrics(self) -> dict:
+        batches, size = self.depth()
+        return {"depth_batches": batches, "depth_bytes": size, "segments": len(self._segments), **self.stats}
+
+    def close(self):
+        with self._lock:
+            self._maybe_fsync(force=self.fsync != "never")
+            self._writer.close()
+            if self._lock_file is not None:
+                self._lock_file.close()
+
+class SpoolReplayer:
+    """
+    Background thread draining a Spool through `send(events) -> bool`, which
+    returns False for transient failures (the batch stays spooled and the
+    replayer backs off) and True once the API has taken or permanently
+    refused it. Spooled batches are merged up to `batch_size` events per call
+    and paced to at most `rate` events/sec (None: as fast as the API takes them).
+    """
+
+    def __init__(self, spool: Spool, send: Callable[[list], bool], batch_size: int = 500,
+                 rate: Optional[float] = None, retry_base: float = 0.5, retry_cap: float = 30.0,
+                 idle_interval: float = 1.0):
+        self.spool = spool
+        self.send = send
+        self.batch_size = batch_size
+        self.rate = rate
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.idle_interval = idle_interval
+        self.stats = {"replayed_events": 0, "replayed_batches": 0, "failures": 0}
+        self._recent = collections.deque()  # (monotonic time, events) of the last 10s
+        self._next_send = 0.0
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def replay_rate(self) -> float:
+        """Events/sec replayed over the last 10 seconds."""
+        cutoff = time.monotonic() - 10
+        while self._recent and self._recent[0][0] < cutoff:
+            self._recent.popleft()
+        return sum(n for _, n in self._recent) / 10
+
+    def metrics(self) -> dict:
+        return {**self.spool.metrics(), **self.stats, "replay_rate": self.replay_rate()}
+
+    def _pace(self, n: int):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        if self._next_send > now:
+            self._stopping.wait(self._next_send - now)
+        self._next_send = max(now, self._next_send) + n / self.rate
+
+    def replay_once(self) -> Optional[bool]:
+        """
+        Sends one batch. Returns True if it was delivered, False on a
+        transient failure, None when the spool is empty.
+        """
+        records = self.spool.read(max_records=self.batch_size, max_events=self.batch_size)
+        if not records:
+            return None
+        events = [event for _, batch in records for event in batch]
+        position = records[-1][0]
+        self._pace(len(events))
+        if not self.send(events):
+            self.stats["failures"] += 1
+            return False
+        self.spool.commit(position)
+        self.stats["replayed_events"] += len(events)
+        self.stats["replayed_batches"] += 1
+        self._recent.append((time.monotonic(), len(events)))
+        return True
+
+    def notify(self):
+        """Wakes the replayer (e.g. right after something was spooled)."""
+        self._wake.set()
+
+    def _run(self):
+        delay = self.retry_base
+        while not self._stopping.is_set():
+            try:
+                result = self.replay_once()
+            except Exception as e:  # keep the thread alive whatever send() raises
+                logger.error(f"Spool replay failed: {e}")
+                result = False
+            if result:
+                delay = self.retry_base
+                continue
+            if result is None:
+                self._wake.wait(self.idle_interval)
+                self._wake.clear()
+            else:
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.retry_cap)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="securify-spool-replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
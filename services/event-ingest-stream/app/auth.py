@@ -3,6 +3,8 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from jose import JWTError, jwt
 from pydantic import BaseModel
+from .metrics import JWT_CACHE_HITS, JWT_CACHE_MISSES
+from .token_cache import TokenCache
 
 
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
@@ -14,6 +16,28 @@ ALGORITHM = "HS256"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Shippers reuse a handful of long-lived tokens, so verified payloads are cached
+# to skip the HS256 check and scope parsing. JWT_CACHE_SIZE=0 disables the cache.
+token_cache = TokenCache(
+    max_size=int(os.environ.get("JWT_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("JWT_CACHE_TTL", "300")),
+)
+
+def decode_token(token: str) -> tuple[dict, frozenset]:
+    """
+    Returns (payload, scopes) for a token, from the cache when possible.
+    Raises JWTError if the token is invalid or expired.
+    """
+    cached = token_cache.get(token)
+    if cached is not None:
+        JWT_CACHE_HITS.inc()
+        return cached
+    JWT_CACHE_MISSES.inc()
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    scopes = frozenset(payload.get("scope", "").split())
+    token_cache.put(token, payload, scopes)
+    return payload, scopes
+
 async def verify_jwt(security_scopes: SecurityScopes, token: str = Depends(oauth2_scheme)) -> dict:
     """
     Verifies JWT and enforces scopes.
@@ -30,12 +54,11 @@ async def verify_jwt(security_scopes: SecurityScopes, token: str = Depends(oauth
     )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload, token_scopes = decode_token(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     
-        token_scopes = payload.get("scope", "").split()
         for required_scope in security_scopes.scopes:
             if required_scope not in token_scopes:
                 raise HTTPException(
@@ -0,0 +1,86 @@
+import json
+import zlib
+from pydantic import ValidationError
+from .models import IngestEventAdapter
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+class BatchFormatError(ValueError):
+    """Raised when a batch body cannot be split into individual events."""
+
+class BatchTooLargeError(BatchFormatError):
+    """Raised when a batch holds more events than the configured limit."""
+
+def decode_body(body: bytes, content_encoding: str = "", max_bytes: int = None) -> bytes:
+    """
+    Undoes a gzip/deflate Content-Encoding. Decompression stops at `max_bytes`
+    so a small compressed body cannot expand into an unbounded one.
+    """
+    encoding = content_encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return body
+    if encoding not in ("gzip", "deflate"):
+        raise BatchFormatError(f"Unsupported Content-Encoding: {content_encoding}")
+    # wbits: 16 + MAX_WBITS expects a gzip header, MAX_WBITS a zlib one.
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_bytes or 0)
+    except zlib.error as e:
+        raise BatchFormatError(f"Invalid {encoding} body: {e}")
+    if decompressor.unconsumed_tail:
+        raise BatchTooLargeError(f"Decompressed batch exceeds {max_bytes} bytes")
+    if not decompressor.eof:
+        raise BatchFormatError(f"Truncated {encoding} body")
+    return data
+
+def _is_ndjson(body: bytes, content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in NDJSON_CONTENT_TYPES:
+        return True
+    if media_type == "application/json":
+        return False
+    # Fall back to sniffing: a JSON array always starts with '['.
+    return not body.lstrip().startswith(b"[")
+
+def _rejection(index: int, error: ValidationError) -> dict:
+    # e.json() guarantees the error context is serialisable in the response.
+    return {"index": index, "errors": json.loads(error.json(include_url=False, include_input=False))}
+
+def validate_batch(body: bytes, content_type: str = "", max_events: int = None) -> tuple[list, list]:
+    """
+    Splits a JSON array or NDJSON body into events and validates them in one pass.
+    Returns (accepted_events, rejected) where each rejected entry carries the
+    index of the offending event and its validation errors.
+    """
+    accepted = []
+    rejected = []
+
+    if _is_ndjson(body, content_type):
+        index = 0
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            if max_events is not None and index >= max_events:
+                raise BatchTooLargeError(f"Batch exceeds {max_events} events")
+            try:
+                accepted.append(IngestEventAdapter.validate_json(line))
+            except ValidationError as e:
+                rejected.append(_rejection(index, e))
+            index += 1
+        return accepted, rejected
+
+    try:
+        items = json.loads(body)
+    except ValueError as e:
+        raise BatchFormatError(f"Body is not a valid JSON array: {e}")
+    if not isinstance(items, list):
+        raise BatchFormatError("Body must be a JSON array of events or NDJSON.")
+    if max_events is not None and len(items) > max_events:
+        raise BatchTooLargeError(f"Batch exceeds {max_events} events")
+
+    for index, item in enumerate(items):
+        try:
+            accepted.append(IngestEventAdapter.validate_python(item))
+        except ValidationError as e:
+            rejected.append(_rejection(index, e))
+    return accepted, rejected
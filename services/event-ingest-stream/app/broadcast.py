@@ -0,0 +1,91 @@
+import asyncio
+import json
+import traceback
+from .metrics import LIVE_DROPPED, LIVE_SUBSCRIBERS
+
+# Redis pub/sub channel carrying newly logged anomalies to every API replica.
+LIVE_CHANNEL = "anomalies:live"
+
+class AnomalyBroadcaster:
+    """
+    Fans newly logged anomalies out to live (SSE) subscribers.
+
+    Every replica publishes the anomalies it logs to one Redis pub/sub
+    channel and holds a single subscription to it, which it copies into a
+    bounded in-memory queue per connected client. A client that falls more
+    than `queue_size` messages behind loses the oldest ones rather than
+    slowing down the others.
+    """
+
+    def __init__(self, r, channel: str = LIVE_CHANNEL, queue_size: int = 256):
+        self.r = r
+        self.channel = channel
+        self.queue_size = queue_size
+        self._subscribers = set()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        LIVE_SUBSCRIBERS.inc()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.discard(queue)
+            LIVE_SUBSCRIBERS.dec()
+
+    def deliver(self, message: bytes):
+        """Copies one published message to every local subscriber."""
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                LIVE_DROPPED.inc()
+            queue.put_nowait(message)
+
+    async def publish(self, anomalies: list):
+        """
+        Publishes a batch of AnomalyReports as one JSON array. Failures are
+        logged and swallowed: the anomalies are already persisted.
+        """
+        payload = json.dumps([a.model_dump(mode="json") for a in anomalies])
+        try:
+            await self.r.publish(self.channel, payload)
+        except Exception as e:
+            print(f"Failed to publish {len(anomalies)} live anomalies: {e}")
+
+    async def run(self):
+        """Relays the Redis channel to local subscribers, resubscribing on errors."""
+        while True:
+            pubsub = self.r.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.deliver(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Live anomaly subscription failed, retrying in 1s: {e}")
+                traceback.print_exc()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+async def sse_events(queue: asyncio.Queue, keepalive: float = 15):
+    """
+    Server-Sent Events framing for a subscriber queue: one `data:` event per
+    published batch, and a comment line every `keepalive` seconds so proxies
+    don't time the connection out.
+    """
+    while True:
+        try:
+            message = await asyncio.wait_for(queue.get(), timeout=keepalive)
+        except asyncio.TimeoutError:
+            yield b": keepalive\n\n"
+            continue
+        if isinstance(message, str):
+            message = message.encode()
+        yield b"data: " + message + b"\n\n"
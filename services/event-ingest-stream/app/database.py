@@ -1,7 +1,11 @@
 import redis.asyncio as redis
 import asyncpg
 import os
+import base64
+import datetime
 import json
+import time
+from . import partitions
 from .models import AnomalyReport, IngestEvent
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
@@ -31,15 +35,72 @@ async def get_postgres_conn(pool: asyncpg.Pool):
     async with pool.acquire() as connection:
         yield connection
 
+async def init_schema(conn: asyncpg.Connection):
+    """
+    Creates the partitioned anomalies audit table and its query indexes if they
+    do not exist yet, migrating a legacy unpartitioned table in place.
+    Partitions themselves are managed by partitions.PartitionManager.
+    """
+    async with conn.transaction():
+        # Replicas starting together must not race on the migration.
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", partitions.SCHEMA_LOCK_ID)
+        relkind = await conn.fetchval(
+            "SELECT relkind::text FROM pg_class WHERE oid = to_regclass('anomalies')")
+        if relkind == "r":
+            await partitions.migrate_legacy_table(conn)
+        else:
+            await partitions.create_partitioned_table(conn)
+        await _create_indexes(conn)
+
+async def _create_indexes(conn: asyncpg.Connection):
+    # Keyset pagination walks (timestamp, id) newest first; the filtered
+    # variants lead with the filter column. BRIN keeps wide time-range scans
+    # cheap on an append-mostly table for a few pages of index.
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS anomalies_ts_id_idx ON anomalies (timestamp DESC, id DESC);
+        CREATE INDEX IF NOT EXISTS anomalies_ip_ts_idx ON anomalies ((source_ip::inet), timestamp DESC, id DESC);
+        CREATE INDEX IF NOT EXISTS anomalies_type_ts_idx ON anomalies (event_type, timestamp DESC, id DESC);
+        CREATE INDEX IF NOT EXISTS anomalies_ts_brin_idx ON anomalies USING brin (timestamp);
+    """)
+
 # --- Core Logic ---
 
+STREAM_NAME = "events:raw"
+# Write-time cap on the stream, trimmed approximately (whole radix-tree nodes) on
+# every XADD. STREAM_MAX_AGE_SECONDS trims by entry age instead of length when set;
+# 0 disables either. This is a hard safety limit: it can drop entries no consumer
+# group has read yet, so keep it well above the normal backlog and let
+# retention.StreamTrimmer reclaim acked entries.
+STREAM_MAXLEN = int(os.environ.get("STREAM_MAXLEN", "1000000"))
+STREAM_MAX_AGE_SECONDS = int(os.environ.get("STREAM_MAX_AGE_SECONDS", "0"))
+
+def stream_trim_args(now: float = None) -> dict:
+    """XADD keyword arguments for the configured write-time trimming."""
+    if STREAM_MAX_AGE_SECONDS > 0:
+        now = time.time() if now is None else now
+        return {"minid": f"{int((now - STREAM_MAX_AGE_SECONDS) * 1000)}-0", "approximate": True}
+    if STREAM_MAXLEN > 0:
+        return {"maxlen": STREAM_MAXLEN, "approximate": True}
+    return {}
+
 async def add_event_to_stream(event: IngestEvent, r: redis.Redis):
     """
     Asynchronously adds a validated event to the Redis Stream.
     """
     event_data = event.model_dump_json()
     # Using 'event:raw' as the stream name
-    await r.xadd("events:raw", {"data": event_data})
+    await r.xadd(STREAM_NAME, {"data": event_data}, **stream_trim_args())
+
+async def add_events_to_stream(events: list, r: redis.Redis):
+    """
+    Adds a batch of validated events to the Redis Stream.
+    All XADDs are pipelined so the whole batch costs a single round trip.
+    """
+    trim_args = stream_trim_args()
+    async with r.pipeline(transaction=False) as pipe:
+        for event in events:
+            pipe.xadd(STREAM_NAME, {"data": event.model_dump_json()}, **trim_args)
+        await pipe.execute()
 
 async def log_anomaly_to_db(anomaly: AnomalyReport, conn: asyncpg.Connection):
     """
@@ -58,9 +119,138 @@ async def log_anomaly_to_db(anomaly: AnomalyReport, conn: asyncpg.Connection):
         json.dumps(anomaly.details),
     )
 
+ANOMALY_COLUMNS = ("source_ip", "score", "event_type", "timestamp", "details")
+
+async def log_anomalies_to_db(anomalies: list, conn: asyncpg.Connection):
+    """
+    Logs many anomalies at once using a binary COPY inside one transaction,
+    so a whole batch costs one round trip and one commit.
+    """
+    records = [
+        (str(a.source_ip), a.score, a.event_type, a.timestamp, json.dumps(a.details))
+        for a in anomalies
+    ]
+    async with conn.transaction():
+        await conn.copy_records_to_table("anomalies", records=records, columns=ANOMALY_COLUMNS)
+
+# Columns a client may request through ?fields=
+ANOMALY_FIELDS = ("id",) + ANOMALY_COLUMNS
+
+def encode_cursor(timestamp: datetime.datetime, row_id: int) -> str:
+    """Opaque keyset cursor: the (timestamp, id) of the last row on a page."""
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor. Raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def build_anomaly_query(limit: int, cursor: tuple = None, since=None, until=None,
+                        source_ip: str = None, event_type: str = None,
+                        min_score: float = None, fields=None) -> tuple:
+    """
+    Builds the parameterized keyset query for query_anomalies. Returns
+    (sql, args). id and timestamp are always selected so the next cursor
+    can be built; `fields` must already be validated against ANOMALY_FIELDS.
+    """
+    columns = list(dict.fromkeys(["id", "timestamp", *(fields or ANOMALY_FIELDS)]))
+    where, args = [], []
+
+    def param(value):
+        args.append(value)
+        return f"${len(args)}"
+
+    if cursor is not None:
+        where.append(f"(timestamp, id) < ({param(cursor[0])}, {param(cursor[1])})")
+    if since is not None:
+        where.append(f"timestamp >= {param(since)}")
+    if until is not None:
+        where.append(f"timestamp < {param(until)}")
+    if source_ip is not None:
+        # A bare address is a /32 network, so one operator covers both forms.
+        where.append(f"source_ip::inet <<= {param(source_ip)}::inet")
+    if event_type is not None:
+        where.append(f"event_type = {param(event_type)}")
+    if min_score is not None:
+        where.append(f"score >= {param(min_score)}")
+
+    sql = f"SELECT {', '.join(columns)} FROM anomalies"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # One extra row tells us whether another page exists.
+    sql += f" ORDER BY timestamp DESC, id DESC LIMIT {param(limit + 1)}"
+    return sql, args
+
+async def query_anomalies(conn: asyncpg.Connection, limit: int = 100, cursor: str = None,
+                          fields=None, **filters) -> tuple:
+    """
+    Fetches one page of anomalies, newest first, using keyset pagination on
+    (timestamp, id). Returns (rows, next_cursor); next_cursor is None on the
+    last page. Only the requested `fields` are returned.
+    """
+    sql, args = build_anomaly_query(
+        limit, decode_cursor(cursor) if cursor else None, fields=fields, **filters)
+    rows = [dict(row) for row in await conn.fetch(sql, *args)]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+    if fields:
+        rows = [{name: row[name] for name in fields} for row in rows]
+    return rows, next_cursor
+
 async def fetch_anomalies_from_db(conn: asyncpg.Connection):
     """
     Fetches the latest anomalies for the Streamlit dashboard.
     """
-    rows = await conn.fetch("SELECT * FROM anomalies ORDER BY timestamp DESC LIMIT 100")
-    return [dict(row) for row in rows]
\ No newline at end of file
+    rows, _ = await query_anomalies(conn, limit=100)
+    return rows
+
+# --- Dashboard aggregates ---
+# Computed in SQL over a [since, until) window so the dashboard gets accurate
+# numbers over the whole table in a few rows, and partition pruning applies.
+
+async def fetch_top_ips(conn: asyncpg.Connection, since, until, limit: int = 10,
+                        order_by: str = "count"):
+    """Source IPs with the most anomalies (or the highest score) in the window."""
+    order = "max_score DESC, count DESC" if order_by == "max_score" else "count DESC, max_score DESC"
+    rows = await conn.fetch(f"""
+        SELECT source_ip, count(*) AS count, max(score) AS max_score, max(timestamp) AS last_seen
+        FROM anomalies
+        WHERE timestamp >= $1 AND timestamp < $2
+        GROUP BY source_ip
+        ORDER BY {order}
+        LIMIT $3
+    """, since, until, limit)
+    return [dict(row) for row in rows]
+
+async def fetch_anomaly_timeseries(conn: asyncpg.Connection, since, until, bucket_seconds: int):
+    """Anomaly count and score percentiles per time bucket (empty buckets omitted)."""
+    rows = await conn.fetch("""
+        SELECT date_bin(make_interval(secs => $3), timestamp, $1) AS bucket,
+               count(*) AS count,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY score) AS p50_score,
+               percentile_cont(0.95) WITHIN GROUP (ORDER BY score) AS p95_score,
+               max(score) AS max_score
+        FROM anomalies
+        WHERE timestamp >= $1 AND timestamp < $2
+        GROUP BY bucket
+        ORDER BY bucket
+    """, since, until, bucket_seconds)
+    return [dict(row) for row in rows]
+
+async def fetch_event_type_totals(conn: asyncpg.Connection, since, until):
+    """Anomaly count and mean score per event_type in the window."""
+    rows = await conn.fetch("""
+        SELECT event_type, count(*) AS count, avg(score) AS avg_score
+        FROM anomalies
+        WHERE timestamp >= $1 AND timestamp < $2
+        GROUP BY event_type
+        ORDER BY count DESC
+    """, since, until)
+    return [dict(row) for row in rows]
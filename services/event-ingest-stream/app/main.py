@@ -1,76 +1,23 @@
 import asyncio
+import datetime
+import ipaddress
+import os
+from typing import Literal
 import asyncpg
 import redis.asyncio as redis
 from functools import lru_cache
 from prometheus_fastapi_instrumentator import Instrumentator
-from fastapi import FastAPI, Depends, HTTPException, status, Security
+from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status, Security
 
-from . import models, auth, database
+from . import models, auth, database, batch, broadcast, partitions, retention
 
-app = FastAPI(title="Securify AI - Ingest & Core API")
-
-Instrumentator().instrument(app).expose(app)
-
-# Use a function for dependency injection of the pool
-# This allows us to easily get the pool in our endpoints
-@lru_cache()
-def get_app_state():
-    return app.state
-
-# Updated dependency generators
-async def get_redis_dependency():
-    yield get_app_state().redis
-
-async def get_postgres_conn_dependency():
-    pool = get_app_state().postgres_pool
-    if pool is None:
-        raise HTTPException(status_code=503, detail="Database pool not initialized")
-    async with pool.acquire() as connection:
-        yield connection
-
-@app.on_event("startup")
-async def startup():
-    """
-    On startup, connect to databases and create pools.
-    """
-    app.state.redis = await database.get_redis()
-
-    # Create connection pool instead of single connection
-    for _ in range(10):
-        try:
-            app.state.postgres_pool = await database.create_postgres_pool()
-        
-            # Use the pool to get a connection and create table
-            async with app.state.postgres_pool.acquire() as conn:
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS anomalies (
-                        id SERIAL PRIMARY KEY,
-                        source_ip VARCHAR(100),
-                        score FLOAT,
-                        event_type VARCHAR(100),
-                        timestamp TIMESTAMPTZ,
-                        details JSONB
-                    );
-                """)
-            print("Connected to PostgreSQL and 'anomalies' table is ready.")
-            break
-        except Exception as e:
-            print(f"Postgres not ready yet, retrying... ({e})")
-            await asyncio.sleep(2)
-            
-@app.on_event("shutdown")
-async def shutdown():
-    await app.state.redis.close()
-    if hasattr(app.state, "postgres_pool"):
-        await app.state.postgres_pool.close()
-import asyncio
-import asyncpg
-import redis.asyncio as redis
-from functools import lru_cache
-from prometheus_fastapi_instrumentator import Instrumentator
-from fastapi import FastAPI, Depends, HTTPException, status, Security
-
-from . import models, auth, database
+# Upper bound on events accepted by a single /ingest/batch request.
+MAX_BATCH_EVENTS = int(os.environ.get("MAX_BATCH_EVENTS", "10000"))
+# Upper bound on a batch body after gzip/deflate decoding.
+MAX_BATCH_BYTES = int(os.environ.get("MAX_BATCH_BYTES", str(32 * 1024 * 1024)))
+# Upper bound on ?limit= for GET /api/v1/anomalies.
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "1000"))
 
 app = FastAPI(title="Securify AI - Ingest & Core API")
 
@@ -99,6 +46,14 @@ async def startup():
     On startup, connect to databases and create pools.
     """
     app.state.redis = await database.get_redis()
+    # Drop stream entries once every consumer group has acked them
+    app.state.trimmer_task = None
+    if retention.STREAM_TRIM_INTERVAL > 0:
+        trimmer = retention.StreamTrimmer(app.state.redis, database.STREAM_NAME)
+        app.state.trimmer_task = asyncio.create_task(trimmer.run())
+    # One pub/sub subscription per replica feeds every live (SSE) client
+    app.state.broadcaster = broadcast.AnomalyBroadcaster(app.state.redis)
+    app.state.broadcast_task = asyncio.create_task(app.state.broadcaster.run())
 
     # Create connection pool instead of single connection
     for _ in range(10):
@@ -107,24 +62,25 @@ async def startup():
         
             # Use the pool to get a connection and create table
             async with app.state.postgres_pool.acquire() as conn:
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS anomalies (
-                        id SERIAL PRIMARY KEY,
-                        source_ip VARCHAR(100),
-                        score FLOAT,
-                        event_type VARCHAR(100),
-                        timestamp TIMESTAMPTZ,
-                        details JSONB
-                    );
-                """)
+                await database.init_schema(conn)
             print("Connected to PostgreSQL and 'anomalies' table is ready.")
             break
         except Exception as e:
             print(f"Postgres not ready yet, retrying... ({e})")
             await asyncio.sleep(2)
+
+    # Roll anomalies partitions forward and expire old ones
+    app.state.partition_task = None
+    if partitions.MAINTENANCE_INTERVAL > 0 and getattr(app.state, "postgres_pool", None) is not None:
+        manager = partitions.PartitionManager(app.state.postgres_pool)
+        app.state.partition_task = asyncio.create_task(manager.run())
             
 @app.on_event("shutdown")
 async def shutdown():
+    for task_name in ("trimmer_task", "partition_task", "broadcast_task"):
+        task = getattr(app.state, task_name, None)
+        if task is not None:
+            task.cancel()
     await app.state.redis.close()
     if hasattr(app.state, "postgres_pool"):
         await app.state.postgres_pool.close()
@@ -166,6 +122,48 @@ async def ingest_event(
     await database.add_event_to_stream(event, r)
     return {"status": "event accepted"}
 
+@app.post(
+    "/ingest/batch",
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["Ingestion"],
+    dependencies=[Security(auth.verify_jwt, scopes=["ingest"])]
+)
+async def ingest_batch(
+    request: Request,
+    r: redis.Redis = Depends(lambda: app.state.redis)
+):
+    """
+    Ingests many security events in one request.
+    Accepts a JSON array or NDJSON (application/x-ndjson) body, optionally
+    gzip/deflate compressed (Content-Encoding). Valid events are
+    written to the stream in a single pipelined burst; invalid ones are reported
+    back by index. Requires a valid M2M JWT with 'ingest' scope.
+    """
+    body = await request.body()
+    try:
+        body = batch.decode_body(body, request.headers.get("content-encoding", ""), MAX_BATCH_BYTES)
+        accepted, rejected = batch.validate_batch(
+            body, request.headers.get("content-type", ""), max_events=MAX_BATCH_EVENTS
+        )
+    except batch.BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except batch.BatchFormatError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if not accepted and not rejected:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Batch contains no events")
+    if not accepted:
+        raise HTTPException(status_code=422, detail=rejected)
+
+    await database.add_events_to_stream(accepted, r)
+    return {"status": "batch accepted", "accepted": len(accepted), "rejected": rejected}
+
+async def _publish_live(anomalies: list):
+    """Pushes freshly logged anomalies to live subscribers on every replica."""
+    broadcaster = getattr(app.state, "broadcaster", None)
+    if broadcaster is not None:
+        await broadcaster.publish(anomalies)
+
 # Phase 2: Anomaly Reporting Endpoint
 @app.post(
     "/api/v1/anomaly",
@@ -183,8 +181,31 @@ async def report_anomaly(
     Requires a valid JWT with 'report_anomaly' scope.
     """
     await database.log_anomaly_to_db(anomaly, conn)
+    await _publish_live([anomaly])
     return {"status": "anomaly logged"}
 
+@app.post(
+    "/api/v1/anomalies/bulk",
+    status_code=status.HTTP_201_CREATED,
+    tags=["Anomaly"],
+    dependencies=[Security(auth.verify_jwt, scopes=["report_anomaly"])]
+)
+async def report_anomalies_bulk(
+    anomalies: list[models.AnomalyReport],
+    conn: asyncpg.Connection = Depends(get_postgres_conn_dependency)
+):
+    """
+    Bulk variant of /api/v1/anomaly: the ML service reports a whole batch
+    in one call, written in a single transaction.
+    Requires a valid JWT with 'report_anomaly' scope.
+    """
+    if len(anomalies) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_EVENTS} anomalies")
+    if anomalies:
+        await database.log_anomalies_to_db(anomalies, conn)
+        await _publish_live(anomalies)
+    return {"status": "anomalies logged", "count": len(anomalies)}
+
 # Phase 3: Dashboard Data Endpoint
 @app.get(
     "/api/v1/anomalies",
@@ -193,11 +214,146 @@ async def report_anomaly(
     dependencies=[Security(auth.verify_jwt, scopes=["dashboard:read"])]
 )
 async def get_anomalies(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="X-Next-Cursor value from the previous page"),
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    source_ip: str | None = Query(None, description="Address or CIDR block, e.g. 10.0.0.0/8"),
+    event_type: str | None = None,
+    min_score: float | None = None,
+    fields: str | None = Query(None, description="Comma-separated subset of columns to return"),
     conn: asyncpg.Connection = Depends(get_postgres_conn_dependency)
 ):
     """
     Secure endpoint for the Streamlit dashboard to fetch anomalies.
+    Returns one page, newest first; when more rows match, the cursor for the
+    next page is sent in the X-Next-Cursor header.
+    Requires a valid user JWT with 'dashboard:read' scope.
+    """
+    if source_ip is not None:
+        try:
+            source_ip = str(ipaddress.ip_network(source_ip, strict=False))
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"Invalid IP address or CIDR: {source_ip}")
+    field_list = None
+    if fields:
+        field_list = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(field_list) - set(database.ANOMALY_FIELDS))
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    try:
+        anomalies, next_cursor = await database.query_anomalies(
+            conn, limit=limit, cursor=cursor, fields=field_list,
+            since=since, until=until, source_ip=source_ip,
+            event_type=event_type, min_score=min_score,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return anomalies
+
+@app.get(
+    "/api/v1/anomalies/stream",
+    tags=["Dashboard"],
+    dependencies=[Security(auth.verify_jwt, scopes=["dashboard:read"])]
+)
+async def stream_anomalies(request: Request):
+    """
+    Server-Sent Events stream of anomalies as they are logged. Each event's
+    data is a JSON array holding one reported batch.
+    Requires a valid user JWT with 'dashboard:read' scope.
+    """
+    broadcaster = getattr(app.state, "broadcaster", None)
+    if broadcaster is None:
+        raise HTTPException(status_code=503, detail="Live stream not available")
+    queue = broadcaster.subscribe()
+
+    async def events():
+        try:
+            async for chunk in broadcast.sse_events(queue):
+                if await request.is_disconnected():
+                    break
+                yield chunk
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Dashboard aggregates: small, accurate payloads computed in SQL over a time window.
+STATS_DEFAULT_WINDOW = datetime.timedelta(hours=24)
+# Upper bound on buckets per /stats/timeseries response.
+MAX_TIMESERIES_BUCKETS = 10000
+
+def _stats_window(since: datetime.datetime | None, until: datetime.datetime | None) -> tuple:
+    """Resolves the [since, until) window, defaulting to the last 24 hours (naive times are UTC)."""
+    since, until = (
+        t.replace(tzinfo=datetime.timezone.utc) if t is not None and t.tzinfo is None else t
+        for t in (since, until)
+    )
+    until = until or datetime.datetime.now(datetime.timezone.utc)
+    since = since or until - STATS_DEFAULT_WINDOW
+    if since >= until:
+        raise HTTPException(status_code=422, detail="'since' must be before 'until'")
+    return since, until
+
+@app.get(
+    "/api/v1/anomalies/stats/top-ips",
+    tags=["Dashboard"],
+    dependencies=[Security(auth.verify_jwt, scopes=["dashboard:read"])]
+)
+async def get_top_ips(
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    limit: int = Query(10, ge=1, le=1000),
+    order_by: Literal["count", "max_score"] = "count",
+    conn: asyncpg.Connection = Depends(get_postgres_conn_dependency)
+):
+    """
+    Top source IPs by anomaly count (or max score) in the window.
+    Requires a valid user JWT with 'dashboard:read' scope.
+    """
+    since, until = _stats_window(since, until)
+    return await database.fetch_top_ips(conn, since, until, limit=limit, order_by=order_by)
+
+@app.get(
+    "/api/v1/anomalies/stats/timeseries",
+    tags=["Dashboard"],
+    dependencies=[Security(auth.verify_jwt, scopes=["dashboard:read"])]
+)
+async def get_anomaly_timeseries(
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    bucket_seconds: int = Query(3600, ge=60),
+    conn: asyncpg.Connection = Depends(get_postgres_conn_dependency)
+):
+    """
+    Anomaly counts and score percentiles (p50/p95/max) per time bucket.
+    Requires a valid user JWT with 'dashboard:read' scope.
+    """
+    since, until = _stats_window(since, until)
+    if (until - since).total_seconds() / bucket_seconds > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=422, detail=f"Window spans more than {MAX_TIMESERIES_BUCKETS} buckets")
+    return await database.fetch_anomaly_timeseries(conn, since, until, bucket_seconds)
+
+@app.get(
+    "/api/v1/anomalies/stats/event-types",
+    tags=["Dashboard"],
+    dependencies=[Security(auth.verify_jwt, scopes=["dashboard:read"])]
+)
+async def get_event_type_totals(
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    conn: asyncpg.Connection = Depends(get_postgres_conn_dependency)
+):
+    """
+    Anomaly totals per event type in the window.
     Requires a valid user JWT with 'dashboard:read' scope.
     """
-    anomalies = await database.fetch_anomalies_from_db(conn)
-    return anomalies
\ No newline at end of file
+    since, until = _stats_window(since, until)
+    return await database.fetch_event_type_totals(conn, since, until)
@@ -0,0 +1,36 @@
+from prometheus_client import Counter, Gauge
+
+# Exposed on /metrics alongside the HTTP metrics from prometheus-fastapi-instrumentator.
+# Hit rate: rate(securify_jwt_cache_hits_total) / (hits + misses).
+JWT_CACHE_HITS = Counter(
+    "securify_jwt_cache_hits_total",
+    "Verified JWTs served from the token cache without re-decoding.",
+)
+JWT_CACHE_MISSES = Counter(
+    "securify_jwt_cache_misses_total",
+    "JWTs that had to be decoded and signature-verified.",
+)
+
+# Stream retention (retention.StreamTrimmer).
+STREAM_LENGTH = Gauge(
+    "securify_stream_length",
+    "Entries currently held in the events stream.",
+)
+STREAM_TRIMMED = Counter(
+    "securify_stream_trimmed_total",
+    "Acked entries removed from the events stream by the background trimmer.",
+)
+REDIS_MEMORY_BYTES = Gauge(
+    "securify_redis_used_memory_bytes",
+    "Redis used_memory as reported by INFO memory.",
+)
+
+# Live anomaly push (broadcast.AnomalyBroadcaster).
+LIVE_SUBSCRIBERS = Gauge(
+    "securify_live_subscribers",
+    "Clients connected to the live anomaly stream on this replica.",
+)
+LIVE_DROPPED = Counter(
+    "securify_live_dropped_total",
+    "Live anomaly messages dropped because a subscriber fell too far behind.",
+)
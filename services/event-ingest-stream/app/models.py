@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Literal, Union
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Annotated, Literal, Union
 import datetime
 from ipaddress import IPv4Address 
 
@@ -24,6 +24,10 @@ class FileChangeEvent(SecurityEvent):
 # Union type allows FastAPI to validate against *any* of these models
 IngestEvent = Union[LoginEvent, FileChangeEvent]
 
+# Discriminated on event_type so batch validation picks the right model directly
+# instead of trying each member of the union in turn.
+IngestEventAdapter = TypeAdapter(Annotated[IngestEvent, Field(discriminator="event_type")])
+
 class AnomalyReport(BaseModel):
     """Schema for the ML service to report anomalies."""
     source_ip: IPv4Address 
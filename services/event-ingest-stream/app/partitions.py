@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+import os
+import re
+import traceback
+import asyncpg
+
+# Width of each anomalies partition: "day" or "week" (weeks start on Monday, UTC).
+PARTITION_INTERVAL = os.environ.get("ANOMALY_PARTITION_INTERVAL", "day")
+# Partitions created ahead of the current one, so inserts never hit the default partition.
+PARTITIONS_AHEAD = int(os.environ.get("ANOMALY_PARTITIONS_AHEAD", "7"))
+# Partitions whose whole range is older than this are dropped (or detached); 0 keeps everything.
+RETENTION_DAYS = int(os.environ.get("ANOMALY_RETENTION_DAYS", "90"))
+# "drop" deletes expired partitions; "detach" leaves them as standalone tables for archiving.
+RETENTION_ACTION = os.environ.get("ANOMALY_RETENTION_ACTION", "drop")
+# Seconds between partition maintenance passes; 0 disables the manager.
+MAINTENANCE_INTERVAL = float(os.environ.get("ANOMALY_PARTITION_CHECK_INTERVAL", "3600"))
+
+# Serializes schema changes to the anomalies table across ingest replicas.
+SCHEMA_LOCK_ID = 0x5EC0A1
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+def partition_start(day: datetime.date, interval: str = PARTITION_INTERVAL) -> datetime.date:
+    """First day of the partition that contains `day`."""
+    if interval == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if interval == "day":
+        return day
+    raise ValueError(f"Unsupported partition interval: {interval}")
+
+def partition_step(interval: str = PARTITION_INTERVAL) -> datetime.timedelta:
+    return datetime.timedelta(weeks=1) if interval == "week" else datetime.timedelta(days=1)
+
+def partition_name(start: datetime.date) -> str:
+    return f"anomalies_p{start:%Y%m%d}"
+
+def _literal(day: datetime.date) -> str:
+    # DDL bounds can't be bind parameters; dates only ever come from this module.
+    return f"'{day.isoformat()} 00:00:00+00'"
+
+def upper_bound(partition_bound: str) -> datetime.datetime:
+    """Parses the TO (...) bound out of pg_get_expr(relpartbound)."""
+    match = _UPPER_BOUND.search(partition_bound)
+    if match is None:
+        raise ValueError(f"Not a bounded range partition: {partition_bound}")
+    return datetime.datetime.fromisoformat(match.group(1))
+
+async def create_partition(conn: asyncpg.Connection, start: datetime.date,
+                           interval: str = PARTITION_INTERVAL) -> bool:
+    """
+    Creates the partition starting at `start` unless it exists. Rows that
+    already landed in the default partition for that range are moved into it,
+    since Postgres refuses to add a partition that would overlap them.
+    Returns True if a partition was created.
+    """
+    name = partition_name(start)
+    end = start + partition_step(interval)
+    async with conn.transaction():
+        if await conn.fetchval("SELECT to_regclass($1)", name) is not None:
+            return False
+        await conn.execute(f"""
+            CREATE TABLE {name} (LIKE anomalies INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+            WITH moved AS (
+                DELETE FROM anomalies_default
+                WHERE timestamp >= {_literal(start)} AND timestamp < {_literal(end)}
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved;
+            ALTER TABLE anomalies ATTACH PARTITION {name}
+                FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)});
+        """)
+    return True
+
+async def ensure_partitions(conn: asyncpg.Connection, first: datetime.date, last: datetime.date,
+                            interval: str = PARTITION_INTERVAL) -> list:
+    """Creates every partition covering first..last (inclusive). Returns the new names."""
+    created = []
+    start = partition_start(first, interval)
+    while start <= last:
+        if await create_partition(conn, start, interval):
+            created.append(partition_name(start))
+        start += partition_step(interval)
+    return created
+
+async def expire_partitions(conn: asyncpg.Connection, cutoff: datetime.datetime,
+                            action: str = RETENTION_ACTION) -> list:
+    """
+    Drops (or detaches) partitions whose whole range ends at or before
+    `cutoff`. The default partition is never touched. Returns their names.
+    """
+    rows = await conn.fetch("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'anomalies'::regclass
+    """)
+    expired = []
+    for row in rows:
+        if row["bound"] == "DEFAULT" or upper_bound(row["bound"]) > cutoff:
+            continue
+        if action == "detach":
+            await conn.execute(f"ALTER TABLE anomalies DETACH PARTITION {row['relname']}")
+        else:
+            await conn.execute(f"DROP TABLE {row['relname']}")
+        expired.append(row["relname"])
+    return sorted(expired)
+
+async def migrate_legacy_table(conn: asyncpg.Connection, interval: str = PARTITION_INTERVAL):
+    """
+    One-time conversion of a plain (pre-partitioning) anomalies table: it is
+    renamed, the partitioned table is created in its place, the partitions
+    its rows need are created, and the rows copied over. Must run inside
+    init_schema's transaction.
+    """
+    print("Migrating 'anomalies' to a partitioned table...")
+    await conn.execute("ALTER TABLE anomalies RENAME TO anomalies_legacy")
+    await conn.execute("ALTER INDEX IF EXISTS anomalies_pkey RENAME TO anomalies_legacy_pkey")
+    for index in ("anomalies_ts_id_idx", "anomalies_ip_ts_idx", "anomalies_type_ts_idx", "anomalies_ts_brin_idx"):
+        await conn.execute(f"DROP INDEX IF EXISTS {index}")
+    await create_partitioned_table(conn)
+
+    first, last = await conn.fetchrow(
+        """
+        SELECT (min(timestamp) AT TIME ZONE 'UTC')::date, (max(timestamp) AT TIME ZONE 'UTC')::date
+        FROM anomalies_legacy
+        """)
+    if first is not None:
+        await ensure_partitions(conn, first, last, interval)
+    # timestamp is part of the new primary key; undated legacy rows are kept
+    # in the default partition under the epoch rather than dropped.
+    await conn.execute("""
+        INSERT INTO anomalies (id, source_ip, score, event_type, timestamp, details)
+        SELECT id, source_ip, score, event_type, COALESCE(timestamp, 'epoch'), details
+        FROM anomalies_legacy
+    """)
+    await conn.execute("""
+        SELECT setval(pg_get_serial_sequence('anomalies', 'id'),
+                      GREATEST((SELECT max(id) FROM anomalies), 1))
+    """)
+    await conn.execute("DROP TABLE anomalies_legacy")
+    print("Migration of 'anomalies' complete.")
+
+async def create_partitioned_table(conn: asyncpg.Connection):
+    """Creates the range-partitioned anomalies table and its default partition."""
+    # The partition key must be part of the primary key.
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS anomalies (
+            id SERIAL,
+            source_ip VARCHAR(100),
+            score FLOAT,
+            event_type VARCHAR(100),
+            timestamp TIMESTAMPTZ,
+            details JSONB,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp);
+        CREATE TABLE IF NOT EXISTS anomalies_default PARTITION OF anomalies DEFAULT;
+    """)
+
+class PartitionManager:
+    """
+    Keeps the anomalies partitions rolling: creates the next PARTITIONS_AHEAD
+    partitions before they are needed and expires those past RETENTION_DAYS.
+    Replicas coordinate through an advisory lock, so only one does the work.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, interval: str = PARTITION_INTERVAL,
+                 ahead: int = PARTITIONS_AHEAD, retention_days: int = RETENTION_DAYS,
+                 action: str = RETENTION_ACTION, check_interval: float = MAINTENANCE_INTERVAL):
+        self.pool = pool
+        self.interval = interval
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.action = action
+        self.check_interval = check_interval
+
+    async def run_once(self, now: datetime.datetime = None) -> tuple:
+        """One maintenance pass. Returns (created, expired) partition names."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        today = now.date()
+        async with self.pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", SCHEMA_LOCK_ID):
+                return [], []
+            try:
+                last = today + partition_step(self.interval) * self.ahead
+                created = await ensure_partitions(conn, today, last, self.interval)
+                expired = []
+                if self.retention_days > 0:
+                    cutoff = now - datetime.timedelta(days=self.retention_days)
+                    expired = await expire_partitions(conn, cutoff, self.action)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", SCHEMA_LOCK_ID)
+        return created, expired
+
+    async def run(self):
+        while True:
+            try:
+                created, expired = await self.run_once()
+                if created or expired:
+                    print(f"Anomaly partitions: created {created}, expired ({self.action}) {expired}.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Partition maintenance failed: {e}")
+                traceback.print_exc()
+            await asyncio.sleep(self.check_interval)
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import traceback
+from .metrics import REDIS_MEMORY_BYTES, STREAM_LENGTH, STREAM_TRIMMED
+
+# Seconds between background trim passes; 0 disables the trimmer.
+STREAM_TRIM_INTERVAL = float(os.environ.get("STREAM_TRIM_INTERVAL", "30"))
+
+def _parse_id(entry_id) -> tuple:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+async def safe_trim_id(r, stream: str):
+    """
+    Returns the lowest entry ID any consumer group may still need: for each
+    group, the older of its last-delivered ID and its oldest pending entry.
+    Everything below it has been delivered to and acked by every group.
+    Returns None when the stream has no groups (nothing to measure against).
+    """
+    groups = await r.xinfo_groups(stream)
+    if not groups:
+        return None
+    floor = None
+    for group in groups:
+        candidate = _parse_id(group["last-delivered-id"])
+        if group["pending"]:
+            summary = await r.xpending(stream, group["name"])
+            if summary["min"] is not None:
+                candidate = min(candidate, _parse_id(summary["min"]))
+        floor = candidate if floor is None else min(floor, candidate)
+    return floor
+
+class StreamTrimmer:
+    """
+    Periodically trims the events stream with XTRIM MINID up to the slowest
+    consumer group, so entries are dropped once every group has acked them
+    rather than when a length cap happens to be hit. Also refreshes the
+    stream length and Redis memory gauges.
+    """
+
+    def __init__(self, r, stream: str, interval: float = STREAM_TRIM_INTERVAL, approximate: bool = True):
+        self.r = r
+        self.stream = stream
+        self.interval = interval
+        self.approximate = approximate
+
+    async def trim_once(self) -> int:
+        """Runs one trim pass; returns the number of entries removed."""
+        trimmed = 0
+        floor = await safe_trim_id(self.r, self.stream)
+        if floor is not None and floor > (0, 0):
+            trimmed = await self.r.xtrim(
+                self.stream, minid=f"{floor[0]}-{floor[1]}", approximate=self.approximate)
+            STREAM_TRIMMED.inc(trimmed)
+        STREAM_LENGTH.set(await self.r.xlen(self.stream))
+        try:
+            REDIS_MEMORY_BYTES.set((await self.r.info("memory"))["used_memory"])
+        except Exception:
+            pass  # INFO may be disabled (e.g. renamed on managed Redis)
+        return trimmed
+
+    async def run(self):
+        while True:
+            try:
+                trimmed = await self.trim_once()
+                if trimmed:
+                    print(f"Trimmed {trimmed} acked entries from '{self.stream}'.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stream trim failed: {e}")
+                traceback.print_exc()
+            await asyncio.sleep(self.interval)
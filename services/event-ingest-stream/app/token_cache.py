@@ -0,0 +1,52 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified JWT payloads, keyed by the token's SHA-256 digest.
+    Entries live for at most `ttl` seconds and never past the token's own `exp`,
+    so a cached token stops being accepted at the same moment jwt.decode would
+    start rejecting it.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # digest -> (expires_at, payload, scopes)
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[tuple]:
+        """Returns (payload, scopes) for a cached, unexpired token or None."""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1], entry[2]
+
+    def put(self, token: str, payload: dict, scopes: frozenset):
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+        key = self._key(token)
+        self._entries[key] = (expires_at, payload, scopes)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
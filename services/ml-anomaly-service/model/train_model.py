@@ -1,28 +1,70 @@
-import joblib
-import numpy as np
-from sklearn.ensemble import IsolationForest
+import argparse
 import os
+import sys
+
+import numpy as np
 
-print("Training a dummy Isolation Forest model...")
+# Training replays history through the worker's own feature code, so the model
+# sees exactly the matrix it will be served.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from worker import training  # noqa: E402
 
-# Create some dummy "normal" data (e.g., login counts per IP)
-# 1000 samples, 2 features (e.g., login_fails, file_changes)
-X_train = np.random.rand(1000, 2)
-X_train[:, 0] = X_train[:, 0] * 5  # Feature 1 (0-5)
-X_train[:, 1] = X_train[:, 1] * 10 # Feature 2 (0-10)
+parser = argparse.ArgumentParser(description="Train the anomaly model on event history and export it for the worker")
+source = parser.add_mutually_exclusive_group(required=True)
+source.add_argument("--redis-url", help="read the events:raw stream from this Redis (e.g. redis://localhost:6379/0)")
+source.add_argument("--archive", help="read an NDJSON export, one event per line (.gz accepted)")
+source.add_argument("--synthetic", type=int, metavar="N", help="train on N generated baseline events")
+parser.add_argument("--stream", default="events:raw")
+parser.add_argument("--start", default="-", help="first stream entry ID to read (XRANGE syntax)")
+parser.add_argument("--end", default="+", help="last stream entry ID to read (XRANGE syntax)")
+destination = parser.add_mutually_exclusive_group()
+destination.add_argument("--output", help="artifact path (default: model/model.joblib)")
+destination.add_argument("--output-dir", help="write <version>.joblib here, e.g. the worker's MODEL_DIR")
+parser.add_argument("--version", help="version name for --output-dir (default: model-<UTC timestamp>)")
+parser.add_argument("--format", choices=("compiled", "sklearn"), default="compiled",
+                    help="compiled: flat arrays scored by worker.compiled_forest (default); sklearn: the pickled estimator")
+parser.add_argument("--sample-size", type=int, default=training.SAMPLE_SIZE,
+                    help="feature rows kept for fitting; bounds memory regardless of history length")
+parser.add_argument("--window", type=float, default=training.WINDOW_SECONDS,
+                    help="per-IP counter window in seconds; match the worker's IP_STATS_WINDOW_SECONDS")
+parser.add_argument("--n-estimators", type=int, default=100)
+parser.add_argument("--contamination", type=float, default=0.05)
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
 
-# Train the model
-model = IsolationForest(contamination=0.05, random_state=42)
-model.fit(X_train)
+if args.redis_url:
+    import redis
+    batches = training.stream_batches(redis.Redis.from_url(args.redis_url), args.stream, args.start, args.end)
+    source_name = f"{args.redis_url} {args.stream} [{args.start}, {args.end}]"
+elif args.archive:
+    batches = training.archive_batches(args.archive)
+    source_name = args.archive
+else:
+    batches = training.synthetic_batches(args.synthetic, seed=args.seed)
+    source_name = f"synthetic:{args.synthetic}"
 
-# Save the model
-model_path = os.path.join(os.path.dirname(__file__), "model.joblib")
-joblib.dump(model, model_path)
+print(f"Training on {source_name}...")
+try:
+    model, metadata = training.train(batches, source_name, sample_size=args.sample_size, window_seconds=args.window,
+                                     n_estimators=args.n_estimators, contamination=args.contamination, seed=args.seed)
+except ValueError as e:
+    sys.exit(str(e))
+print(f"Replayed {metadata['events']:,} events into {metadata['rows_seen']:,} feature rows "
+      f"in {metadata['replay_seconds']:.1f}s; fitted on {metadata['rows_sampled']:,} in {metadata['fit_seconds']:.1f}s.")
 
-print(f"Model saved to {model_path}")
+if args.output_dir:
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, (args.version or training.default_version()) + ".joblib")
+else:
+    path = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "model.joblib")
+try:
+    training.write_artifact(model, metadata, path, compiled=args.format == "compiled")
+except ValueError as e:
+    sys.exit(str(e))
+print(f"Model saved to {path} (metadata: {os.path.splitext(path)[0]}.json)")
 
 # Test with a clear anomaly
-anomaly = np.array([[50, 100]]) # 50 failed logins, 100 file changes
+anomaly = np.array([[50, 100]])  # 50 failed logins, 100 file changes
 score = model.decision_function(anomaly)
 pred = model.predict(anomaly)
-print(f"Test anomaly [50, 100] score: {score[0]} (Prediction: {pred[0]})")
\ No newline at end of file
+print(f"Test anomaly [50, 100] score: {score[0]} (Prediction: {pred[0]})")
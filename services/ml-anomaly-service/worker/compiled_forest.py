@@ -0,0 +1,160 @@
+import numpy as np
+
+# Marks a joblib artifact holding export_forest() arrays rather than a pickled estimator.
+COMPILED_FORMAT = "securify-compiled-iforest/1"
+
+# Rows scored per pass; keeps the (rows, trees) index matrices cache-sized.
+CHUNK_ROWS = 1024
+
+def average_path_length(n_samples) -> np.ndarray:
+    """
+    c(n): average path length of an unsuccessful BST search among n samples,
+    the expected remaining depth below a leaf that still holds n samples.
+    """
+    n = np.asarray(n_samples, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+def _node_depths(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Depth of every node of one tree, counting the root as 1 (as sklearn does)."""
+    depth = np.zeros(len(left), dtype=np.int64)
+    depth[0] = 1
+    # Children always come after their parent in sklearn's node order.
+    for node in range(len(left)):
+        if left[node] != -1:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return depth
+
+def export_forest(model) -> dict:
+    """
+    Flattens a fitted sklearn IsolationForest into contiguous arrays, all trees
+    concatenated into one node table:
+
+      feature     int32    input column tested at the node (already mapped
+                           through estimators_features_); 0 at leaves
+      threshold   float32  go left when x <= threshold; +inf at leaves.
+                           Rounded down from sklearn's float64 so that a
+                           float32 comparison gives the same answer as
+                           sklearn's float32-vs-float64 one
+      children    int32    children[2 * node + went_left]: global index of
+                           the right/left child; a leaf points at itself,
+                           so extra traversal steps are no-ops
+      path_length float64  at leaves, depth + c(n_node_samples) - 1 (root at
+                           depth 1), the tree's contribution to the
+                           sample's path length
+      roots       int32    global index of each tree's root
+
+    plus the scalars needed to turn path lengths into decision_function.
+    worker.training adds a "metadata" dict (feature schema, training stats).
+    """
+    features, thresholds, children, path_lengths, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree, tree_features in zip(model.estimators_, model.estimators_features_):
+        t = tree.tree_
+        left = t.children_left.astype(np.int64)
+        right = t.children_right.astype(np.int64)
+        is_leaf = left == -1
+        nodes = np.arange(t.node_count)
+
+        features.append(np.where(is_leaf, 0, np.asarray(tree_features)[np.where(is_leaf, 0, t.feature)]))
+        thresholds.append(np.where(is_leaf, np.inf, t.threshold))
+        # Interleaved (right, left) pairs, indexed by 2 * node + (x <= threshold)
+        children.append(np.column_stack((np.where(is_leaf, nodes, right), np.where(is_leaf, nodes, left))) + offset)
+        path_lengths.append(np.where(is_leaf, _node_depths(left, right) + average_path_length(t.n_node_samples) - 1.0, 0.0))
+        roots.append(offset)
+        max_depth = max(max_depth, t.max_depth)
+        offset += t.node_count
+
+    threshold = np.concatenate(thresholds)
+    threshold32 = threshold.astype(np.float32)
+    rounded_up = threshold32.astype(np.float64) > threshold
+    threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+    n_trees = len(model.estimators_)
+    return {
+        "format": COMPILED_FORMAT,
+        "feature": np.ascontiguousarray(np.concatenate(features), dtype=np.int32),
+        "threshold": threshold32,
+        "children": np.ascontiguousarray(np.concatenate(children).ravel(), dtype=np.int32),
+        "path_length": np.ascontiguousarray(np.concatenate(path_lengths), dtype=np.float64),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": int(max_depth),
+        "denominator": float(n_trees * average_path_length([model._max_samples])[0]),
+        "offset": float(model.offset_),
+        "n_features": int(model.n_features_in_),
+    }
+
+def is_compiled(artifact) -> bool:
+    return isinstance(artifact, dict) and artifact.get("format") == COMPILED_FORMAT
+
+class CompiledForest:
+    """
+    IsolationForest scorer over export_forest() arrays.
+
+    All trees advance one level per step for a whole chunk of rows: a
+    (rows, trees) matrix of node indices goes through max_depth rounds of
+    take / compare / take, so a batch costs a few NumPy calls per tree level
+    instead of a Python loop over estimators with input validation on every
+    call. Inputs are rounded to float32 as sklearn's trees do, so samples land
+    in the same leaves and scores match up to float summation order.
+
+    The arrays are used as loaded, so a memory-mapped artifact is scored in
+    place and shared between processes. The fixed cost is far lower than
+    sklearn's, which is what matters for the worker's matrices (one row per
+    candidate IP, at most BATCH_SIZE); past a thousand or two rows sklearn's
+    per-tree Cython traversal wins per row
+    (see automation/benchmarks/bench_model_scoring.py).
+    """
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.path_length = arrays["path_length"]
+        self.roots = arrays["roots"]
+        self.max_depth = arrays["max_depth"]
+        self.denominator = arrays["denominator"]
+        self.offset_ = arrays["offset"]
+        self.n_features_in_ = arrays["n_features"]
+        self.metadata = arrays.get("metadata", {})
+
+    @classmethod
+    def from_sklearn(cls, model) -> "CompiledForest":
+        return cls(export_forest(model))
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _path_lengths(self, X: np.ndarray) -> np.ndarray:
+        # X is C-contiguous float32, so row r's feature f sits at r * n_features + f.
+        flat = X.ravel()
+        row_base = (np.arange(len(X), dtype=np.int32) * self.n_features_in_)[:, None]
+        nodes = np.tile(self.roots, (len(X), 1))
+        for _ in range(self.max_depth):
+            went_left = flat.take(row_base + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = self.children.take(nodes * 2 + went_left)
+        return self.path_length.take(nodes).sum(axis=1)
+
+    def score_samples(self, X) -> np.ndarray:
+        """Same as IsolationForest.score_samples: lower is more abnormal."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected a 2-D matrix with {self.n_features_in_} features, got shape {X.shape}")
+        depths = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), CHUNK_ROWS):
+            depths[start:start + CHUNK_ROWS] = self._path_lengths(X[start:start + CHUNK_ROWS])
+        if self.denominator == 0:
+            return -np.ones(len(X))
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X) -> np.ndarray:
+        """Same as IsolationForest.decision_function: negative for outliers."""
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X) -> np.ndarray:
+        return np.where(self.decision_function(X) < 0, -1, 1)
@@ -0,0 +1,132 @@
+import functools
+import os
+import time
+
+import numpy as np
+
+from . import features, metrics
+from .ip_stats import IPStatsStore
+
+# Keyed detectors to run next to the per-IP model, comma-separated names from
+# DETECTORS below; empty disables them.
+KEYED_DETECTORS = os.environ.get("KEYED_DETECTORS", "username,user_id,path_prefix")
+
+# File changes under these prefixes count as sensitive.
+SENSITIVE_PATH_PREFIXES = tuple(filter(None, os.environ.get(
+    "SENSITIVE_PATH_PREFIXES", "/etc/,/root/,/boot/,/usr/bin/,/usr/sbin/,/usr/lib/systemd/,/lib/systemd/",
+).split(",")))
+# Directory levels kept by the path_prefix detector: 2 groups /etc/ssh/sshd_config under /etc/ssh.
+PATH_PREFIX_DEPTH = int(os.environ.get("PATH_PREFIX_DEPTH", "2"))
+
+# Thresholds, applied to the sliding-window totals (IP_STATS_WINDOW_SECONDS).
+# username: failed logins against one account, from any number of addresses
+USER_LOGIN_MIN_FAILED = int(os.environ.get("USER_LOGIN_MIN_FAILED", "20"))
+USER_LOGIN_MIN_FAIL_RATIO = float(os.environ.get("USER_LOGIN_MIN_FAIL_RATIO", "0.5"))
+# user_id: sensitive file changes by one account
+FILE_USER_MIN_SENSITIVE = int(os.environ.get("FILE_USER_MIN_SENSITIVE", "10"))
+# path_prefix: changes under one sensitive directory, by any number of accounts
+FILE_PATH_MIN_SENSITIVE = int(os.environ.get("FILE_PATH_MIN_SENSITIVE", "10"))
+
+def is_failed_login(event: dict) -> bool:
+    return not event.get("success", True)
+
+def is_sensitive_change(event: dict) -> bool:
+    path = event.get("file_path")
+    return isinstance(path, str) and path.startswith(SENSITIVE_PATH_PREFIXES)
+
+@functools.lru_cache(maxsize=65536)  # the same few paths change over and over
+def path_prefix(path, depth: int = PATH_PREFIX_DEPTH):
+    """The first `depth` levels of the file's directory: "/etc/ssh/sshd_config" -> "/etc/ssh"."""
+    if not isinstance(path, str):
+        return None
+    return "/".join(path.split("/")[:-1][:depth + 1]) or "/"
+
+class KeyedDetector:
+    """
+    Threshold detector over per-key counters for one event type, e.g. failed
+    logins per username.
+
+    Counts come from features.extract_key_activity and, with a window, are
+    accumulated in an IPStatsStore keyed by the detector's key, so activity
+    spread thinly over many batches still adds up. A key is reported when its
+    window has at least `min_flagged` flagged events making up at least
+    `min_ratio` of its events, and at most once per `cooldown` seconds
+    while it stays over. The report's source_ip is the key's busiest address
+    in the current batch; its score rises from 0.5 at the threshold towards 1.
+    """
+
+    def __init__(self, name: str, report_type: str, event_type: str, key_of, is_flagged,
+                 columns: tuple, min_flagged: int, min_ratio: float = 0.0,
+                 window_seconds: float = 600, n_buckets: int = 10, max_keys: int = 1_000_000,
+                 cooldown: float = None):
+        self.name = name
+        self.report_type = report_type
+        self.event_type = event_type
+        self.key_of = key_of
+        self.is_flagged = is_flagged
+        self.columns = columns
+        self.min_flagged = max(1, min_flagged)
+        self.min_ratio = min_ratio
+        self.cooldown = window_seconds if cooldown is None else cooldown
+        self.stats = IPStatsStore(window_seconds, n_buckets, max_keys,
+                                  n_counters=len(features.KEY_ACTIVITY_COLUMNS)) if window_seconds > 0 else None
+
+    def detect(self, by_type: dict, timestamp: str, now: float = None) -> list:
+        """Anomaly reports for one batch, given features.split_by_event_type() of its events."""
+        events = by_type.get(self.event_type)
+        if not events:
+            return []
+        now = time.time() if now is None else now
+        activity = features.extract_key_activity(events, self.key_of, self.is_flagged)
+        if not activity.keys:
+            return []
+        counts = activity.counts
+        if self.stats is not None:
+            counts = self.stats.window_totals(self.stats.update(activity.keys, counts, now))
+        total, flagged = counts[:, 0], counts[:, 1]
+        hits = np.flatnonzero((flagged >= self.min_flagged) & (flagged >= self.min_ratio * total))
+
+        reports = []
+        for idx in hits.tolist():
+            key = activity.keys[idx]
+            if self.stats is not None and not self.stats.claim_report(key, now, self.cooldown):
+                metrics.REPORTS_SUPPRESSED.labels(self.name).inc()
+                continue
+            print(f"ANOMALY DETECTED! {self.name}: {key}, {self.columns[1]}: {flagged[idx]}")
+            reports.append({
+                "source_ip": str(activity.top_ips[idx]),
+                "score": float(1 - 0.5 * self.min_flagged / flagged[idx]),
+                "event_type": self.report_type,
+                "timestamp": timestamp,
+                "details": {
+                    self.name: key,
+                    self.columns[0]: int(total[idx]),
+                    self.columns[1]: int(flagged[idx]),
+                    "source_ips": int(activity.sources[idx]),
+                },
+            })
+        if reports:
+            metrics.DETECTOR_FLAGGED.labels(self.name).inc(len(reports))
+        return reports
+
+# name -> (report event_type, input event_type, key, flagged, detail column names, threshold, ratio)
+DETECTORS = {
+    "username": ("AGG_USER_LOGIN_FAIL", "LOGIN_ATTEMPT", lambda e: e.get("username"), is_failed_login,
+                 ("logins", "failed_logins"), USER_LOGIN_MIN_FAILED, USER_LOGIN_MIN_FAIL_RATIO),
+    "user_id": ("AGG_USER_FILE_CHANGE", "FILE_CHANGE", lambda e: e.get("user_id"), is_sensitive_change,
+                ("file_changes", "sensitive_changes"), FILE_USER_MIN_SENSITIVE, 0.0),
+    "path_prefix": ("AGG_PATH_FILE_CHANGE", "FILE_CHANGE", lambda e: path_prefix(e.get("file_path")),
+                    is_sensitive_change, ("file_changes", "sensitive_changes"), FILE_PATH_MIN_SENSITIVE, 0.0),
+}
+
+def create_detectors(names: str = KEYED_DETECTORS, window_seconds: float = 600, n_buckets: int = 10,
+                     max_keys: int = 1_000_000, cooldown: float = None) -> list:
+    """KeyedDetectors for the comma-separated `names`; unknown names are an error."""
+    detectors = []
+    for name in filter(None, (n.strip() for n in names.split(","))):
+        if name not in DETECTORS:
+            raise ValueError(f"Unknown detector {name!r}; expected one of {', '.join(DETECTORS)}")
+        report_type, event_type, key_of, is_flagged, columns, min_flagged, min_ratio = DETECTORS[name]
+        detectors.append(KeyedDetector(name, report_type, event_type, key_of, is_flagged, columns,
+                                       min_flagged, min_ratio, window_seconds, n_buckets, max_keys, cooldown))
+    return detectors
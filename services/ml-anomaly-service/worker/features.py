@@ -0,0 +1,193 @@
+from typing import NamedTuple
+import numpy as np
+import orjson
+
+# Minimum failed logins in a batch before an IP is worth scoring.
+FAILED_LOGIN_PREFILTER = 2
+
+# Column order of the per-IP activity counters.
+ACTIVITY_COLUMNS = ("logins", "failed_logins", "file_changes")
+
+# Counters kept per key by the keyed detectors (worker.detectors): events of
+# the detector's type, and how many of them it flags (e.g. failed logins).
+KEY_ACTIVITY_COLUMNS = ("events", "flagged")
+
+# Column order of the model input built by build_login_matrix. Bump the schema
+# version whenever a column's meaning changes; models carry the schema they
+# were trained with and the registry refuses mismatches.
+MODEL_FEATURES = ("failed_logins", "file_changes")
+FEATURE_SCHEMA_VERSION = 2  # 1: second column was failed_logins / 2
+
+def feature_schema(window_seconds: float, n_buckets: int) -> dict:
+    """Describes the model input, for artifact metadata and registry checks."""
+    return {
+        "version": FEATURE_SCHEMA_VERSION,
+        "features": list(MODEL_FEATURES),
+        "prefilter_min_failed": FAILED_LOGIN_PREFILTER,
+        "window_seconds": window_seconds,
+        "window_buckets": n_buckets,
+    }
+
+def parse_events(events: list) -> list:
+    """Decodes raw stream entries, skipping malformed ones."""
+    parsed_data = []
+    for _id, data in events:
+        try:
+            # redis-py returns dict for data. Key might be bytes or str depending on decode_responses.
+            # We used decode_responses=False for the redis client, so keys/values are bytes.
+            payload = data.get(b'data') or data.get('data')
+            parsed_data.append(orjson.loads(payload))
+        except Exception as e:
+            print(f"Skipping malformed event {_id}: {e}")
+    return parsed_data
+
+class IPActivity(NamedTuple):
+    """Per-IP counters for one batch; counts[i] holds ACTIVITY_COLUMNS for ips[i]."""
+    ips: list
+    counts: np.ndarray
+
+class LoginFeatures(NamedTuple):
+    """Per-IP login aggregates; row i of each array belongs to ips[i]."""
+    ips: list
+    total_logins: np.ndarray
+    failed_logins: np.ndarray
+    file_changes: np.ndarray
+
+def extract_ip_activity(parsed_events: list) -> IPActivity:
+    """
+    Counts logins, failed logins and file changes per source IP without building
+    a DataFrame. Source IPs are interned to dense integer codes in first-seen
+    order and each counter is an np.bincount over those codes.
+    """
+    codes = {}
+    ip_codes = []
+    kinds = []
+    for event in parsed_events:
+        event_type = event.get("event_type")
+        if event_type == "LOGIN_ATTEMPT":
+            kinds.append(0 if event.get("success", True) else 1)
+        elif event_type == "FILE_CHANGE":
+            kinds.append(2)
+        else:
+            continue
+        ip_codes.append(codes.setdefault(event["source_ip"], len(codes)))
+
+    n_ips = len(codes)
+    counts = np.zeros((n_ips, len(ACTIVITY_COLUMNS)), dtype=np.int64)
+    if not n_ips:
+        return IPActivity([], counts)
+
+    ip_codes = np.fromiter(ip_codes, dtype=np.intp, count=len(ip_codes))
+    kinds = np.fromiter(kinds, dtype=np.intp, count=len(kinds))
+    # kind 0 = successful login, 1 = failed login, 2 = file change
+    by_kind = np.bincount(ip_codes * 3 + kinds, minlength=n_ips * 3).reshape(n_ips, 3)
+    counts[:, 0] = by_kind[:, 0] + by_kind[:, 1]
+    counts[:, 1] = by_kind[:, 1]
+    counts[:, 2] = by_kind[:, 2]
+    return IPActivity(list(codes), counts)
+
+class KeyActivity(NamedTuple):
+    """
+    Per-key KEY_ACTIVITY_COLUMNS counters; row i belongs to keys[i]. top_ips[i]
+    is the source IP seen most often for the key, sources[i] how many distinct
+    source IPs it had.
+    """
+    keys: list
+    counts: np.ndarray
+    top_ips: list
+    sources: np.ndarray
+
+def split_by_event_type(parsed_events: list) -> dict:
+    """event_type -> events of that type, so each detector only walks its own."""
+    by_type = {}
+    for event in parsed_events:
+        by_type.setdefault(event.get("event_type"), []).append(event)
+    return by_type
+
+def extract_key_activity(events: list, key_of, is_flagged) -> KeyActivity:
+    """
+    Groups events by key_of(event) (events keyed None are skipped) and counts
+    them, and those is_flagged, per key the same way extract_ip_activity does
+    per IP: dense key codes and np.bincount.
+    """
+    codes = {}
+    key_codes = []
+    flags = []
+    per_source = {}           # (key code, source_ip) -> events
+    for event in events:
+        key = key_of(event)
+        if key is None:
+            continue
+        code = codes.setdefault(key, len(codes))
+        key_codes.append(code)
+        flags.append(bool(is_flagged(event)))
+        pair = (code, event.get("source_ip"))
+        per_source[pair] = per_source.get(pair, 0) + 1
+
+    n_keys = len(codes)
+    counts = np.zeros((n_keys, len(KEY_ACTIVITY_COLUMNS)), dtype=np.int64)
+    if not n_keys:
+        return KeyActivity([], counts, [], np.zeros(0, dtype=np.int64))
+
+    key_codes = np.fromiter(key_codes, dtype=np.intp, count=len(key_codes))
+    flags = np.fromiter(flags, dtype=bool, count=len(flags))
+    counts[:, 0] = np.bincount(key_codes, minlength=n_keys)
+    counts[:, 1] = np.bincount(key_codes[flags], minlength=n_keys)
+    top_ips = [None] * n_keys
+    top_counts = [0] * n_keys
+    sources = [0] * n_keys
+    for (code, ip), n in per_source.items():
+        sources[code] += 1
+        if n > top_counts[code]:
+            top_counts[code] = n
+            top_ips[code] = ip
+    return KeyActivity(list(codes), counts, top_ips, np.array(sources, dtype=np.int64))
+
+def extract_login_features(parsed_events: list) -> LoginFeatures:
+    """Per-IP login totals, failures and file changes for IPs with at least one LOGIN_ATTEMPT."""
+    activity = extract_ip_activity(parsed_events)
+    return login_features_from_counts(activity.ips, activity.counts)
+
+def login_features_from_counts(ips: list, counts: np.ndarray) -> LoginFeatures:
+    """Builds LoginFeatures from ACTIVITY_COLUMNS counters, dropping IPs without logins."""
+    has_logins = np.flatnonzero(counts[:, 0] > 0)
+    if len(has_logins) == len(ips):
+        return LoginFeatures(ips, counts[:, 0], counts[:, 1], counts[:, 2])
+    kept = counts[has_logins]
+    return LoginFeatures([ips[i] for i in has_logins], kept[:, 0], kept[:, 1], kept[:, 2])
+
+def extract_login_features_pandas(parsed_events: list) -> LoginFeatures:
+    """
+    Reference implementation: the original DataFrame/groupby aggregation.
+    Kept for equivalence tests and benchmarks; not used on the hot path.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(parsed_events)
+    if 'event_type' not in df.columns:
+        empty = np.zeros(0, dtype=np.int64)
+        return LoginFeatures([], empty, empty, empty)
+
+    login_df = df[df['event_type'] == 'LOGIN_ATTEMPT'].copy()
+    login_df['success'] = login_df['success'].astype(bool)
+    features_df = login_df.groupby('source_ip').agg(
+        total_logins=('event_id', 'count'),
+        failed_logins=('success', lambda x: (~x).sum())
+    )
+    file_changes = df[df['event_type'] == 'FILE_CHANGE'].groupby('source_ip').size()
+    return LoginFeatures(
+        list(features_df.index),
+        features_df['total_logins'].to_numpy(dtype=np.int64),
+        features_df['failed_logins'].to_numpy(dtype=np.int64),
+        file_changes.reindex(features_df.index, fill_value=0).to_numpy(dtype=np.int64),
+    )
+
+def build_login_matrix(features: LoginFeatures, min_failed: int = FAILED_LOGIN_PREFILTER):
+    """
+    Applies the failed-login pre-filter and builds the model input directly.
+    Returns (candidate_indices, X_predict) with columns MODEL_FEATURES.
+    Serving and training (worker.training) both build their matrices here.
+    """
+    candidates = np.flatnonzero(features.failed_logins > min_failed)
+    X_predict = np.column_stack((features.failed_logins[candidates], features.file_changes[candidates])).astype(np.float64)
+    return candidates, X_predict
@@ -1,11 +1,19 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
 import threading
+from . import metrics
 
 app = Flask(__name__)
 
 # Global flag to be set by the main worker
 MODEL_IS_READY = False
 
+# In multi-process mode the supervisor registers a callable returning the
+# combined status of its consumers ({"ready": bool, ...}).
+STATUS_PROVIDER = None
+
+# The model registry registers a callable returning the active model version.
+MODEL_STATUS_PROVIDER = None
+
 @app.route("/healthz")
 def liveness_probe():
     """
@@ -18,10 +26,23 @@ def readiness_probe():
     """
     Readiness probe: Is the model loaded and ready to serve?
     """
-    if MODEL_IS_READY:
-        return jsonify({"status": "ready"}), 200
-    else:
+    if not MODEL_IS_READY:
         return jsonify({"status": "loading_model"}), 503
+    model = {"model": MODEL_STATUS_PROVIDER()} if MODEL_STATUS_PROVIDER is not None else {}
+    if STATUS_PROVIDER is None:
+        return jsonify({"status": "ready", **model}), 200
+    workers = STATUS_PROVIDER()
+    if workers["ready"]:
+        return jsonify({"status": "ready", **model, **workers}), 200
+    return jsonify({"status": "no_healthy_workers", **model, **workers}), 503
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus metrics: per-stage batch latency, queue depths, throughput.
+    """
+    body, content_type = metrics.render()
+    return Response(body, mimetype=content_type)
 
 def start_server():
     """Starts the Flask server in a separate thread."""
@@ -0,0 +1,255 @@
+import asyncio
+import math
+import time
+import uuid
+from typing import NamedTuple
+import numpy as np
+from .features import ACTIVITY_COLUMNS
+
+class StatsSnapshot(NamedTuple):
+    """A copy of an IPStatsStore's state; row i of counts/last_seen belongs to keys[i]."""
+    keys: list
+    counts: np.ndarray
+    last_seen: np.ndarray
+    meta: dict
+
+    def pack(self, start: int, stop: int) -> dict:
+        """key -> packed counters + last_seen, the hash fields for keys[start:stop]."""
+        n = len(self.keys[start:stop])
+        rows = np.concatenate([
+            self.counts[start:stop].reshape(n, -1).view(np.uint8),
+            self.last_seen[start:stop, None].view(np.uint8),
+        ], axis=1)
+        blob, width = rows.tobytes(), rows.shape[1]
+        return {key: blob[i * width:(i + 1) * width] for i, key in enumerate(self.keys[start:stop])}
+
+class IPStatsStore:
+    """
+    Sliding-window per-IP counters (ACTIVITY_COLUMNS) shared across batches.
+
+    The window is split into `n_buckets` time buckets. Counters live in one
+    (capacity, n_buckets, n_counters) uint32 array indexed by a slot per IP, so
+    a tracked IP costs a few hundred bytes instead of a dict of Python ints.
+    All IPs share the same bucket clock: when time moves into a new bucket that
+    column is zeroed for every slot at once. Once `max_ips` slots are in use the
+    least recently seen IPs are evicted in chunks.
+
+    Nothing here depends on the keys being IPs: the keyed detectors
+    (worker.detectors) keep usernames, user IDs and path prefixes in stores
+    of their own, with `n_counters` KEY_ACTIVITY_COLUMNS.
+    """
+
+    def __init__(self, window_seconds: float = 600, n_buckets: int = 10,
+                 max_ips: int = 1_000_000, initial_capacity: int = 4096,
+                 n_counters: int = len(ACTIVITY_COLUMNS)):
+        self.window_seconds = window_seconds
+        self.n_buckets = n_buckets
+        self.bucket_seconds = window_seconds / n_buckets
+        self.max_ips = max_ips
+        capacity = min(initial_capacity, max_ips)
+        self._counts = np.zeros((capacity, n_buckets, n_counters), dtype=np.uint32)
+        self._last_seen = np.full(capacity, np.inf)
+        self._last_reported = np.full(capacity, -np.inf)
+        self._slots = {}          # ip -> slot
+        self._ips = []            # slot -> ip (None when free)
+        self._free = []
+        self._bucket = None       # absolute index of the current bucket
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._last_seen)
+
+    def nbytes(self) -> int:
+        """Bytes held by the counter arrays (excludes the IP -> slot dict)."""
+        return self._counts.nbytes + self._last_seen.nbytes + self._last_reported.nbytes
+
+    # --- Time buckets ---
+
+    def _advance(self, now: float):
+        bucket = int(now // self.bucket_seconds)
+        if self._bucket is None:
+            self._bucket = bucket
+            return
+        if bucket <= self._bucket:
+            return
+        for b in range(self._bucket + 1, min(bucket, self._bucket + self.n_buckets) + 1):
+            self._counts[:, b % self.n_buckets, :] = 0
+        self._bucket = bucket
+        self._evict_idle(now)
+
+    def _evict_idle(self, now: float):
+        """Frees slots whose IP has not been seen for a whole window."""
+        used = len(self._ips)
+        idle = np.flatnonzero(self._last_seen[:used] < now - self.window_seconds)
+        idle = [slot for slot in idle.tolist() if self._ips[slot] is not None]
+        self._release(idle)
+
+    # --- Slot management ---
+
+    def _release(self, slots: list):
+        for slot in slots:
+            del self._slots[self._ips[slot]]
+            self._ips[slot] = None
+        if slots:
+            self._counts[slots] = 0
+            self._last_seen[slots] = np.inf
+            self._last_reported[slots] = -np.inf
+            self._free.extend(slots)
+
+    def _grow(self):
+        new_capacity = min(self.max_ips, max(1, self.capacity * 2))
+        extra = new_capacity - self.capacity
+        self._counts = np.concatenate(
+            (self._counts, np.zeros((extra,) + self._counts.shape[1:], dtype=self._counts.dtype)))
+        self._last_seen = np.concatenate((self._last_seen, np.full(extra, np.inf)))
+        self._last_reported = np.concatenate((self._last_reported, np.full(extra, -np.inf)))
+
+    def _evict_lru(self, needed: int):
+        # Evict in chunks so a full store doesn't pay an argpartition per new IP.
+        k = min(len(self._ips), max(needed, self.max_ips // 100, 1))
+        oldest = np.argpartition(self._last_seen[:len(self._ips)], k - 1)[:k]
+        self.evictions += len(oldest)
+        self._release(oldest.tolist())
+
+    def _slot_for(self, ip, now: float, remaining: int) -> int:
+        slot = self._slots.get(ip)
+        if slot is not None:
+            return slot
+        if not self._free:
+            if len(self._ips) < self.capacity:
+                self._ips.append(None)
+                self._free.append(len(self._ips) - 1)
+            elif self.capacity < self.max_ips:
+                self._grow()
+                self._ips.append(None)
+                self._free.append(len(self._ips) - 1)
+            else:
+                self._evict_lru(remaining)
+        slot = self._free.pop()
+        self._slots[ip] = slot
+        self._ips[slot] = ip
+        self._last_seen[slot] = now
+        return slot
+
+    # --- Public API ---
+
+    def update(self, ips: list, counts: np.ndarray, now: float = None) -> np.ndarray:
+        """
+        Adds one batch of per-IP counters (rows aligned with `ips`, which must be
+        unique) to the current bucket. Returns the slot of each IP.
+        """
+        now = time.time() if now is None else now
+        self._advance(now)
+        slots = np.empty(len(ips), dtype=np.intp)
+        for i, ip in enumerate(ips):
+            slots[i] = self._slot_for(ip, now, len(ips) - i)
+            # Mark as seen immediately so LRU eviction never picks this batch's IPs.
+            self._last_seen[slots[i]] = now
+        column = self._bucket % self.n_buckets
+        self._counts[slots, column] += counts.astype(np.uint32, copy=False)
+        return slots
+
+    def window_totals(self, slots: np.ndarray) -> np.ndarray:
+        """Counters summed over the whole window for the given slots."""
+        return self._counts[slots].sum(axis=1, dtype=np.int64)
+
+    def claim_report(self, key, now: float, cooldown: float) -> bool:
+        """
+        True if `key` may be reported now, i.e. it was not reported in the
+        last `cooldown` seconds; records the report. Window totals stay over
+        the threshold for as long as an attack continues, so without this
+        every batch would report the same key again. The timestamp lives and
+        is evicted with the key's slot; untracked keys are always reportable.
+        """
+        slot = self._slots.get(key)
+        if slot is None:
+            return True
+        if now - self._last_reported[slot] < cooldown:
+            return False
+        self._last_reported[slot] = now
+        return True
+
+    # --- Redis snapshots ---
+
+    def snapshot(self) -> StatsSnapshot:
+        """
+        Copies the store's state for write_snapshot(). Only the copy has to
+        happen between batches; packing and sending it can then overlap scoring.
+        """
+        keys = list(self._slots)
+        slots = np.fromiter(self._slots.values(), dtype=np.intp, count=len(keys))
+        meta = {
+            "n_buckets": self.n_buckets,
+            "bucket_seconds": self.bucket_seconds,
+            "bucket": -1 if self._bucket is None else self._bucket,
+        }
+        return StatsSnapshot(keys, self._counts[slots], self._last_seen[slots], meta)
+
+    async def save_snapshot(self, r, key: str, chunk_size: int = 5000, ttl: float = None):
+        """Writes the store to Redis now; see write_snapshot."""
+        await write_snapshot(r, key, self.snapshot(), chunk_size, self.window_seconds if ttl is None else ttl)
+
+    async def load_snapshot(self, r, key: str, now: float = None) -> int:
+        """
+        Restores a snapshot written by save_snapshot. Snapshots taken with a
+        different bucket layout are ignored. Returns the number of IPs restored.
+        """
+        meta = await r.hgetall(f"{key}:meta")
+        if not meta:
+            return 0
+        meta = {k.decode() if isinstance(k, bytes) else k: float(v) for k, v in meta.items()}
+        if int(meta["n_buckets"]) != self.n_buckets or meta["bucket_seconds"] != self.bucket_seconds:
+            print(f"Ignoring IP stats snapshot {key}: bucket layout changed.")
+            return 0
+
+        now = time.time() if now is None else now
+        self._bucket = int(meta["bucket"]) if meta["bucket"] >= 0 else None
+        row_bytes = self._counts[0].nbytes
+        restored = 0
+        async for ip, blob in r.hscan_iter(key, count=5000):
+            ip = ip.decode() if isinstance(ip, bytes) else ip
+            slot = self._slot_for(ip, now, 1)
+            self._counts[slot] = np.frombuffer(blob[:row_bytes], dtype=self._counts.dtype).reshape(
+                self._counts.shape[1:])
+            self._last_seen[slot] = np.frombuffer(blob[row_bytes:], dtype=np.float64)[0]
+            restored += 1
+        # Age out whatever expired while the worker was down.
+        self._advance(now)
+        return restored
+
+async def write_snapshot(r, key: str, snapshot: StatsSnapshot, chunk_size: int = 5000, ttl: float = 600):
+    """
+    Writes a StatsSnapshot to a Redis hash (key -> packed counters + last_seen).
+    The hash is built under a temporary key private to this writer, then
+    renamed into place together with its meta in one MULTI, so readers
+    never see a half-written snapshot and concurrent writers of the same
+    key don't interleave. Both keys expire after `ttl` seconds (the window:
+    a snapshot older than that holds nothing).
+
+    Chunks of `chunk_size` keys are packed in the default executor and sent
+    one HSET at a time, so a large store never holds up the event loop for
+    more than one chunk.
+    """
+    ttl = max(1, math.ceil(ttl))
+    tmp_key = f"{key}:tmp:{uuid.uuid4().hex}"
+    loop = asyncio.get_running_loop()
+    for start in range(0, len(snapshot.keys), chunk_size):
+        mapping = await loop.run_in_executor(None, snapshot.pack, start, start + chunk_size)
+        await r.hset(tmp_key, mapping=mapping)
+        if start == 0:
+            # Don't leak the temp hash if we die before the rename.
+            await r.expire(tmp_key, ttl)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.delete(f"{key}:meta")
+        pipe.hset(f"{key}:meta", mapping=snapshot.meta)
+        pipe.expire(f"{key}:meta", ttl)
+        if snapshot.keys:
+            pipe.rename(tmp_key, key)
+            pipe.expire(key, ttl)
+        else:
+            pipe.delete(key)
+        await pipe.execute()
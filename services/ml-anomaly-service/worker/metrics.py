@@ -0,0 +1,118 @@
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+)
+
+# Batch pipeline stages: read (XREADGROUP), queue_wait (waiting for the scorer),
+# score (parse + features + model, off the event loop) and report (HTTP + XACK).
+STAGE_SECONDS = Histogram(
+    "securify_worker_stage_seconds",
+    "Time a batch spends in each pipeline stage.",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+BATCH_SECONDS = Histogram(
+    "securify_worker_batch_seconds",
+    "Time from a batch being read to it being acked.",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+QUEUE_DEPTH = Gauge(
+    "securify_worker_queue_depth",
+    "Batches waiting between pipeline stages.",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+EVENTS_PROCESSED = Counter(
+    "securify_worker_events_processed_total",
+    "Stream entries scored and acked.",
+)
+ANOMALIES_REPORTED = Counter(
+    "securify_worker_anomalies_reported_total",
+    "Anomalies sent to the ingest API.",
+)
+DETECTOR_FLAGGED = Counter(
+    "securify_worker_detector_flagged_total",
+    "Anomalies raised by the keyed detectors (worker.detectors), per detector.",
+    ["detector"],
+)
+REPORTS_SUPPRESSED = Counter(
+    "securify_worker_reports_suppressed_total",
+    "Anomalies not re-reported because the key was reported within the cooldown, per detector (ip = the model).",
+    ["detector"],
+)
+# Pending-entry recovery (worker.recovery).
+PENDING_ENTRIES = Gauge(
+    "securify_worker_pending_entries",
+    "Entries delivered to the consumer group but not yet acked.",
+    multiprocess_mode="max",
+)
+RECLAIMED = Counter(
+    "securify_worker_reclaimed_total",
+    "Pending entries re-processed: source=own (startup drain) or claimed (XAUTOCLAIM).",
+    ["source"],
+)
+DEAD_LETTERED = Counter(
+    "securify_worker_dead_lettered_total",
+    "Entries moved to the dead-letter stream after too many deliveries.",
+)
+# Model registry (worker.model_registry).
+MODEL_INFO = Gauge(
+    "securify_worker_model_info",
+    "1 for the model version a worker process is scoring with, 0 for versions it has swapped out.",
+    ["version"],
+    multiprocess_mode="liveall",
+)
+MODEL_SWAPS = Counter(
+    "securify_worker_model_swaps_total",
+    "Model version changes: result=loaded, rolled_back or rejected (failed to load or validate).",
+    ["result"],
+)
+# Per-model scoring; model="primary" or a shadow's name (worker.shadow).
+MODEL_INFERENCE_SECONDS = Histogram(
+    "securify_worker_model_inference_seconds",
+    "decision_function time per feature batch.",
+    ["model"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+MODEL_SCORES = Histogram(
+    "securify_worker_model_scores",
+    "Distribution of decision_function scores (lower is more anomalous).",
+    ["model"],
+    buckets=(-0.3, -0.2, -0.1, -0.05, 0, 0.05, 0.1, 0.15, 0.2, 0.3),
+)
+MODEL_FLAGGED = Counter(
+    "securify_worker_model_flagged_total",
+    "Feature rows scoring below the anomaly threshold.",
+    ["model"],
+)
+SHADOW_COMPARED = Counter(
+    "securify_worker_shadow_compared_total",
+    "Feature rows scored by both the primary and a shadow model.",
+    ["model"],
+)
+SHADOW_DISAGREEMENTS = Counter(
+    "securify_worker_shadow_disagreements_total",
+    "Rows where a shadow model and the primary disagree on anomaly vs normal.",
+    ["model"],
+)
+SHADOW_ERRORS = Counter(
+    "securify_worker_shadow_errors_total",
+    "Feature batches a shadow model failed to score.",
+    ["model"],
+)
+SHADOW_SKIPPED = Counter(
+    "securify_worker_shadow_skipped_total",
+    "Feature batches not shadow-scored because the shadow backlog was full.",
+)
+
+def render() -> tuple[bytes, str]:
+    """
+    Prometheus exposition for the health server. When PROMETHEUS_MULTIPROC_DIR
+    is set (--processes N), the children's metrics are aggregated from there.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -2,15 +2,13 @@ import joblib
 import os
 
 MODEL_PATH = os.environ.get("MODEL_PATH", "/app/model/model.joblib")
-model = None
 
-def load_model():
-    """Loads the ML model from disk into memory."""
-    global model
-    try:
-        model = joblib.load(MODEL_PATH)
-        print(f"Successfully loaded model from {MODEL_PATH}")
-        return model
-    except FileNotFoundError:
-        print(f"Error: Model file not found at {MODEL_PATH}")
-        return None
\ No newline at end of file
+def load_model(path: str = MODEL_PATH, mmap_mode: str = None):
+    """
+    Loads an ML model from disk. With mmap_mode="r", numpy arrays stored in
+    the artifact are memory-mapped read-only instead of copied into the heap,
+    so processes loading the same file share those pages through the page cache.
+    """
+    model = joblib.load(path, mmap_mode=mmap_mode)
+    print(f"Successfully loaded model from {path}")
+    return model
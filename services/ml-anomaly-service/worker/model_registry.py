@@ -0,0 +1,263 @@
+import os
+import re
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from . import metrics, model_loader
+from .compiled_forest import CompiledForest, is_compiled
+
+# Directory of versioned artifacts, one "<version>.joblib" per version. Writers
+# must dump to a dot-prefixed temp name and rename it into place.
+# Unset: only MODEL_PATH is loaded, once.
+MODEL_DIR = os.environ.get("MODEL_DIR", "")
+# Optional Redis key naming the version (a file in MODEL_DIR) every worker should
+# run; set it to roll the fleet forward or back. Unset or missing: newest version wins.
+MODEL_REDIS_KEY = os.environ.get("MODEL_REDIS_KEY", "")
+# Seconds between checks for a new version; 0 disables hot reload.
+MODEL_POLL_INTERVAL = float(os.environ.get("MODEL_POLL_INTERVAL", "30"))
+# Memory-map the artifact's numpy arrays so processes on one host share their pages.
+MODEL_MMAP = os.environ.get("MODEL_MMAP", "true").lower() in ("1", "true", "yes")
+# Score pickled sklearn IsolationForests with the array-based CompiledForest.
+# Artifacts exported by train_model.py are always scored compiled.
+MODEL_COMPILE = os.environ.get("MODEL_COMPILE", "true").lower() in ("1", "true", "yes")
+
+ARTIFACT_SUFFIX = ".joblib"
+
+# Model inputs a candidate must score sensibly before it goes live:
+# (failed logins, file changes) from quiet to clearly abusive.
+VALIDATION_PROBE = np.array([[0, 0], [2, 1], [5, 10], [50, 100]], dtype=np.float64)
+
+class ModelValidationError(Exception):
+    pass
+
+class LoadedModel(NamedTuple):
+    version: str
+    model: object
+    path: str
+    loaded_at: float
+
+def validate_model(model, feature_schema: dict = None):
+    """
+    Raises ModelValidationError unless `model` can score the worker's feature
+    matrix. Models that record the feature schema they were trained on
+    (worker.training) must match `feature_schema` column for column; a
+    different counter window only earns a warning, since the columns still
+    mean the same thing.
+    """
+    trained_on = (getattr(model, "metadata", None) or {}).get("feature_schema")
+    if trained_on and feature_schema:
+        for key in ("version", "features"):
+            if trained_on.get(key) != feature_schema.get(key):
+                raise ModelValidationError(
+                    f"trained on feature schema {key}={trained_on.get(key)!r}, the worker builds {feature_schema.get(key)!r}")
+        for key in ("window_seconds", "window_buckets", "prefilter_min_failed"):
+            if trained_on.get(key) != feature_schema.get(key):
+                print(f"Warning: model trained with {key}={trained_on.get(key)!r}, worker uses {feature_schema.get(key)!r}")
+    if not callable(getattr(model, "decision_function", None)):
+        raise ModelValidationError(f"{type(model).__name__} has no decision_function")
+    n_features = getattr(model, "n_features_in_", VALIDATION_PROBE.shape[1])
+    if n_features != VALIDATION_PROBE.shape[1]:
+        raise ModelValidationError(f"expects {n_features} features, the worker builds {VALIDATION_PROBE.shape[1]}")
+    scores = np.asarray(model.decision_function(VALIDATION_PROBE))
+    if scores.shape != (len(VALIDATION_PROBE),) or not np.all(np.isfinite(scores)):
+        raise ModelValidationError(f"bad scores for the validation probe: {scores!r}")
+
+def version_key(version: str) -> list:
+    """Natural sort key, so "model-10" is newer than "model-9"."""
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"(\d+)", version)]
+
+def list_versions(directory: str) -> dict:
+    """version -> artifact path for every complete artifact in `directory`."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return {}
+    return {
+        name[:-len(ARTIFACT_SUFFIX)]: os.path.join(directory, name)
+        for name in names
+        if name.endswith(ARTIFACT_SUFFIX) and not name.startswith(".")
+    }
+
+class ModelRegistry:
+    """
+    Holds the model the worker scores with and swaps in new versions while it runs.
+
+    A background thread polls for the wanted version: the value of `redis_key`
+    if set, otherwise the newest artifact in `model_dir`. A new version is
+    loaded and validated on that thread, then published with a single
+    reference assignment, so a batch is always scored by one complete model
+    and scoring never waits for a load. The replaced model is kept: if the
+    wanted version goes back to it (the Redis key is reset, or the bad
+    artifact is deleted) it is swapped back in without reloading. Artifacts
+    that fail to load or validate are skipped until the file changes.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, fallback_path: str = model_loader.MODEL_PATH,
+                 redis_client=None, redis_key: str = MODEL_REDIS_KEY,
+                 poll_interval: float = MODEL_POLL_INTERVAL, mmap: bool = MODEL_MMAP,
+                 compile: bool = MODEL_COMPILE, feature_schema: dict = None):
+        self.model_dir = model_dir
+        self.fallback_path = fallback_path
+        self.redis_client = redis_client
+        self.redis_key = redis_key
+        self.poll_interval = poll_interval
+        self.mmap = mmap
+        self.compile = compile
+        self.feature_schema = feature_schema
+        self.active = None
+        self.previous = None
+        self._rejected = {}       # version -> mtime of the artifact that failed
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def model(self):
+        """The model to score the next batch with."""
+        active = self.active
+        return active.model if active is not None else None
+
+    @property
+    def version(self):
+        active = self.active
+        return active.version if active is not None else None
+
+    def wanted_version(self):
+        """(version, path) the registry should be running, or None if there is none."""
+        if self.redis_client is not None and self.redis_key:
+            value = self.redis_client.get(self.redis_key)
+            if value:
+                version = value.decode() if isinstance(value, bytes) else value
+                if os.sep in version or version.startswith("."):
+                    raise ValueError(f"Invalid model version in {self.redis_key}: {version!r}")
+                return version, os.path.join(self.model_dir, version + ARTIFACT_SUFFIX)
+        if self.model_dir:
+            versions = list_versions(self.model_dir)
+            if versions:
+                newest = max(versions, key=version_key)
+                return newest, versions[newest]
+        return None
+
+    def load(self, version: str, path: str) -> LoadedModel:
+        model = model_loader.load_model(path, mmap_mode="r" if self.mmap else None)
+        if is_compiled(model):
+            model = CompiledForest(model)
+        elif self.compile and type(model).__name__ == "IsolationForest":
+            # Compiled in-process: faster to score, but the arrays are private
+            # to this process; ship exported artifacts to share pages.
+            model = CompiledForest.from_sklearn(model)
+        validate_model(model, self.feature_schema)
+        return LoadedModel(version, model, path, time.time())
+
+    def _activate(self, loaded: LoadedModel, result: str):
+        with self._lock:
+            if self.active is not None:
+                metrics.MODEL_INFO.labels(self.active.version).set(0)
+            self.previous, self.active = self.active, loaded
+        metrics.MODEL_INFO.labels(loaded.version).set(1)
+        metrics.MODEL_SWAPS.labels(result).inc()
+
+    def load_initial(self):
+        """
+        Loads the wanted version, or the fallback path when there is none.
+        Returns the model, or None if it could not be loaded.
+        """
+        try:
+            wanted = self.wanted_version()
+        except Exception as e:
+            print(f"Could not resolve the model version ({e}); using {self.fallback_path}.")
+            wanted = None
+        if wanted is None:
+            wanted = (os.path.basename(self.fallback_path).rsplit(".", 1)[0], self.fallback_path)
+        try:
+            self._activate(self.load(*wanted), "loaded")
+        except Exception as e:
+            print(f"Error: could not load model {wanted[0]} from {wanted[1]}: {e}")
+            return None
+        print(f"Model version {self.version} is active.")
+        return self.model
+
+    def rollback(self) -> bool:
+        """Swaps the previous model back in. Returns False if there is none."""
+        previous = self.previous
+        if previous is None:
+            return False
+        self._activate(previous, "rolled_back")
+        print(f"Rolled back to model version {previous.version}.")
+        return True
+
+    def check(self) -> bool:
+        """One poll: moves to the wanted version if it changed. Returns True on a swap."""
+        wanted = self.wanted_version()
+        if wanted is None or wanted[0] == self.version:
+            return False
+        version, path = wanted
+        if self.previous is not None and version == self.previous.version:
+            return self.rollback()
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            print(f"Model version {version} not found at {path}; keeping {self.version}.")
+            return False
+        if self._rejected.get(version) == mtime:
+            return False
+        try:
+            loaded = self.load(version, path)
+        except Exception as e:
+            self._rejected[version] = mtime
+            metrics.MODEL_SWAPS.labels("rejected").inc()
+            print(f"Rejected model version {version}: {e}; keeping {self.version}.")
+            return False
+        self._activate(loaded, "loaded")
+        print(f"Swapped in model version {version} (previous: {self.previous.version}).")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Model registry check failed: {e}")
+
+    def start(self):
+        """
+        Starts the watcher thread. Safe to call again after fork(): the
+        child gets its own thread, the parent's does not survive the fork.
+        """
+        if self.poll_interval <= 0 or not self.model_dir:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self) -> dict:
+        """Active and previous versions, for the health server."""
+        active, previous = self.active, self.previous
+        return {
+            "version": active.version if active else None,
+            "path": active.path if active else None,
+            "loaded_at": active.loaded_at if active else None,
+            "previous_version": previous.version if previous else None,
+            "mmap": self.mmap,
+            "scorer": type(active.model).__name__ if active else None,
+            "trained_at": (getattr(active.model, "metadata", None) or {}).get("trained_at") if active else None,
+        }
+
+def create_registry(redis_host: str, feature_schema: dict = None) -> ModelRegistry:
+    """A registry configured from the environment (MODEL_DIR, MODEL_REDIS_KEY, ...)."""
+    redis_client = None
+    if MODEL_REDIS_KEY:
+        import redis
+        redis_client = redis.Redis(host=redis_host, port=6379, socket_timeout=5)
+    return ModelRegistry(redis_client=redis_client, feature_schema=feature_schema)
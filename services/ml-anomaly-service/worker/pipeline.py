@@ -0,0 +1,105 @@
+import asyncio
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import ANOMALIES_REPORTED, BATCH_SECONDS, EVENTS_PROCESSED, QUEUE_DEPTH, STAGE_SECONDS
+
+class Batch:
+    """One batch moving through the pipeline, with its stage timestamps."""
+    __slots__ = ("events", "reports", "read_at", "queued_at")
+
+    def __init__(self, events: list, read_at: float):
+        self.events = events
+        self.reports = []
+        self.read_at = read_at
+        self.queued_at = time.perf_counter()
+
+class BatchPipeline:
+    """
+    Three-stage worker pipeline so Redis I/O and HTTP reporting overlap with
+    CPU-bound scoring instead of stalling behind it:
+
+      read   -> awaits read_batch() (XREADGROUP) and queues the next batch
+      score  -> runs score(events) in a worker thread, off the event loop
+      finish -> awaits finish(events, reports) (report + XACK)
+
+    Stages are connected by bounded queues of `depth` batches, so a slow stage
+    applies backpressure upstream instead of buffering unbounded work. The
+    score stage runs one batch at a time, which keeps per-consumer state such
+    as the sliding-window stats single-threaded; use --processes for more cores.
+    """
+
+    def __init__(self, read_batch, score, finish, depth: int = 2, after_score=None, heartbeat=None):
+        self.read_batch = read_batch
+        self.score = score
+        self.finish = finish
+        self.after_score = after_score
+        self.heartbeat = heartbeat
+        self._read = asyncio.Queue(maxsize=depth)
+        self._scored = asyncio.Queue(maxsize=depth)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scorer")
+
+    async def _reader(self):
+        while True:
+            if self.heartbeat is not None:
+                self.heartbeat()
+            start = time.perf_counter()
+            events = await self.read_batch()
+            if not events:
+                continue
+            STAGE_SECONDS.labels("read").observe(time.perf_counter() - start)
+            await self._read.put(Batch(events, start))
+            QUEUE_DEPTH.labels("read").set(self._read.qsize())
+
+    async def _scorer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._read.get()
+            QUEUE_DEPTH.labels("read").set(self._read.qsize())
+            start = time.perf_counter()
+            STAGE_SECONDS.labels("queue_wait").observe(start - batch.queued_at)
+            try:
+                batch.reports = await loop.run_in_executor(self._executor, self.score, batch.events)
+            except Exception as e:
+                # Left unacked: the entries stay pending for recovery.
+                print(f"Scoring failed for batch of {len(batch.events)} events: {e}")
+                traceback.print_exc()
+                continue
+            STAGE_SECONDS.labels("score").observe(time.perf_counter() - start)
+            batch.queued_at = time.perf_counter()
+            await self._scored.put(batch)
+            QUEUE_DEPTH.labels("scored").set(self._scored.qsize())
+            if self.after_score is not None:
+                await self.after_score()
+
+    async def _finisher(self):
+        while True:
+            batch = await self._scored.get()
+            QUEUE_DEPTH.labels("scored").set(self._scored.qsize())
+            start = time.perf_counter()
+            try:
+                await self.finish(batch.events, batch.reports)
+            except Exception as e:
+                print(f"Finishing batch of {len(batch.events)} events failed: {e}")
+                traceback.print_exc()
+                continue
+            end = time.perf_counter()
+            STAGE_SECONDS.labels("report").observe(end - start)
+            BATCH_SECONDS.observe(end - batch.read_at)
+            EVENTS_PROCESSED.inc(len(batch.events))
+            ANOMALIES_REPORTED.inc(len(batch.reports))
+
+    async def run(self):
+        """Runs all stages until cancelled or one of them fails."""
+        tasks = [
+            asyncio.create_task(self._reader(), name="pipeline-read"),
+            asyncio.create_task(self._scorer(), name="pipeline-score"),
+            asyncio.create_task(self._finisher(), name="pipeline-finish"),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._executor.shutdown(wait=False)
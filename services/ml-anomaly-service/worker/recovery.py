@@ -0,0 +1,116 @@
+import time
+from .metrics import DEAD_LETTERED, PENDING_ENTRIES, RECLAIMED
+
+class PendingRecovery:
+    """
+    Feeds stream entries that were delivered but never acked back into the
+    normal batch path.
+
+    On startup the consumer first re-reads its own pending entries list (PEL)
+    with XREADGROUP id "0": whatever it was processing when the previous
+    process died. After that, every `interval` seconds, XAUTOCLAIM takes over
+    entries that have been idle for `min_idle_ms` from any consumer in the
+    group (crashed pods, or batches of ours that failed scoring). Entries
+    delivered `max_deliveries` times or more are moved to `dead_letter_stream`
+    and acked instead of being retried forever.
+    """
+
+    def __init__(self, r, stream: str, group: str, consumer: str, count: int = 500,
+                 min_idle_ms: int = 60000, interval: float = 30,
+                 max_deliveries: int = 5, dead_letter_stream: str = "events:dead"):
+        self.r = r
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.count = count
+        self.min_idle_ms = min_idle_ms
+        self.interval = interval
+        self.max_deliveries = max_deliveries
+        self.dead_letter_stream = dead_letter_stream
+        self._own_cursor = b"0"      # None once our own PEL has been drained
+        self._claim_cursor = b"0-0"
+        self._next_claim = 0.0
+
+    async def next_batch(self) -> list:
+        """
+        Returns the next batch of recovered entries, or [] when there is
+        nothing to recover right now and the caller should read new entries.
+        """
+        while self._own_cursor is not None:
+            entries = await self._read_own()
+            if entries:
+                return entries
+        if time.monotonic() < self._next_claim:
+            return []
+        entries = await self._claim()
+        if self._claim_cursor == b"0-0":
+            # Full pass over the PEL done; wait before scanning it again.
+            self._next_claim = time.monotonic() + self.interval
+            await self._update_pending_gauge()
+        return entries
+
+    async def _read_own(self) -> list:
+        events_raw = await self.r.xreadgroup(
+            self.group, self.consumer, {self.stream: self._own_cursor}, count=self.count)
+        entries = events_raw[0][1] if events_raw else []
+        if not entries:
+            self._own_cursor = None
+            return []
+        self._own_cursor = entries[-1][0]
+        entries = await self._filter(entries)
+        RECLAIMED.labels("own").inc(len(entries))
+        return entries
+
+    async def _claim(self) -> list:
+        result = await self.r.xautoclaim(
+            self.stream, self.group, self.consumer,
+            min_idle_time=self.min_idle_ms, start_id=self._claim_cursor, count=self.count)
+        # Redis 7 also returns IDs deleted from the stream; it drops those from the PEL itself.
+        self._claim_cursor, entries = result[0], result[1]
+        entries = await self._filter(entries)
+        RECLAIMED.labels("claimed").inc(len(entries))
+        return entries
+
+    async def _filter(self, entries: list) -> list:
+        """
+        Acks entries whose payload was trimmed from the stream and dead-letters
+        entries that were delivered too often. Returns the ones to process.
+        """
+        gone = [entry_id for entry_id, data in entries if not data]
+        entries = [(entry_id, data) for entry_id, data in entries if data]
+        if gone:
+            await self.r.xack(self.stream, self.group, *gone)
+        if not entries:
+            return []
+
+        # One lookup per ID: a range query could be filled up by our other
+        # pending entries (batches in flight) interleaved with these.
+        async with self.r.pipeline(transaction=False) as pipe:
+            for entry_id, _ in entries:
+                pipe.xpending_range(self.stream, self.group, min=entry_id, max=entry_id,
+                                    count=1, consumername=self.consumer)
+            pending = await pipe.execute()
+        deliveries = {p["message_id"]: p["times_delivered"] for found in pending for p in found}
+        dead = [(entry_id, data) for entry_id, data in entries
+                if deliveries.get(entry_id, 0) >= self.max_deliveries]
+        if not dead:
+            return entries
+
+        async with self.r.pipeline(transaction=True) as pipe:
+            for entry_id, data in dead:
+                pipe.xadd(self.dead_letter_stream, {
+                    **data,
+                    b"original_id": entry_id,
+                    b"deliveries": deliveries[entry_id],
+                    b"consumer": self.consumer,
+                })
+            pipe.xack(self.stream, self.group, *(entry_id for entry_id, _ in dead))
+            await pipe.execute()
+        DEAD_LETTERED.inc(len(dead))
+        print(f"Moved {len(dead)} entries delivered {self.max_deliveries}+ times to '{self.dead_letter_stream}'.")
+        dead_ids = {entry_id for entry_id, _ in dead}
+        return [entry for entry in entries if entry[0] not in dead_ids]
+
+    async def _update_pending_gauge(self):
+        summary = await self.r.xpending(self.stream, self.group)
+        PENDING_ENTRIES.set(summary["pending"])
@@ -1,33 +1,50 @@
 import redis.asyncio as redis_async
 import redis
 import os
+import argparse
 import asyncio
 import aiohttp
-import orjson
-import pandas as pd
+import datetime
+import time
 import traceback
-import numpy as np
-from . import health_server, model_loader
-from jose import jwt
+from .supervisor import Supervisor, prepare_metrics_dir
+
+# prometheus_client picks single- or multi-process mode when it is first
+# imported (by .metrics below), so --processes N sets up its directory first.
+PROCESS_ARGS = argparse.ArgumentParser(add_help=False)
+PROCESS_ARGS.add_argument(
+    "--processes", type=int, default=int(os.environ.get("WORKER_PROCESSES", "1")),
+    help="Number of consumer processes to fork (default: 1, single asyncio loop)",
+)
+if __name__ == "__main__":
+    prepare_metrics_dir(PROCESS_ARGS.parse_known_args()[0].processes)
+
+from . import detectors, features, health_server, metrics, model_registry, shadow
+from .ip_stats import IPStatsStore, write_snapshot
+from .model_registry import ModelRegistry
+from .pipeline import BatchPipeline
+from .recovery import PendingRecovery
+from .token_manager import TokenManager
 
 # Config
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 API_HOST = os.environ.get("API_HOST", "http://event-ingest-stream-svc:8000")
-API_URL = f"{API_HOST}/api/v1/anomaly"
+API_URL = f"{API_HOST}/api/v1/anomalies/bulk"
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
 
 if not SECRET_KEY:
     raise ValueError("No JWT_SECRET_KEY set. Application cannot start securely.")
 
 ALGORITHM = "HS256"
+TOKEN_TTL = int(os.environ.get("WORKER_TOKEN_TTL", "3600"))
 
 # -- Token Management --
+# One token is shared by every report and refreshed shortly before it expires.
+token_manager = TokenManager(SECRET_KEY, "ml-worker", "report_anomaly", ttl=TOKEN_TTL, algorithm=ALGORITHM)
+
 def create_token():
-    payload = {
-        "sub": "ml-worker",
-        "scope": "report_anomaly"
-    }
-    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    """Returns the worker's current service token."""
+    return token_manager.token
 
 # -- Constants --
 STREAM_NAME = "events:raw"
@@ -35,12 +52,45 @@ CONSUMER_GROUP = "ml-workers"
 CONSUMER_NAME = os.environ.get("HOSTNAME", "local-worker-1")
 BATCH_SIZE = 500  # Increased batch size for async efficiency
 BLOCK_MS = 2000
+# Batches buffered between pipeline stages (read -> score -> report/ack).
+PIPELINE_DEPTH = int(os.environ.get("PIPELINE_DEPTH", "2"))
+
+# -- Pending-entry recovery --
+# Entries unacked for this long (crashed consumer, failed batch) are claimed and retried.
+RECLAIM_IDLE_MS = int(os.environ.get("PEL_RECLAIM_IDLE_MS", "60000"))
+RECLAIM_INTERVAL = float(os.environ.get("PEL_RECLAIM_INTERVAL", "30"))
+# Entries delivered this many times go to the dead-letter stream instead.
+MAX_DELIVERIES = int(os.environ.get("PEL_MAX_DELIVERIES", "5"))
+DEAD_LETTER_STREAM = os.environ.get("DEAD_LETTER_STREAM", "events:dead")
+
+# -- Sliding-window per-IP stats --
+# Counters persist across batches so failures spread over many batches still add up.
+# IP_STATS_WINDOW_SECONDS=0 falls back to per-batch features only.
+STATS_WINDOW_SECONDS = float(os.environ.get("IP_STATS_WINDOW_SECONDS", "600"))
+STATS_BUCKETS = int(os.environ.get("IP_STATS_BUCKETS", "10"))
+STATS_MAX_IPS = int(os.environ.get("IP_STATS_MAX_IPS", "1000000"))
+# Snapshots let a restarted worker resume warm; interval 0 disables them.
+# "{slot}" is replaced by the consumer's process index (0 without --processes),
+# which survives pod rescheduling where the pod name doesn't. Replicas share
+# slot keys: every consumer sees a random share of the stream, so any
+# replica's snapshot is as good a warm start as its own. Snapshots expire
+# after one window. "{consumer}" (the consumer name) is also accepted.
+STATS_SNAPSHOT_KEY = os.environ.get("IP_STATS_SNAPSHOT_KEY", "ml:ip_stats:{slot}")
+STATS_SNAPSHOT_INTERVAL = float(os.environ.get("IP_STATS_SNAPSHOT_INTERVAL", "60"))
+# With a window, a key stays over the threshold for as long as it keeps
+# attacking; it is reported again only after this many seconds (default: one window).
+REPORT_COOLDOWN_SECONDS = float(os.environ.get("REPORT_COOLDOWN_SECONDS", str(STATS_WINDOW_SECONDS)))
+
+# decision_function scores below this are reported as anomalies.
+ANOMALY_THRESHOLD = 0.1
 
-# -- Stats for Z-Score --
-# Simple in-memory stats for demonstration. 
-# In production, this might be stored in Redis for persistence across restarts.
-IP_STATS = {} 
-STATS_WINDOW = 50 # Keep last N stats per IP
+# Candidate models scored alongside the primary (SHADOW_MODELS); set up in main().
+shadow_scorer = None
+
+ip_stats = IPStatsStore(STATS_WINDOW_SECONDS, STATS_BUCKETS, STATS_MAX_IPS) if STATS_WINDOW_SECONDS > 0 else None
+# Per-username / user_id / path-prefix detectors (KEYED_DETECTORS), on the same window.
+keyed_detectors = detectors.create_detectors(window_seconds=STATS_WINDOW_SECONDS, n_buckets=STATS_BUCKETS,
+                                             max_keys=STATS_MAX_IPS, cooldown=REPORT_COOLDOWN_SECONDS)
 
 async def create_consumer_group(r: redis_async.Redis):
     try:
@@ -52,147 +102,240 @@ async def create_consumer_group(r: redis_async.Redis):
         else:
             raise
 
-async def report_anomaly_async(session: aiohttp.ClientSession, report: dict):
-    """Fire-and-forget anomaly report (we just log errors)."""
-    headers = {"Authorization": f"Bearer {create_token()}", "Content-Type": "application/json"}
+async def report_anomalies_async(session: aiohttp.ClientSession, reports: list):
+    """Reports a batch's anomalies in one bulk call (we just log errors)."""
     try:
         # Use aiohttp for non-blocking HTTP request
-        async with session.post(API_URL, json=report, headers=headers) as resp:
+        async with session.post(API_URL, json=reports, headers=token_manager.headers) as resp:
             if resp.status not in (200, 201):
                 text = await resp.text()
-                print(f"Failed to report anomaly: {resp.status} - {text}")
-            else:
-                # Optional: print specific confirmation only for debug
-                pass
+                print(f"Failed to report {len(reports)} anomalies: {resp.status} - {text}")
     except Exception as e:
-        print(f"Error reporting anomaly: {e}")
-
-async def process_batch(events: list, model, session: aiohttp.ClientSession):
-    parsed_data = []
-    
-    # 1. Faster Parsing with orjson
-    for _id, data in events:
-        try:
-            # redis-py returns dict for data. Key might be bytes or str depending on decode_responses.
-            # We used decode_responses=False for the redis client, so keys/values are bytes.
-            payload = data.get(b'data') or data.get('data')
-            event_json = orjson.loads(payload)
-            parsed_data.append(event_json)
-        except Exception as e:
-            print(f"Skipping malformed event {_id}: {e}")
-            continue
+        print(f"Error reporting anomalies: {e}")
 
+def detect_anomalies(events: list, model, stats: IPStatsStore = None,
+                     shadow_scorer: shadow.ShadowScorer = None, keyed: list = ()) -> list:
+    """
+    CPU-bound half of batch processing: parse, aggregate per IP, score.
+    With a stats store, IPs are scored on their sliding-window totals rather
+    than on this batch alone. With a shadow scorer, the same feature matrix
+    is handed to the shadow models in the background. The keyed detectors
+    get the same parsed events, split by event type once. Returns the
+    anomaly reports to send (from `model` and the keyed detectors).
+    """
+    parsed_data = features.parse_events(events)
     if not parsed_data:
-        return
+        return []
 
-    # 2. Optimized DataFrame Creation
-    df = pd.DataFrame(parsed_data)
-
-    # 3. Process LOGIN_ATTEMPT
-    if 'event_type' in df.columns:
-        # Filter in pandas is fast
-        login_mask = df['event_type'] == 'LOGIN_ATTEMPT'
-        if login_mask.any():
-            login_df = df[login_mask].copy()
-            
-            # Vectorized bool conversion
-            login_df['success'] = login_df['success'].astype(bool)
-            
-            # Aggregation
-            features_df = login_df.groupby('source_ip').agg(
-                total_logins=('event_id', 'count'),
-                failed_logins=('success', lambda x: (~x).sum())
-            )
-
-            # --- optimization: Statistical Pre-filter ---
-            suspicious_candidates = features_df[features_df['failed_logins'] > 2].copy()
-            
-            if not suspicious_candidates.empty:
-                # Feature Engineering
-                suspicious_candidates['dummy_file_changes'] = suspicious_candidates['failed_logins'] / 2.0
-                X_predict = suspicious_candidates[['failed_logins', 'dummy_file_changes']].to_numpy() # Use numpy array
-                
-                # ML Inference
-                scores = model.decision_function(X_predict)
-                
-                tasks = []
-                for (ip, row), score in zip(suspicious_candidates.iterrows(), scores):
-                    # Anomaly threshold
-                    if score < 0.1:
-                        print(f"ANOMALY DETECTED! IP: {ip}, Score: {score}")
-                        report = {
-                            "source_ip": str(ip),
-                            "score": float(1 - (score + 1) / 2),
-                            "event_type": "AGG_LOGIN_FAIL",
-                            "timestamp": pd.Timestamp.now().isoformat(),
-                            "details": row.to_dict()
-                        }
-                        # Add reporting task
-                        tasks.append(report_anomaly_async(session, report))
-                
-                # Run all reports concurrently
-                if tasks:
-                    await asyncio.gather(*tasks)
-
-async def main():
-    print("Starting Optimized ML Anomaly Worker (Async)...")
-    health_server.start_server()
+    now = time.time()
+    timestamp = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).isoformat()
+    reports = detect_ip_anomalies(parsed_data, model, stats, shadow_scorer, timestamp, now)
+    if keyed:
+        by_type = features.split_by_event_type(parsed_data)
+        for detector in keyed:
+            reports.extend(detector.detect(by_type, timestamp, now))
+    return reports
 
-    # Load model
-    model = model_loader.load_model()
-    if model is None:
-        print("Fatal: Could not load model. Exiting.")
-        return
-    health_server.MODEL_IS_READY = True
+def detect_ip_anomalies(parsed_data: list, model, stats: IPStatsStore, shadow_scorer: shadow.ShadowScorer,
+                        timestamp: str, now: float) -> list:
+    """
+    Per-IP login features scored by the model. With a stats store, an IP is
+    reported at most once per REPORT_COOLDOWN_SECONDS.
+    """
+    activity = features.extract_ip_activity(parsed_data)
+    counts = activity.counts
+    if stats is not None:
+        counts = stats.window_totals(stats.update(activity.ips, counts, now))
+    login_features = features.login_features_from_counts(activity.ips, counts)
+    # Statistical pre-filter, then the model input is built straight from arrays
+    candidates, X_predict = features.build_login_matrix(login_features)
+    if not len(candidates):
+        return []
+
+    start = time.perf_counter()
+    scores = model.decision_function(X_predict)
+    metrics.MODEL_INFERENCE_SECONDS.labels("primary").observe(time.perf_counter() - start)
+    if shadow_scorer is not None:
+        shadow_scorer.submit(X_predict, scores)
+
+    reports = []
+    for idx, score in zip(candidates, scores):
+        # Anomaly threshold
+        if score < ANOMALY_THRESHOLD:
+            ip = login_features.ips[idx]
+            if stats is not None and not stats.claim_report(ip, now, REPORT_COOLDOWN_SECONDS):
+                metrics.REPORTS_SUPPRESSED.labels("ip").inc()
+                continue
+            print(f"ANOMALY DETECTED! IP: {ip}, Score: {score}")
+            reports.append({
+                "source_ip": str(ip),
+                "score": float(1 - (score + 1) / 2),
+                "event_type": "AGG_LOGIN_FAIL",
+                "timestamp": timestamp,
+                "details": {
+                    "total_logins": int(login_features.total_logins[idx]),
+                    "failed_logins": int(login_features.failed_logins[idx]),
+                    "file_changes": int(login_features.file_changes[idx]),
+                },
+            })
+    return reports
+
+async def process_batch(events: list, model, session: aiohttp.ClientSession):
+    reports = detect_anomalies(events, model, ip_stats, shadow_scorer, keyed_detectors)
+    # One bulk call per batch instead of one request per IP
+    if reports:
+        await report_anomalies_async(session, reports)
+
+async def consume(registry: ModelRegistry, consumer_name: str = CONSUMER_NAME, heartbeat=None, slot: int = 0):
+    """
+    Reads batches for `consumer_name` from the consumer group until cancelled,
+    through the read -> score -> report/ack pipeline, scoring with the
+    registry's active model. `heartbeat`, if given, is called after every
+    read (multi-process mode); `slot` is the consumer's process index.
+    """
+    token_manager.start()
+    # Watch for new model versions (in forked children, a thread of their own)
+    registry.start()
+    if registry.version is not None:
+        # A forked child's gauges start empty in multiprocess mode; publish the version it scores with.
+        metrics.MODEL_INFO.labels(registry.version).set(1)
+    snapshot_key = STATS_SNAPSHOT_KEY.format(slot=slot, consumer=consumer_name)
 
     # Reuse session
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(headers={"Content-Type": "application/json"}) as session:
         # Async Redis
         r = redis_async.Redis(host=REDIS_HOST, port=6379, decode_responses=False)
         
         try:
             await r.ping()
             await create_consumer_group(r)
-            print("Connected to Redis (Async).")
+            print(f"Connected to Redis (Async) as consumer '{consumer_name}'.")
         except Exception as e:
             print(f"Redis connection failed: {e}")
             return
 
-        while True:
+        if ip_stats is not None and STATS_SNAPSHOT_INTERVAL > 0:
+            restored = await ip_stats.load_snapshot(r, snapshot_key)
+            print(f"Restored sliding-window stats for {restored} IPs.")
+            for detector in keyed_detectors:
+                restored = await detector.stats.load_snapshot(r, f"{snapshot_key}:{detector.name}")
+                print(f"Restored sliding-window stats for {restored} {detector.name} keys.")
+        last_snapshot = time.monotonic()
+
+        # Our own unacked entries first, then periodic XAUTOCLAIM of idle ones
+        recovery = PendingRecovery(
+            r, STREAM_NAME, CONSUMER_GROUP, consumer_name, count=BATCH_SIZE,
+            min_idle_ms=RECLAIM_IDLE_MS, interval=RECLAIM_INTERVAL,
+            max_deliveries=MAX_DELIVERIES, dead_letter_stream=DEAD_LETTER_STREAM,
+        )
+
+        async def read_batch():
             try:
+                recovered = await recovery.next_batch()
+                if recovered:
+                    return recovered
                 # Blocking read
                 events_raw = await r.xreadgroup(
                     CONSUMER_GROUP,
-                    CONSUMER_NAME,
+                    consumer_name,
                     {STREAM_NAME: ">"},
                     count=BATCH_SIZE,
                     block=BLOCK_MS
                 )
-
-                if not events_raw:
-                    continue
-
-                events = events_raw[0][1]
-
-                if events:
-                    await process_batch(events, model, session)
-                    
-                    event_ids = [e[0] for e in events]
-                    # Async ack
-                    await r.xack(STREAM_NAME, CONSUMER_GROUP, *event_ids)
-                    if len(events) > 10: # Only log big batches to reduce noise
-                        print(f"Processed batch of {len(events)} events.")
-
             except redis.exceptions.ConnectionError:
                 print("Redis connection lost. Retrying in 5s...")
                 await asyncio.sleep(5)
+                return []
             except Exception as e:
                 print(f"Unexpected error: {e}")
                 traceback.print_exc()
                 await asyncio.sleep(1)
+                return []
+            return events_raw[0][1] if events_raw else []
+
+        def score(events):
+            # Read the registry once per batch: a swap takes effect on the next batch
+            return detect_anomalies(events, registry.model, ip_stats, shadow_scorer, keyed_detectors)
+
+        async def finish(events, reports):
+            # One bulk call per batch instead of one request per IP
+            if reports:
+                await report_anomalies_async(session, reports)
+            event_ids = [e[0] for e in events]
+            # Async ack
+            await r.xack(STREAM_NAME, CONSUMER_GROUP, *event_ids)
+            if len(events) > 10: # Only log big batches to reduce noise
+                print(f"Processed batch of {len(events)} events.")
+
+        async def write_snapshots(snapshots):
+            try:
+                for key, snapshot, window_seconds in snapshots:
+                    await write_snapshot(r, key, snapshot, ttl=window_seconds)
+            except redis.exceptions.RedisError as e:
+                print(f"Failed to snapshot IP stats: {e}")
+
+        snapshot_task = None
+
+        async def snapshot_if_due():
+            # Runs between batches in the score stage, so the stats are not being
+            # mutated while they are copied; the copies are written in the background.
+            nonlocal last_snapshot, snapshot_task
+            if ip_stats is not None and STATS_SNAPSHOT_INTERVAL > 0 \
+                    and time.monotonic() - last_snapshot >= STATS_SNAPSHOT_INTERVAL \
+                    and (snapshot_task is None or snapshot_task.done()):
+                snapshots = [(snapshot_key, ip_stats.snapshot(), ip_stats.window_seconds)]
+                snapshots += [(f"{snapshot_key}:{detector.name}", detector.stats.snapshot(),
+                               detector.stats.window_seconds) for detector in keyed_detectors]
+                snapshot_task = asyncio.create_task(write_snapshots(snapshots))
+                last_snapshot = time.monotonic()
+
+        # Prefetch the next batch while the current one is scored and reported
+        pipeline = BatchPipeline(
+            read_batch, score, finish,
+            depth=PIPELINE_DEPTH, after_score=snapshot_if_due, heartbeat=heartbeat,
+        )
+        await pipeline.run()
+
+def _run_consumer_process(registry):
+    def target(index, consumer_name, heartbeat):
+        try:
+            asyncio.run(consume(registry, consumer_name, heartbeat, slot=index))
+        except KeyboardInterrupt:
+            pass
+    return target
+
+def main(argv=None):
+    global shadow_scorer
+    parser = argparse.ArgumentParser(description="Securify AI ML anomaly worker", parents=[PROCESS_ARGS])
+    args = parser.parse_args(argv)
+
+    print("Starting Optimized ML Anomaly Worker (Async)...")
+    health_server.start_server()
+
+    # Load model once; in multi-process mode the children share it copy-on-write
+    registry = model_registry.create_registry(REDIS_HOST, features.feature_schema(STATS_WINDOW_SECONDS, STATS_BUCKETS))
+    if registry.load_initial() is None:
+        print("Fatal: Could not load model. Exiting.")
+        return
+    shadow_scorer = shadow.create_shadow_scorer(registry, ANOMALY_THRESHOLD)
+    health_server.MODEL_IS_READY = True
+    shadows = list(shadow_scorer.models) if shadow_scorer is not None else []
+    health_server.MODEL_STATUS_PROVIDER = lambda: {**registry.status(), "shadows": shadows}
+
+    if args.processes <= 1:
+        asyncio.run(consume(registry))
+        return
+
+    # The supervisor keeps its registry current too, so restarted children
+    # are forked with the latest model already loaded.
+    registry.start()
+    print(f"Forking {args.processes} consumers in group '{CONSUMER_GROUP}'...")
+    supervisor = Supervisor(_run_consumer_process(registry), args.processes, CONSUMER_NAME)
+    health_server.STATUS_PROVIDER = supervisor.status
+    supervisor.run()
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        main()
     except KeyboardInterrupt:
-        print("Worker stopped.")
\ No newline at end of file
+        print("Worker stopped.")
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import metrics
+
+# Candidate models scored alongside the primary, comma-separated: versions in
+# MODEL_DIR or paths to .joblib artifacts. Their scores never produce reports.
+SHADOW_MODELS = os.environ.get("SHADOW_MODELS", "")
+# Feature batches allowed to wait for shadow scoring. Further batches are
+# skipped (and counted) rather than queued, so shadows can fall behind but
+# never hold up the primary path.
+SHADOW_MAX_PENDING = int(os.environ.get("SHADOW_MAX_PENDING", "4"))
+
+class ShadowScorer:
+    """
+    Scores the primary model's feature matrices with candidate models in a
+    background thread and records how they compare, per model:
+
+      securify_worker_model_scores             score distribution (primary too)
+      securify_worker_model_inference_seconds  decision_function latency
+      securify_worker_model_flagged_total      rows scoring below the threshold
+      securify_worker_shadow_disagreements_total / _compared_total
+                                               rows where a shadow and the
+                                               primary disagree on anomaly or not
+
+    submit() only hands the matrix over; the primary's reports are built from
+    its own scores whatever the shadows say.
+    """
+
+    def __init__(self, models: dict, threshold: float, max_pending: int = SHADOW_MAX_PENDING):
+        self.models = models
+        self.threshold = threshold
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive fork(); each consumer process starts its own.
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+            self._pending = 0
+            self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, X: np.ndarray, primary_scores: np.ndarray):
+        """Queues one feature batch for the shadows. Returns the future, or None if skipped."""
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                metrics.SHADOW_SKIPPED.inc()
+                return None
+            self._pending += 1
+        future = executor.submit(self._score, X, primary_scores)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def _score(self, X: np.ndarray, primary_scores: np.ndarray):
+        self._observe("primary", primary_scores)
+        primary_flags = primary_scores < self.threshold
+        for name, model in self.models.items():
+            start = time.perf_counter()
+            try:
+                scores = model.decision_function(X)
+            except Exception as e:
+                metrics.SHADOW_ERRORS.labels(name).inc()
+                print(f"Shadow model {name} failed on a batch of {len(X)}: {e}")
+                continue
+            metrics.MODEL_INFERENCE_SECONDS.labels(name).observe(time.perf_counter() - start)
+            self._observe(name, scores)
+            metrics.SHADOW_COMPARED.labels(name).inc(len(X))
+            metrics.SHADOW_DISAGREEMENTS.labels(name).inc(int(np.count_nonzero((scores < self.threshold) != primary_flags)))
+
+    def _observe(self, name: str, scores: np.ndarray):
+        histogram = metrics.MODEL_SCORES.labels(name)
+        for score in scores.tolist():
+            histogram.observe(score)
+        metrics.MODEL_FLAGGED.labels(name).inc(int(np.count_nonzero(scores < self.threshold)))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+def shadow_artifact(name: str, model_dir: str) -> str:
+    """Artifact path for a SHADOW_MODELS entry: a path as-is, else a version in model_dir."""
+    if name.endswith(".joblib") or os.sep in name:
+        return name
+    return os.path.join(model_dir, name + ".joblib")
+
+def create_shadow_scorer(registry, threshold: float, names: str = SHADOW_MODELS):
+    """
+    Loads and validates the SHADOW_MODELS through the registry's loader.
+    Returns None when no shadows are configured or none could be loaded.
+    """
+    models = {}
+    for name in filter(None, (n.strip() for n in names.split(","))):
+        path = shadow_artifact(name, registry.model_dir)
+        try:
+            models[name] = registry.load(name, path).model
+        except Exception as e:
+            print(f"Skipping shadow model {name} ({path}): {e}")
+    if not models:
+        return None
+    print(f"Shadow scoring with: {', '.join(models)}")
+    return ShadowScorer(models, threshold)
@@ -0,0 +1,151 @@
+import gc
+import glob
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+
+# Children that have not reported progress for this long are considered hung.
+HEARTBEAT_TIMEOUT = float(os.environ.get("WORKER_HEARTBEAT_TIMEOUT", "60"))
+# Minimum delay between restarts of the same child, to avoid crash loops.
+RESTART_BACKOFF = float(os.environ.get("WORKER_RESTART_BACKOFF", "2"))
+
+def prepare_metrics_dir(processes: int):
+    """
+    For `processes` > 1, points prometheus_client at PROMETHEUS_MULTIPROC_DIR
+    (a temp directory unless already set), emptied of an earlier run's files.
+    Must run before prometheus_client is first imported, which is when it
+    picks single- or multi-process mode.
+    """
+    if processes <= 1:
+        return
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "securify-worker-metrics")
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+class Supervisor:
+    """
+    Runs N consumer processes in the same consumer group and keeps them alive.
+
+    Children are forked after the model is loaded (and the GC heap frozen), so
+    the model's pages are shared copy-on-write instead of loaded N times. Each
+    child writes a heartbeat into shared memory after every read loop; the
+    supervisor restarts children that exit or stop heartbeating, and exposes
+    a combined status for the health server. Their metrics go to the
+    PROMETHEUS_MULTIPROC_DIR set up by prepare_metrics_dir(), which the
+    health server's /metrics aggregates.
+    """
+
+    def __init__(self, target, processes: int, consumer_prefix: str):
+        # target(index, consumer_name, heartbeat) runs one consumer until it exits.
+        self.target = target
+        self.processes = processes
+        self.consumer_prefix = consumer_prefix
+        self._ctx = multiprocessing.get_context("fork")
+        self._heartbeats = self._ctx.Array("d", processes, lock=False)
+        self._children = [None] * processes
+        self._started_at = [0.0] * processes
+        self._restarts = [0] * processes
+        self._stopping = False
+
+    def consumer_name(self, index: int) -> str:
+        return f"{self.consumer_prefix}-{index}"
+
+    def _heartbeat_fn(self, index: int):
+        heartbeats = self._heartbeats
+
+        def heartbeat():
+            heartbeats[index] = time.time()
+        return heartbeat
+
+    def _run_child(self, index: int, consumer_name: str, heartbeat):
+        # Forked children inherit the supervisor's handlers; give them the defaults back.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        self.target(index, consumer_name, heartbeat)
+
+    def _start(self, index: int):
+        self._heartbeats[index] = time.time()
+        proc = self._ctx.Process(
+            target=self._run_child,
+            args=(index, self.consumer_name(index), self._heartbeat_fn(index)),
+            name=self.consumer_name(index),
+        )
+        proc.start()
+        self._children[index] = proc
+        self._started_at[index] = time.monotonic()
+        print(f"Started consumer {self.consumer_name(index)} (pid {proc.pid}).")
+
+    def _check(self, index: int):
+        proc = self._children[index]
+        hung = time.time() - self._heartbeats[index] > HEARTBEAT_TIMEOUT
+        if proc.is_alive() and not hung:
+            return
+        if time.monotonic() - self._started_at[index] < RESTART_BACKOFF:
+            return
+        if proc.is_alive():
+            print(f"Consumer {self.consumer_name(index)} stopped heartbeating; killing it.")
+            proc.kill()
+        proc.join(timeout=5)
+        self._mark_dead(proc)
+        print(f"Consumer {self.consumer_name(index)} exited (code {proc.exitcode}); restarting.")
+        self._restarts[index] += 1
+        self._start(index)
+
+    def _mark_dead(self, proc):
+        # Drops the child's live gauges (queue depth, model info) from /metrics.
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(proc.pid)
+
+    def status(self) -> dict:
+        """Combined health of all children, for the health server."""
+        now = time.time()
+        workers = []
+        for index, proc in enumerate(self._children):
+            alive = proc is not None and proc.is_alive()
+            age = now - self._heartbeats[index]
+            workers.append({
+                "consumer": self.consumer_name(index),
+                "pid": proc.pid if proc is not None else None,
+                "alive": alive,
+                "healthy": alive and age <= HEARTBEAT_TIMEOUT,
+                "heartbeat_age_s": round(age, 1),
+                "restarts": self._restarts[index],
+            })
+        healthy = sum(w["healthy"] for w in workers)
+        return {"ready": healthy > 0, "healthy_workers": healthy, "workers": workers}
+
+    def stop(self, *_):
+        self._stopping = True
+
+    def run(self, poll_interval: float = 1.0):
+        """Forks the children and supervises them until SIGTERM/SIGINT."""
+        # Objects allocated so far (the model) are never touched by the GC in
+        # the children, which keeps their pages shared after fork.
+        gc.freeze()
+        if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            print("PROMETHEUS_MULTIPROC_DIR is not set; /metrics will not include the consumers' metrics.")
+        for index in range(self.processes):
+            self._start(index)
+
+        handlers = signal.signal(signal.SIGTERM, self.stop), signal.signal(signal.SIGINT, self.stop)
+        try:
+            while not self._stopping:
+                time.sleep(poll_interval)
+                for index in range(self.processes):
+                    self._check(index)
+        finally:
+            for proc in self._children:
+                if proc is not None and proc.is_alive():
+                    proc.terminate()
+            for proc in self._children:
+                if proc is not None:
+                    proc.join(timeout=10)
+                    self._mark_dead(proc)
+            signal.signal(signal.SIGTERM, handlers[0])
+            signal.signal(signal.SIGINT, handlers[1])
+            print("All consumers stopped.")
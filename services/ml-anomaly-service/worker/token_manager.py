@@ -0,0 +1,72 @@
+import asyncio
+import time
+from jose import jwt
+
+class TokenManager:
+    """
+    Holds the worker's service JWT.
+    A token is minted with an expiry and reused until `refresh_margin` seconds
+    before it expires, so reporting a batch of anomalies costs at most one
+    HMAC signature. The Authorization header dict is built once per token.
+    """
+
+    def __init__(self, secret_key: str, subject: str, scope: str,
+                 ttl: int = 3600, refresh_margin: int = 60, algorithm: str = "HS256"):
+        self.secret_key = secret_key
+        self.subject = subject
+        self.scope = scope
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl // 2)
+        self.algorithm = algorithm
+        self._token = None
+        self._expires_at = 0
+        self._headers = {}
+        self._refresh_task = None
+
+    def _mint(self):
+        now = int(time.time())
+        payload = {
+            "sub": self.subject,
+            "scope": self.scope,
+            "iat": now,
+            "exp": now + self.ttl,
+        }
+        self._token = jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
+        self._expires_at = now + self.ttl
+        self._headers = {"Authorization": f"Bearer {self._token}"}
+
+    def _refresh_due(self) -> float:
+        return self._expires_at - self.refresh_margin
+
+    @property
+    def token(self) -> str:
+        """The current token, minted on demand if missing or about to expire."""
+        if self._token is None or time.time() >= self._refresh_due():
+            self._mint()
+        return self._token
+
+    @property
+    def headers(self) -> dict:
+        """Prebuilt Authorization header for the current token."""
+        self.token
+        return self._headers
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(max(0.0, self._refresh_due() - time.time()))
+            self._mint()
+
+    def start(self):
+        """Mints a token now and keeps it fresh from a background task."""
+        self.token
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
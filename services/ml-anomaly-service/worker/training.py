@@ -0,0 +1,275 @@
+import datetime
+import gzip
+import heapq
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import orjson
+from sklearn.ensemble import IsolationForest
+
+from . import features
+from .compiled_forest import CompiledForest, export_forest
+from .ip_stats import IPStatsStore
+
+# Defaults mirror the worker's environment so a model is trained on the
+# windowed counters it will be served; see worker.run_worker.
+BATCH_SIZE = 500
+WINDOW_SECONDS = float(os.environ.get("IP_STATS_WINDOW_SECONDS", "600"))
+WINDOW_BUCKETS = int(os.environ.get("IP_STATS_BUCKETS", "10"))
+MAX_IPS = int(os.environ.get("IP_STATS_MAX_IPS", "1000000"))
+
+# Feature rows kept for fitting. IsolationForest only looks at max_samples
+# rows per tree, so a uniform sample of this size loses nothing while
+# keeping memory flat however long the history is.
+SAMPLE_SIZE = 200_000
+
+# Entries fetched per XRANGE call when reading the stream.
+STREAM_PAGE = 10_000
+
+# --- Event sources ---
+#
+# Each source yields (events, now) pairs of at most batch_size parsed events,
+# `now` being the time the worker would have seen that batch. Batches are the
+# size the worker consumes, so windowed counters evolve as they did live.
+
+def _entry_time(entry_id) -> float:
+    entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+    return int(entry_id.split("-", 1)[0]) / 1000.0
+
+def stream_batches(r, stream: str = "events:raw", start: str = "-", end: str = "+",
+                   batch_size: int = BATCH_SIZE, page_size: int = STREAM_PAGE):
+    """Pages through a Redis stream with XRANGE; `now` is the entry ID's timestamp."""
+    cursor = start
+    pending = []
+    while True:
+        entries = r.xrange(stream, min=cursor, max=end, count=page_size)
+        pending.extend(entries)
+        # Batches straddle pages, so every batch but the last is full.
+        while len(pending) >= batch_size:
+            chunk, pending = pending[:batch_size], pending[batch_size:]
+            yield features.parse_events(chunk), _entry_time(chunk[-1][0])
+        if len(entries) < page_size:
+            break
+        last = entries[-1][0]
+        cursor = "(" + (last.decode() if isinstance(last, bytes) else last)
+    if pending:
+        yield features.parse_events(pending), _entry_time(pending[-1][0])
+
+def _event_time(event: dict, default: float) -> float:
+    try:
+        return datetime.datetime.fromisoformat(event["timestamp"].replace("Z", "+00:00")).timestamp()
+    except (KeyError, AttributeError, ValueError):
+        return default
+
+def archive_batches(path: str, batch_size: int = BATCH_SIZE):
+    """
+    Reads an NDJSON export (one event per line, .gz accepted); `now` is the
+    timestamp of the batch's last event, or the previous batch's if it has none.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    now = 0.0
+    with opener(path, "rb") as f:
+        batch = []
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                batch.append(orjson.loads(line))
+            except orjson.JSONDecodeError as e:
+                print(f"Skipping malformed archive line: {e}")
+                continue
+            if len(batch) == batch_size:
+                now = _event_time(batch[-1], now)
+                yield batch, now
+                batch = []
+        if batch:
+            yield batch, _event_time(batch[-1], now)
+
+def synthetic_batches(n_events: int, batch_size: int = BATCH_SIZE, n_ips: int = 50_000,
+                      events_per_second: float = 200, fail_rate: float = 0.05,
+                      file_change_rate: float = 0.1, seed: int = 0, start: float = 1.7e9):
+    """
+    Baseline traffic without attacks, generated in memory: for benchmarks and
+    for bootstrapping a model before there is history to train on.
+    """
+    rng = np.random.default_rng(seed)
+    # A skewed IP population: a few busy addresses, a long tail of quiet ones.
+    weights = 1.0 / np.arange(1, n_ips + 1) ** 0.6
+    cdf = np.cumsum(weights / weights.sum())
+    addresses = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(n_ips)]
+    for done in range(0, n_events, batch_size):
+        n = min(batch_size, n_events - done)
+        ips = np.minimum(np.searchsorted(cdf, rng.random(n)), n_ips - 1).tolist()
+        draws = rng.random(n).tolist()
+        batch = [
+            {"event_type": "FILE_CHANGE", "source_ip": addresses[ip]} if u < file_change_rate
+            else {"event_type": "LOGIN_ATTEMPT", "source_ip": addresses[ip],
+                  "success": u >= file_change_rate + fail_rate * (1 - file_change_rate)}
+            for ip, u in zip(ips, draws)
+        ]
+        yield batch, start + (done + n) / events_per_second
+
+# --- Bounded-memory accumulators ---
+
+class ReservoirSample:
+    """
+    Uniform sample of at most `size` rows from a stream of matrices: every row
+    gets a random key and the `size` smallest keys are kept (bottom-k), so each
+    block costs one vectorised draw and only rows that beat the current cutoff
+    touch the heap.
+    """
+
+    def __init__(self, size: int, n_features: int, seed: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.rows = np.empty((size, n_features), dtype=np.float64)
+        self._heap = []           # (-key, row index) of the kept rows; largest key on top
+        self.seen = 0
+
+    def add(self, X: np.ndarray):
+        self.seen += len(X)
+        keys = self.rng.random(len(X))
+        heap = self._heap
+        for i in np.flatnonzero(keys < -heap[0][0]).tolist() if len(heap) == self.size else range(len(X)):
+            if len(heap) < self.size:
+                self.rows[len(heap)] = X[i]
+                heapq.heappush(heap, (-keys[i], len(heap)))
+            elif keys[i] < -heap[0][0]:
+                _, index = heapq.heapreplace(heap, (-keys[i], heap[0][1]))
+                self.rows[index] = X[i]
+
+    def sample(self) -> np.ndarray:
+        return self.rows[:len(self._heap)]
+
+class RunningStats:
+    """Per-column count, mean, variance, min and max, merged block by block (Chan et al.)."""
+
+    def __init__(self, n_features: int):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self._m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+
+    def add(self, X: np.ndarray):
+        n = len(X)
+        if not n:
+            return
+        mean = X.mean(axis=0)
+        m2 = ((X - mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self._m2 = self._m2 + m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+        self.min = np.minimum(self.min, X.min(axis=0))
+        self.max = np.maximum(self.max, X.max(axis=0))
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self._m2 / self.count) if self.count else np.zeros_like(self.mean)
+
+    def summary(self, names) -> dict:
+        return {
+            name: {"mean": float(self.mean[i]), "std": float(self.std[i]),
+                   "min": float(self.min[i]), "max": float(self.max[i])}
+            for i, name in enumerate(names)
+        } if self.count else {}
+
+# --- Training ---
+
+def feature_rows(batches, window_seconds: float = WINDOW_SECONDS, n_buckets: int = WINDOW_BUCKETS,
+                 max_ips: int = MAX_IPS):
+    """
+    Replays event batches through the worker's feature path and yields
+    (events in the batch, model-input matrix): the same counters, window and
+    pre-filter the live worker scores.
+    """
+    store = IPStatsStore(window_seconds, n_buckets, max_ips) if window_seconds > 0 else None
+    for events, now in batches:
+        activity = features.extract_ip_activity(events)
+        if not activity.ips:
+            continue
+        counts = activity.counts
+        if store is not None:
+            counts = store.window_totals(store.update(activity.ips, counts, now))
+        login_features = features.login_features_from_counts(activity.ips, counts)
+        _, X = features.build_login_matrix(login_features)
+        yield len(events), X
+
+def train(batches, source: str = "", sample_size: int = SAMPLE_SIZE,
+          window_seconds: float = WINDOW_SECONDS, n_buckets: int = WINDOW_BUCKETS,
+          max_ips: int = MAX_IPS, n_estimators: int = 100, max_samples="auto",
+          contamination: float = 0.05, seed: int = 42):
+    """
+    Fits an IsolationForest on feature rows replayed from `batches`.
+    Memory is bounded by the IP window and the row sample, not by how many
+    events are read. Returns (model, metadata); raises ValueError when the
+    history produced no rows to fit on.
+    """
+    sample = ReservoirSample(sample_size, len(features.MODEL_FEATURES), seed)
+    stats = RunningStats(len(features.MODEL_FEATURES))
+    n_events = 0
+    started = time.perf_counter()
+    for n, X in feature_rows(batches, window_seconds, n_buckets, max_ips):
+        n_events += n
+        if len(X):
+            sample.add(X)
+            stats.add(X)
+    X_train = sample.sample()
+    if not len(X_train):
+        raise ValueError(f"No feature rows in {n_events} events from {source or 'the source'}; nothing to train on")
+    replay_seconds = time.perf_counter() - started
+
+    model = IsolationForest(n_estimators=n_estimators, max_samples=max_samples,
+                            contamination=contamination, random_state=seed)
+    model.fit(X_train)
+    metadata = {
+        "feature_schema": features.feature_schema(window_seconds, n_buckets),
+        "trained_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "source": source,
+        "events": n_events,
+        "rows_seen": sample.seen,
+        "rows_sampled": len(X_train),
+        "feature_stats": stats.summary(features.MODEL_FEATURES),
+        "params": {"n_estimators": n_estimators, "max_samples": max_samples,
+                   "contamination": contamination, "random_state": seed},
+        "replay_seconds": round(replay_seconds, 3),
+        "fit_seconds": round(time.perf_counter() - started - replay_seconds, 3),
+    }
+    return model, metadata
+
+def default_version() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("model-%Y%m%d-%H%M%S")
+
+def write_artifact(model, metadata: dict, path: str, compiled: bool = True) -> str:
+    """
+    Writes the model to `path` (temp file + rename, as MODEL_DIR requires)
+    with a JSON sidecar of its metadata next to it. Compiled artifacts carry
+    the metadata inside too, so the registry can check the feature schema.
+    """
+    metadata = {"version": os.path.splitext(os.path.basename(path))[0], **metadata}
+    if compiled:
+        artifact = export_forest(model)
+        artifact["metadata"] = metadata
+        # The worker scores with CompiledForest; refuse to ship one that disagrees
+        # with sklearn anywhere from quiet traffic to well past the training range.
+        highest = max((s["max"] for s in metadata.get("feature_stats", {}).values()), default=0.0)
+        probe = np.random.default_rng(0).random((2000, model.n_features_in_)) * (2 * highest + 10)
+        error = np.abs(CompiledForest(artifact).decision_function(probe) - model.decision_function(probe)).max()
+        if error > 1e-9:
+            raise ValueError(f"Compiled forest disagrees with sklearn (max error {error}); not exporting")
+    else:
+        artifact = model
+
+    directory = os.path.dirname(path) or "."
+    tmp_path = os.path.join(directory, "." + os.path.basename(path) + ".tmp")
+    # Uncompressed, so the worker can memory-map the arrays.
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, path)
+    with open(os.path.splitext(path)[0] + ".json", "w") as f:
+        json.dump(metadata, f, indent=2)
+    return path
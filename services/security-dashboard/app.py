@@ -2,6 +2,11 @@ import streamlit as st
 import requests
 import pandas as pd
 import os
+import collections
+import datetime
+import json
+import threading
+import time
 from jose import jwt
 
 # --- Config ---
@@ -11,6 +16,11 @@ st.set_page_config(layout="wide", page_title="Securify AI Dashboard")
 # If running locally, change to "http://localhost:8000"
 API_HOST = os.environ.get("API_HOST", "http://event-ingest-stream-svc")
 API_URL = f"{API_HOST}/api/v1/anomalies"
+# Anomalies kept in memory for the live table.
+LIVE_WINDOW = int(os.environ.get("LIVE_WINDOW", "500"))
+# The live feed's stream is closed once nothing has rendered it for this long
+# (tab closed, session abandoned); the next render opens a new one.
+LIVE_IDLE_SECONDS = float(os.environ.get("LIVE_IDLE_SECONDS", "60"))
 
 # --- Authentication Logic (Phase 5 Security Requirement) ---
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
@@ -61,6 +71,9 @@ def logout():
         del st.session_state['jwt_token']
     if 'username' in st.session_state:
         del st.session_state['username']
+    if 'live_feed' in st.session_state:
+        st.session_state['live_feed'].stop()
+        del st.session_state['live_feed']
     st.rerun()
 
 def show_login_page():
@@ -83,15 +96,24 @@ def show_login_page():
 
 # --- Dashboard Logic ---
 
+# Time window -> timeseries bucket size (seconds). Aggregates are computed by
+# the API in SQL, so the charts cover every anomaly in the window.
+WINDOWS = {
+    "Last hour": (datetime.timedelta(hours=1), 60),
+    "Last 24 hours": (datetime.timedelta(hours=24), 900),
+    "Last 7 days": (datetime.timedelta(days=7), 3600),
+    "Last 30 days": (datetime.timedelta(days=30), 6 * 3600),
+}
+
 @st.cache_data(ttl=60) # Cache data for 60 seconds
-def fetch_anomalies_from_api(token: str) -> pd.DataFrame:
+def fetch_from_api(token: str, path: str = "", params: dict = None) -> pd.DataFrame:
     """
     Securely fetches data from the Core API using the
     server-side session token.
     """
     headers = {"Authorization": f"Bearer {token}"}
     try:
-        response = requests.get(API_URL, headers=headers, timeout=5)
+        response = requests.get(f"{API_URL}{path}", headers=headers, params=params, timeout=5)
         response.raise_for_status() # Raise error for 4xx/5xx
         data = response.json()
         return pd.DataFrame(data)
@@ -101,11 +123,95 @@ def fetch_anomalies_from_api(token: str) -> pd.DataFrame:
             logout()
         else:
             st.error(f"Failed to fetch data: {e}")
-    except requests.RequestError as e:
+    except requests.RequestException as e:
         st.error(f"Connection error: Could not reach API. {e}")
     
     return pd.DataFrame()
 
+def fetch_latest_anomalies(token: str) -> list:
+    """The latest page of anomalies (uncached), newest first."""
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        response = requests.get(API_URL, headers=headers, timeout=5)
+        response.raise_for_status()
+        return response.json()
+    except requests.RequestException as e:
+        st.error(f"Failed to fetch latest anomalies: {e}")
+        return []
+
+class LiveFeed:
+    """
+    Keeps the newest LIVE_WINDOW anomalies in memory for one session.
+    Seeded with the latest page once, then a background thread appends what
+    the API pushes over Server-Sent Events, so reruns never refetch the list.
+    The thread exits on logout, on a 401, or once frame() has not been called
+    for LIVE_IDLE_SECONDS.
+    """
+
+    def __init__(self, token: str, initial: list):
+        self.token = token
+        self.rows = collections.deque(reversed(initial), maxlen=LIVE_WINDOW)  # oldest first
+        self.connected = False
+        self.unauthorized = False
+        self._lock = threading.Lock()
+        self._last_frame = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+        self._thread.start()
+
+    def _idle(self) -> bool:
+        return time.monotonic() - self._last_frame > LIVE_IDLE_SECONDS
+
+    def _run(self):
+        headers = {"Authorization": f"Bearer {self.token}", "Accept": "text/event-stream"}
+        while not self._stop.is_set() and not self._idle():
+            try:
+                # The API sends a keepalive comment every 15s, well inside the read timeout.
+                with requests.get(f"{API_URL}/stream", headers=headers, stream=True, timeout=(5, 60)) as resp:
+                    if resp.status_code == 401:
+                        # Expired or revoked token: retrying cannot succeed.
+                        self.unauthorized = True
+                        break
+                    resp.raise_for_status()
+                    self.connected = True
+                    for line in resp.iter_lines():
+                        if self._stop.is_set() or self._idle():
+                            break
+                        if line.startswith(b"data: "):
+                            rows = json.loads(line[len(b"data: "):])
+                            with self._lock:
+                                self.rows.extend(rows)
+            except (requests.RequestException, ValueError):
+                pass
+            self.connected = False
+            self._stop.wait(5)
+        self.connected = False
+        self._stop.set()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def frame(self) -> pd.DataFrame:
+        """The window as a DataFrame, newest first."""
+        self._last_frame = time.monotonic()
+        with self._lock:
+            rows = list(reversed(self.rows))
+        return pd.DataFrame(rows)
+
+@st.fragment(run_every=2)
+def show_live_anomalies(feed: LiveFeed):
+    """Re-renders only this section every couple of seconds from the in-memory window."""
+    if feed.unauthorized:
+        st.error("Authentication failed. Please log out and log in again.")
+        logout()
+    st.header("Latest Detected Anomalies")
+    st.caption("🟢 Live" if feed.connected else "🟠 Reconnecting to live stream...")
+    st.dataframe(feed.frame())
+
 
 def show_dashboard():
     """Displays the main SRE dashboard."""
@@ -126,22 +232,46 @@ def show_dashboard():
         logout()
         return
 
-    df_anomalies = fetch_anomalies_from_api(token)
+    # New anomalies are pushed live; only this section re-renders
+    # (a feed that went idle while the tab was away is replaced, with a fresh seed)
+    if 'live_feed' not in st.session_state or st.session_state['live_feed'].stopped:
+        st.session_state['live_feed'] = LiveFeed(token, fetch_latest_anomalies(token))
+    show_live_anomalies(st.session_state['live_feed'])
+
+    window_label = st.selectbox("Time window", list(WINDOWS), index=1)
+    window, bucket_seconds = WINDOWS[window_label]
+    # Round to the minute so the cached responses are reused between reruns.
+    until = datetime.datetime.now(datetime.timezone.utc).replace(second=0, microsecond=0)
+    window_params = {"since": (until - window).isoformat(), "until": until.isoformat()}
 
-    if df_anomalies.empty:
+    df_timeseries = fetch_from_api(
+        token, "/stats/timeseries", {**window_params, "bucket_seconds": bucket_seconds})
+
+    if df_timeseries.empty:
         st.warning("No anomaly data found.")
         return
 
     # --- Visualizations ---
-    st.header("Latest Detected Anomalies")
-    st.dataframe(df_anomalies)
+    df_timeseries['bucket'] = pd.to_datetime(df_timeseries['bucket'])
+    total, top_col = st.columns(2)
+    total.metric("Anomalies in window", f"{int(df_timeseries['count'].sum()):,}")
+
+    st.header("Anomalies Over Time")
+    st.bar_chart(df_timeseries, x='bucket', y='count')
 
     st.header("Anomaly Score Over Time")
-    df_anomalies['timestamp'] = pd.to_datetime(df_anomalies['timestamp'])
-    st.line_chart(df_anomalies, x='timestamp', y='score')
-    
+    st.line_chart(df_timeseries, x='bucket', y=['p50_score', 'p95_score', 'max_score'])
+
     st.header("Top Anomalous IPs")
-    st.bar_chart(df_anomalies['source_ip'].value_counts())
+    df_top_ips = fetch_from_api(token, "/stats/top-ips", {**window_params, "limit": 20})
+    if not df_top_ips.empty:
+        top_col.metric("Most active IP", df_top_ips['source_ip'].iloc[0])
+        st.bar_chart(df_top_ips, x='source_ip', y='count')
+
+    st.header("Anomalies by Type")
+    df_types = fetch_from_api(token, "/stats/event-types", window_params)
+    if not df_types.empty:
+        st.bar_chart(df_types, x='event_type', y='count')
 
 # --- Main App Router ---
 if 'jwt_token' not in st.session_state: